@@ -12,17 +12,50 @@ There are two functions of the program:
 """
 
 from math import radians, cos, sin, asin, sqrt, e
-import numpy as np
-import pandas as pd
 import sys
 import os
-import csv
-import turtle
-import matplotlib.pyplot as plt
-import matplotlib.pyplot as plot
+# The charting libraries (turtle, matplotlib and pandas) are imported inside the chart functions, so runs that never
+# draw a chart don't pay for loading them.
+from city_index import CityIndex
+from fuzzy_match import FuzzyMatcher
+from distance_matrix import DistanceMatrix, DEFAULT_PATH as DISTANCE_MATRIX_PATH
+from dataset_cache import load_table
+from city_table import city_columns
+from batch_writer import BatchWriter
+from spatial_index import SpatialIndex, parse_coordinates
+from route_cache import RouteCache, dataset_fingerprint
+from profiler import PROFILER
+from autocomplete import PrefixIndex, enable_tab_completion
+from chart_renderer import ChartRenderer, FORMATS, set_window_title
+from region_shards import RegionShards
+from warm_up import WarmAttribute, WarmUp
+from city_delta import apply_delta, read_delta
+
+# Routes calculated in earlier runs are kept in this file. Set to None to keep the route cache in memory only.
+ROUTE_CACHE_FILE = 'REA_route_cache.npz'
+# Set this variable to region or country names separated by ";" (e.g. REA_REGION="Oceania" or "Australia;Japan") to
+# load only the cities of those regions from the region shards (REA_shards). Cities elsewhere are paged in when asked
+# for.
+REGION_ENV_VAR = 'REA_REGION'
+# Set this variable to 0 to build the data structures before the menu appears instead of in the background.
+WARM_UP_ENV_VAR = 'REA_WARM_UP'
 
 
 class Program:
+    # Set by the warm-up steps (see __init__). Reading one before its step has finished waits for that step.
+    shards = WarmAttribute('load_dataset')
+    city_list = WarmAttribute('load_dataset')
+    transport_modes = WarmAttribute('load_dataset')
+    modes_list = WarmAttribute('load_dataset')
+    speeds_list = WarmAttribute('load_dataset')
+    city_index = WarmAttribute('city_index')
+    prefix_index = WarmAttribute('prefix_index')
+    tab_completion = WarmAttribute('prefix_index')
+    spatial_index = WarmAttribute('spatial_index')
+    distance_matrix = WarmAttribute('spatial_index')
+    route_cache = WarmAttribute('load_route_cache')
+    fuzzy_matcher = WarmAttribute('fuzzy_matcher')
+
     def __str__(self):
         """
         This function returns information about the file and it's author
@@ -35,27 +68,148 @@ class Program:
         __init__ reads the relevant files and creates lists from the spread sheets.
         Initialises the class attributes.
         """
-        # Reads the sheets within th excel file (.xlsx)
+        # Reads the sheets within th excel file (.xlsx) through the compiled binary cache (REA_cache.npz).
+        # The cache is rebuilt automatically whenever the excel file changes.
+        # The cities are kept in a compact columnar CityTable; its rows index like the spreadsheet rows.
         # !NOTE!: The REA.xlsx file must be in the same directory as the program!!!
-        os.chdir(sys.path[0])  # Get the program directory and set it as the working directory.
-        rea_file = pd.ExcelFile('REA.xlsx')
-        df_geo_city = pd.read_excel(rea_file, 'geo_city')
-        df_transport = pd.read_excel(rea_file, 'speed')
-
-        # Initialises class variables.
-        self.city_list = df_geo_city.values.tolist()
-        self.modes_list, self.speeds_list = zip(*df_transport.values.tolist())
+        # Get the program directory and set it as the working directory.
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        # The dataset and the lookup structures are built by a background thread (see warm_up.py), so the menu
+        # appears at once. Reading an attribute that is not built yet waits for its step only.
+        # A cProfile dump (--profile=<file>) only covers the main thread, so the steps then run before the menu.
+        self.warm_up = WarmUp([('load_dataset', self.load_dataset), ('city_index', self.build_city_index),
+                               ('prefix_index', self.build_prefix_index),
+                               ('spatial_index', self.build_spatial_index),
+                               ('load_route_cache', self.load_route_cache),
+                               ('fuzzy_matcher', self.build_fuzzy_matcher)],
+                              background=os.environ.get(WARM_UP_ENV_VAR, '1').strip().lower() not in
+                              ('0', 'false', 'no') and not PROFILER.dump_path)
+        self.warm_up.start()
         self.start_end = ""  # Contains the string for either the "destination" or "origin.
         self.input = ""  # Stores both the origin and destination city input by the user.
         self.turtle_bar_chart = 1  # Used to make sure that the turtle bar chart doesnt run more than once.
-        # Contains data for the selected origin city. Format: City, Country, Latitude, Longitude.
+        # Contains data for the selected origin city. Format: City, Country, Latitude, Longitude, Row index.
         self.ocity_list = []
-        # Contains data for the selected destination city. Format: City, Country, Latitude, Longitude.
+        # Contains data for the selected destination city. Format: City, Country, Latitude, Longitude, Row index.
         self.dcity_list = []
         # Contains travel time data for each mode of transport. Format: [[hours, minutes], ...
         # The list of travel times are ordered such that the values correspond to transports_list order.
         self.times_list = []
 
+    def load_dataset(self):
+        """
+        Warm-up step: loads the cities and the modes of transport.
+        """
+        # Pinned to regions, only the shards of those regions are loaded (see region_shards.py).
+        region = os.environ.get(REGION_ENV_VAR, '').strip()
+        with PROFILER.stage('load_dataset'):
+            if region:
+                self.shards = RegionShards.open('REA.xlsx')
+                self.city_list = self.shards.load(self.shards.resolve(region.split(';')))
+                transport_list = self.shards.modes()
+            else:
+                self.shards = None
+                self.city_list, transport_list = load_table('REA.xlsx')
+        self.transport_modes = transport_list  # ModeRegistry: the speed and travel time formula of every mode.
+        self.modes_list, self.speeds_list = zip(*transport_list)
+
+    def build_city_index(self):
+        """
+        Warm-up step: builds the exact name lookup.
+        """
+        with PROFILER.stage('build_indices'):
+            self.city_index = CityIndex(self.city_list)  # Hashed name lookup built once from the city list.
+
+    def build_prefix_index(self):
+        """
+        Warm-up step: builds the prefix completion index and turns on Tab completion.
+        """
+        with PROFILER.stage('build_indices'):
+            self.prefix_index = PrefixIndex(self.city_list)  # Sorted names for completing the start of a name.
+            # Tab completes city names at the city prompts (when running in a terminal with readline).
+            self.tab_completion = enable_tab_completion(self.prefix_index)
+
+    def build_spatial_index(self):
+        """
+        Warm-up step: builds the coordinate lookups.
+        """
+        with PROFILER.stage('build_indices'):
+            _, _, lats, lngs, _ = city_columns(self.city_list)
+            # Grid of city coordinates for finding the nearest city to a latitude/longitude input.
+            self.spatial_index = SpatialIndex(lats, lngs)
+            # Precomputed distances between the selected cities (None if distance_matrix.py has not been run). The
+            # matrix is indexed by the rows of the full city list, so it is not used when pinned to regions.
+            self.distance_matrix = (DistanceMatrix.open_if_valid(DISTANCE_MATRIX_PATH, lats, lngs)
+                                    if self.shards is None else None)
+
+    def load_route_cache(self):
+        """
+        Warm-up step: loads the routes calculated in earlier runs.
+        """
+        with PROFILER.stage('load_route_cache'):
+            # Recently calculated routes (distance and travel times), so repeated routes are not recalculated.
+            self.route_cache = RouteCache(fingerprint=dataset_fingerprint(self.city_list, self.transport_modes))
+            if ROUTE_CACHE_FILE is not None:
+                self.route_cache.load(ROUTE_CACHE_FILE)
+
+    def build_fuzzy_matcher(self):
+        """
+        Warm-up step: builds the spell check index (the slowest structure, so it comes last). The constructor builds
+        every structure suggest() reads, so the first spell check costs the same as the later ones.
+        """
+        with PROFILER.stage('build_indices'):
+            self.fuzzy_matcher = FuzzyMatcher(city_columns(self.city_list)[1])  # Trigram index for spell_check.
+
+    def page_in(self, regions):
+        """
+        Loads the shards of more regions when the program is pinned to regions and rebuilds the lookup structures.
+        The cities loaded before keep their rows, so the routes in the route cache stay valid.
+        :param regions: The regions to load (from RegionShards.regions_for_name or regions_near).
+        :return: True if any shard was loaded.
+        """
+        if not regions:
+            return False
+        self.warm_up.wait_all()  # So no step still building from the old city list overwrites the rebuilt one.
+        with PROFILER.stage('page_in_shards'):
+            print("Loading the cities of " + ", ".join(regions) + "...")
+            self.city_list = self.shards.load(regions)
+            self.build_city_index()
+            self.build_prefix_index()
+            self.build_spatial_index()
+            self.build_fuzzy_matcher()
+            self.route_cache.fingerprint = dataset_fingerprint(self.city_list, self.transport_modes)
+        return True
+
+    def update_cities(self):
+        """
+        Applies a city delta (a CSV file of added, moved and removed cities, see city_delta.py) to the loaded data.
+        The lookup structures are updated in place and only the cached routes of moved or removed cities are dropped.
+        The changes last until the program exits; REA.xlsx is not changed.
+        """
+        path = input("Input delta file: ").strip().strip('"')
+        self.warm_up.wait_all()  # So no step still building from the old city list overwrites the update.
+        if self.shards is not None:
+            print("City updates cannot be applied when pinned to regions (" + REGION_ENV_VAR + ").")
+            return
+        try:
+            changes = read_delta(path)
+        except IOError:
+            print("Could not open " + path + "!")
+            return
+        except ValueError as error:
+            print(error.args[0])
+            return
+        try:
+            with PROFILER.stage('apply_delta'):
+                summary = apply_delta(changes, self.city_list, self.city_index, self.prefix_index,
+                                      self.fuzzy_matcher, self.spatial_index, self.route_cache, self.distance_matrix)
+                self.route_cache.fingerprint = dataset_fingerprint(self.city_list, self.transport_modes)
+        except KeyError as error:
+            print(error.args[0] + " No changes were made.")
+            return
+        print("{} cities added, {} moved and {} removed. {} cached routes discarded.".format(
+            summary.added, summary.moved, summary.removed, summary.routes_discarded))
+
     def restart(self):
         """
         Allows the user chooses whether to close the program or restart it.
@@ -69,8 +223,19 @@ class Program:
 
     def re_exit(self):
         """
-        Prints exit message. Terminates the program.
-        """
+        Prints exit message. Saves the route cache and terminates the program.
+        """
+        if ROUTE_CACHE_FILE is not None:
+            try:
+                route_cache = self.route_cache  # Waits for the warm-up step that loads it.
+            except Exception as error:  # The warm-up failed, so there is no cache to save, but the exit goes ahead.
+                print("Route cache not saved: {}".format(error))
+                route_cache = None
+            try:
+                if route_cache is not None:
+                    route_cache.save(ROUTE_CACHE_FILE)
+            except IOError:  # The cache is only an optimisation, so a read-only directory is not an error.
+                pass
         print('{:-^46}'.format("Program Terminated"))
         sys.exit()
 
@@ -90,18 +255,33 @@ class Program:
         """
         Checks the database for the input to find the city information. If the city is not in the database it runs the
         spell check function. If the spell check finds the correct city, city_check() is called again with the new value.
-        :return: The list of data for the city containing the City, Country, latitude, and longitude (in that order).
-        """
-        # Loops through the whole list of cities to find an exact match with the input.
-        for city_idx in range(len(self.city_list)):
-            self.input = self.input.strip()
-            if self.city_list[city_idx][1].lower() == self.input.lower():
-                city_country = self.city_list[city_idx][0]
-                city_name = self.city_list[city_idx][1]
-                city_latitude = self.city_list[city_idx][2]
-                city_longitude = self.city_list[city_idx][3]
-                city_info_list = [city_name, city_country, city_latitude, city_longitude]
-                return city_info_list
+        A "latitude, longitude" input selects the nearest city to that point.
+        :return: The list of data for the city containing the City, Country, latitude, longitude, and row index
+                 (in that order).
+        """
+        # Looks up the input in the prebuilt city index. Accepts "City" or "City, Country".
+        self.input = self.input.strip()
+        coordinates = parse_coordinates(self.input)
+        if coordinates is not None:
+            rows, dists = self.spatial_index.nearest(coordinates[0], coordinates[1], 1)
+            # A city in a region that is not loaded yet could be nearer.
+            if self.shards is not None and self.page_in(self.shards.regions_near(coordinates[0], coordinates[1],
+                                                                                 dists[0, 0])):
+                return self.city_check()
+            city_info_list = self.city_index.record(int(rows[0, 0]))
+            print("The nearest city to {} is {}, {} ({} km away).".format(self.input, city_info_list[0],
+                                                                          city_info_list[1], dists[0, 0]))
+            return city_info_list
+
+        city_idx = self.city_index.lookup(self.input)
+        if city_idx is None and self.shards is not None and self.page_in(self.shards.regions_for_name(self.input)):
+            return self.city_check()
+        if city_idx is not None:
+            duplicates = len(self.city_index.matches(self.input))
+            if duplicates > 1:
+                print("Note: {} cities are named {}. Enter \"City, Country\" to choose a different one."
+                      .format(duplicates, self.input))
+            return self.city_index.record(city_idx)
 
         # Lets the user know their input was not found.
         # Runs spell check then calls the function with the new input string.
@@ -111,50 +291,34 @@ class Program:
 
     def spell_check(self):
         """
-        Finds the closest match to the city input. The city with the lowest difference from the input string is
-        suggested to the user. If the user refuses the suggested city value, the program calls to the restart function.
-        If the assumed city is correct the program returns the assumed city.
+        Finds the closest matches to the city input. If the input is the start of one or more city names, the most
+        populous of those cities are suggested. Otherwise the cities with the lowest difference from the input string
+        are suggested. Suggestions are offered to the user one at a time. If the user refuses every suggested city,
+        the program calls to the restart function. If an assumed city is correct the program returns the assumed city.
         :return: The closest city to the original city input.
         """
         print('{:-^46}'.format("Searching for alternative"))
-        city_names = [self.city_list[i][1] for i in range(len(self.city_list))]  # List of city names.
-
-        # Creates the list of Levenshtein distance values using the Levenshtein method.
-        # The Levenstein distance is a measurement of the difference between two strings.
-        index_diff = []
-        for idx in range(len(city_names)):
-            matrix_x = len(self.input) + 1
-            matrix_y = len(city_names[idx]) + 1
-            matrix = np.zeros((matrix_x, matrix_y))
-            for x in range(matrix_x):
-                matrix[x, 0] = x
-            for y in range(matrix_y):
-                matrix[0, y] = y
-
-            for x in range(1, matrix_x):
-                for y in range(1, matrix_y):
-                    if self.input[x - 1] == city_names[idx][y - 1]:
-                        matrix[x, y] = min(
-                            matrix[x - 1, y] + 1,
-                            matrix[x - 1, y - 1],
-                            matrix[x, y - 1] + 1)
-                    else:
-                        matrix[x, y] = min(
-                            matrix[x - 1, y] + 1,
-                            matrix[x - 1, y - 1] + 1,
-                            matrix[x, y - 1] + 1)
-            index_diff.append(matrix[matrix_x - 1, matrix_y - 1])
-
-        assumed_city_index = index_diff.index(min(index_diff))  # The index of the city with the lowest 'difference'
-        # Checks if the assumed city is correct.
+        # Completes the input if it is the start of a city name (e.g. "Melb" -> "Melbourne, Australia"). The
+        # suggestions include the country, so accepting one selects that city even when others share its name.
+        suggestions = [[label] for label in self.prefix_index.labels(self.input, 3, unique_names=True)]
+        if not suggestions:
+            # Finds the cities with the lowest Levenshtein distance using the prebuilt fuzzy matcher.
+            # The Levenstein distance is a measurement of the difference between two strings.
+            suggestions = self.fuzzy_matcher.suggest(self.input, 3)
+
+        # Checks if an assumed city is correct.
+        suggestion_idx = 0
         while True:
-            cond_correction = input("Did you mean to input " + city_names[assumed_city_index] + "? (Y/N) ")
+            assumed_city = suggestions[suggestion_idx][0]
+            cond_correction = input("Did you mean to input " + assumed_city + "? (Y/N) ")
             if cond_correction.lower().strip() == 'y':
-                print("Your " + self.start_end + " location has been set to " + city_names[assumed_city_index] + ".\n")
-                return city_names[assumed_city_index]
+                print("Your " + self.start_end + " location has been set to " + assumed_city + ".\n")
+                return assumed_city
             elif cond_correction.lower().strip() == 'n':
-                print("Unable to locate city in database.")
-                self.restart()
+                suggestion_idx += 1
+                if suggestion_idx == len(suggestions):
+                    print("Unable to locate city in database.")
+                    self.restart()
             else:
                 print('{:-^46}'.format("***Invalid Input***"))
                 continue
@@ -162,8 +326,14 @@ class Program:
     def latlng_to_dist(self):
         """
         Calculates the distance between two latitude and longitude points using Haversine formula.
+        If both cities are in the precomputed distance matrix the distance is read from it instead.
         :return: The distance between two points in kilometers rounded to 2 decimal places
         """
+        if self.distance_matrix is not None:
+            distance = self.distance_matrix.distance(self.ocity_list[4], self.dcity_list[4])
+            if distance is not None:
+                return distance
+
         origin_lat, origin_lng, dest_lat, dest_lng = self.ocity_list[2], self.ocity_list[3], self.dcity_list[2], self.dcity_list[3]
         radius_of_earth = 6371
         int_lat1 = radians(origin_lat)
@@ -174,35 +344,41 @@ class Program:
         distance = 2 * radius_of_earth * asin(sqrt(a))
         return round(distance, 2)
 
-    def travel_time(self, distance):
+    def calculate_route(self):
+        """
+        Finds the distance and travel times between the origin and destination cities. Routes are looked up in the
+        route cache first (in either direction) and stored in it after they are calculated.
+        """
+        cached = self.route_cache.get(self.ocity_list[4], self.dcity_list[4])
+        if cached is None:
+            distance = self.latlng_to_dist()
+            self.travel_time(distance)
+            self.route_cache.put(self.ocity_list[4], self.dcity_list[4], distance,
+                                 [time[0] * 60 + time[1] for time in self.times_list])
+        else:
+            self.travel_time(cached[0], cached[1])
+
+    def travel_time(self, distance, minutes=None):
         """
-        Calculates the travel time for 5 modes of transport with the distance given.
+        Calculates the travel time for every mode of transport in the speed sheet with the distance given.
         :param distance: The distance in kilometers.
+        :param minutes: Optional whole minutes for each mode of transport (e.g. from the route cache). If given, the
+                        times are not recalculated.
         :return: The list of times for each mode of transport
         """
         print("The travel time between " + self.ocity_list[0] + " and " + self.dcity_list[0] + " is:")
         self.times_list = []  # Erases all past data from the list.
-        # The code below calculates the travel time using distance/speed.
-        # It also adjusts the travel time to account for wait times and refuelling.
-        # The algorithms to calculate the travel time adjustment are reverse-engineered from hyperloop-one.com
-        for row in range(len(self.modes_list)):
-            time_min = float(distance) / (float(self.speeds_list[row]) / 60)
-            if row == 0:
-                # Calculation for hyperloop.
-                time_min *= ((5.84 * (1 / (1.26 * time_min - 1.02))) + 1.2017)
-            elif row == 1:
-                # Calculation for airplane. Adds 2 hours if the flight is domestic.
-                # Adds 3 hours if the flight is international.
-                if self.ocity_list[1] == self.dcity_list[1]:
-                    time_min += 120
-                else:
-                    time_min += 180
-            elif row == 2 or row == 3:
-                # Calculation for both HSP and rail.
-                time_min *= ((30 * (1 / (0.9888 * time_min - 1.402))) + 1.2987)
-            else:
-                # Calculation for car.
-                time_min *= 1.35
+        if minutes is not None:
+            for row in range(len(self.modes_list)):
+                time_hour, time_min = minutes[row] // 60, minutes[row] % 60
+                print("It takes: " + (str(time_hour) + "h." + str(time_min) + "m.").ljust(8) + " by " +
+                      self.modes_list[row])
+                self.times_list.append([time_hour, time_min])
+            return
+        # The travel time is distance/speed, adjusted for wait times and refuelling by the formula each mode declares
+        # in the speed sheet (see transport_modes; the defaults are reverse-engineered from hyperloop-one.com).
+        domestic = self.ocity_list[1] == self.dcity_list[1]
+        for row, time_min in enumerate(self.transport_modes.route_minutes(distance, domestic)):
             time_hour = int(time_min) // 60
             time_min = int(time_min) % 60
             print("It takes: " + (str(time_hour) + "h." + str(round(time_min, 0)) + "m.").ljust(8) + " by " +
@@ -220,6 +396,7 @@ class Program:
                   "\nt - Turtle ~ Horizontal Bar Chart" * self.turtle_bar_chart,
                   "\nm - Matplotlib ~ Horizontal Bar Chart",
                   "\np - Pandas ~ Horizontal Bar Chart",
+                  "\ns - Save chart to image file",
                   "\nn - No selection",
                   "\n{:-^46}".format(''))
 
@@ -230,6 +407,8 @@ class Program:
                 self.mpl_hbc()
             elif confirm.lower().strip() == 'p':
                 self.pd_hbc()
+            elif confirm.lower().strip() == 's':
+                self.save_chart()
             elif confirm.lower().strip() == 'n':
                 break
             else:
@@ -277,15 +456,16 @@ class Program:
         It also gives the option to opening a chart window displaying the data.
         """
         print('{:-^46}'.format("Route Estimator"))
-        print("Enter any city name. Enter NA to exit program.")
+        print("Enter any city name (or a latitude, longitude). Enter NA to exit program.")
+        if self.tab_completion:
+            print("Press Tab to complete a city name.")
         self.ocity_list = self.city_input('origin')
         self.dcity_list = self.city_input('destination')
         while True:
             confirm = input("Confirm to find the travel time between {}, {} and {}, {}. (Y/N) "
                             .format(self.ocity_list[0], self.ocity_list[1], self.dcity_list[0], self.dcity_list[1]))
             if confirm.lower().strip() == 'y':
-                distance = self.latlng_to_dist()
-                self.travel_time(distance)
+                self.calculate_route()
                 self.bar_charts()
             elif confirm.lower().strip() == 'n':
                 self.change_input()
@@ -296,6 +476,7 @@ class Program:
     def write_to_file(self):
         """
         Creates and writes to a file. Writes the travel times for 10 different combinations of cities.
+        Large route files can be processed without prompts with batch_writer.py.
         """
         test_cities = [['Tokyo', 'Damascus'], ['Beijing', 'Moscow'], ['Cairo', 'Bangkok'], ['Mexico City', 'New York'],
                        ['Seoul', 'Istanbul'], ['Paris', 'Berlin'], ['London', 'Guangzhou'], ['Hong Kong', 'Chicago'],
@@ -312,48 +493,25 @@ class Program:
         file_name = 'RE_Calculations.csv'
         if file_name not in entries:  # Checks to make sure the file is not already in the directory.
             file = open(os.path.join(file_path, file_name), "w")
-            rec_write = csv.writer(file, delimiter=',', quotechar='"', lineterminator='\n', quoting=csv.QUOTE_MINIMAL)
         else:
             condition = input("\nFile is already exists in this directory.\n"
                               "Press any key to restart. Press Y to overwrite. ")
             if condition.lower().strip() == "y":
                 try:
                     file = open(file_path + "/" + file_name, "w")
-                    rec_write = csv.writer(file, delimiter=',', quotechar='"', lineterminator='\n',
-                                           quoting=csv.QUOTE_MINIMAL)
                 except IOError:  # Only runs if there is a problem opening the file.
                     print("Could not open file! Please close Excel!")
+                    return
             else:
                 return
 
-        # Write to file.
-        rec_write.writerow(["Origin to Destination", "Recommended travel", "Via Hyperloop", "Via Airplane",
-                            "Via High-speed Rail", "Via Rail", "Via Car"])
-        for origin_destination in test_cities:
-            # Data retrieving
-            city_list = []
-            for instance in origin_destination:
-                self.input = instance
-                city_list.append(self.city_check())
-            self.ocity_list, self.dcity_list = city_list
-
-            # Calculations.
-            distance = self.latlng_to_dist()
-            self.travel_time(distance)
-
-            # Converts hours and minutes to minutes.
-            travel_times = [self.times_list[x][0] * 60 + self.times_list[x][1] for x in range(len(self.times_list))]
-            # Finds the index of the fastest mode of transport.
-            index_fastest = travel_times.index(min(travel_times))
-
-            # Writes row to file.
-            rec_write.writerow([self.ocity_list[0] + " to " + self.dcity_list[0],
-                                self.modes_list[index_fastest],
-                                "{}h.{}m.".format(*self.times_list[0]),
-                                "{}h.{}m.".format(*self.times_list[1]),
-                                "{}h.{}m.".format(*self.times_list[2]),
-                                "{}h.{}m.".format(*self.times_list[3]),
-                                "{}h.{}m.".format(*self.times_list[4])])
+        if self.shards is not None:
+            self.page_in([region for cities in test_cities for city in cities
+                          for region in self.shards.regions_for_name(city)])
+        # Write to file. All routes are resolved through the city index and calculated in one vectorised batch.
+        batch_writer = BatchWriter(self.city_list, self.modes_list, self.transport_modes, city_index=self.city_index,
+                                   fuzzy_matcher=self.fuzzy_matcher)
+        batch_writer.write(test_cities, file)
         file.close()
 
     def turtle_hbc(self):
@@ -361,6 +519,7 @@ class Program:
         Draws a horizontal bar chart using the turtle library.
         The bar chart contains the recommended mode of transport, title, modes of transportation, and travel time.
         """
+        import turtle
         print('\n{:-^46}'.format('Turtle Horizontal Bar Chart'))
         print("NOTE!: The Turtle Window can only be opened once due to certain limitations. "
               "\nExit the program and restart to draw another turtle chart.")
@@ -475,6 +634,7 @@ class Program:
         Uses the Matplot library to create a Horizontal Bar Chart.
         The bar chart contains the recommended mode of transport, title, modes of transportation, and travel time.
         """
+        import matplotlib.pyplot as plt
         print('\n{:-^46}'.format('MatPlotLib Horizontal Bar Chart'))
         bar_colors = ["#c900d4", "#00d6ab", "#00d6ab", "#00d6ab", "#00d6ab"]
         # Retrieves and sorts the data.
@@ -482,8 +642,7 @@ class Program:
         sorted_mode.reverse()  # The data needs to be adjusted because each library reads the data differently
 
         plt.figure(num=None, figsize=(12, 8), dpi=80, facecolor='w', edgecolor='k')
-        fig = plt.gcf()
-        fig.canvas.set_window_title('Travel Times - MPL Horizontal Bar Chart')
+        set_window_title(plt.gcf(), 'Travel Times - MPL Horizontal Bar Chart')
         plt.barh(index, sorted_tt_decimal, align='center', alpha=0.5, color=bar_colors)
         plt.yticks(index, sorted_mode)
         plt.xlabel('Travel Time - Hours', fontsize=12, y=-1.02)
@@ -506,6 +665,8 @@ class Program:
         Horizontal Bar Chart drawn with pandas.
         The bar chart contains the recommended mode of transport, title, modes of transportation, and travel time.
         """
+        import pandas as pd
+        import matplotlib.pyplot as plt
         print('\n{:-^46}'.format('Pandas Horizontal Bar Chart'))
         # Retrieves and sorts the data
         travel_times_min, sorted_times_list, sorted_tt_decimal, sorted_mode, index = self.organize_data()
@@ -514,8 +675,7 @@ class Program:
         # formatting the data for plotting
         travel_time_df = pd.DataFrame({"Travel Times": sorted_tt_decimal}, index=sorted_mode)
         travel_time_df.plot.barh(figsize=(12, 8), color="#00d6ab")
-        fig = plt.gcf()
-        fig.canvas.set_window_title('Travel Times - Pandas Horizontal Bar Chart')
+        set_window_title(plt.gcf(), 'Travel Times - Pandas Horizontal Bar Chart')
         plt.title("Travel Time: " + self.ocity_list[0] + " - " + self.dcity_list[0],
                   fontsize=16, fontweight="bold", y=1.05)
         plt.xlabel("Travel Time - Hours", fontsize=12)
@@ -526,7 +686,25 @@ class Program:
         plt.figtext(0.32, 0.02,
                     "Recommended mode of transport: " + sorted_mode[4],
                     fontsize=12, color="#c900d4", fontweight="bold")
-        plot.show(block=True)
+        plt.show(block=True)
+
+    def save_chart(self):
+        """
+        Saves the Matplotlib Horizontal Bar Chart to a PNG or SVG file, without opening a window.
+        """
+        print('\n{:-^46}'.format('Save Chart'))
+        while True:
+            path = input("File name (.png or .svg): ").strip()
+            if os.path.splitext(path)[1][1:].lower() in FORMATS:
+                break
+            print('{:-^46}'.format("*** Input Error ***"))
+        try:
+            ChartRenderer(self.modes_list).render(self.ocity_list[0], self.dcity_list[0],
+                                                  [time[0] * 60 + time[1] for time in self.times_list], path)
+        except IOError as error:
+            print("The chart could not be saved: " + str(error))
+            return
+        print("Chart saved to " + os.path.abspath(path))
 
     def organize_data(self):
         """
@@ -566,6 +744,7 @@ class Program:
             print("\n{:-^46}".format('Program Selection'),
                   "\n1 - Route Estimator",
                   "\n2 - Write calculations to file",
+                  "\n3 - Apply city updates from a file",
                   "\nx - Exit",
                   "\n{:-^46}".format(''))
             confirm = input("Select task: ")
@@ -577,6 +756,10 @@ class Program:
                 print("\n")
                 self.write_to_file()
                 self.restart()
+            elif confirm.strip() == '3':
+                print("\n")
+                self.update_cities()
+                self.restart()
             elif confirm.lower().strip() == 'x':
                 self.re_exit()
             else:
@@ -584,5 +767,20 @@ class Program:
                 continue
 
 
-obj_program = Program()
-obj_program.start()
+# Stages timed when the program runs with --profile (or REA_PROFILE=1). Attribute name -> stage name.
+# Interactive stages (city_check, spell_check and the charts) include the time spent waiting for the user.
+PROFILED_METHODS = {'city_check': 'city_check', 'spell_check': 'spell_check', 'latlng_to_dist': 'latlng_to_dist',
+                    'travel_time': 'travel_time', 'calculate_route': 'calculate_route',
+                    'write_to_file': 'write_to_file', 'turtle_hbc': 'chart_turtle', 'mpl_hbc': 'chart_matplotlib',
+                    'pd_hbc': 'chart_pandas', 'save_chart': 'chart_save'}
+
+
+if __name__ == '__main__':
+    if PROFILER.configure():
+        PROFILER.instrument(Program, PROFILED_METHODS)
+        PROFILER.instrument(CityIndex, {'lookup': 'city_index_lookup'})
+        PROFILER.instrument(FuzzyMatcher, {'suggest': 'fuzzy_suggest'})
+        PROFILER.instrument(SpatialIndex, {'nearest': 'spatial_nearest'})
+        PROFILER.instrument(BatchWriter, {'write': 'batch_write'})
+    obj_program = Program()
+    obj_program.start()
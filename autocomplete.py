@@ -0,0 +1,174 @@
+"""
+Prefix completion index for city names, used for Tab completion at the city prompts, for inputs that are the start of
+a city name, and by the /complete endpoint of service.py.
+The normalised names are kept in one sorted list, so the cities starting with a prefix are a contiguous range found
+with two binary searches (bisect). The best k cities in the range are picked by rank (most populous first, then
+spreadsheet order) with numpy.argpartition, so a query costs microseconds even for one-letter prefixes.
+"""
+
+import bisect
+import sys
+import numpy as np
+
+from city_index import normalise_name
+from city_table import city_columns
+
+
+def prefix_end(prefix):
+    """
+    :param prefix: A non-empty string.
+    :return: The smallest string that is greater than every string starting with the prefix.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class PrefixIndex:
+    def __init__(self, city_list):
+        """
+        Builds the sorted name list from the city list.
+        :param city_list: CityTable or list of rows from the geo_city sheet. Format: Country, City, Latitude, ...
+        """
+        self.city_list = city_list
+        countries, names, _, _, populations = city_columns(city_list)
+        names = [normalise_name(name) for name in names]
+        order = sorted(range(len(city_list)), key=names.__getitem__)
+        self.names = [names[row_idx] for row_idx in order]  # Sorted normalised names.
+        self.rows = np.array(order, dtype=np.int64)  # City list row of each sorted name.
+        self.countries = [normalise_name(country) for country in countries]
+        self.set_ranks(populations)
+
+    def set_ranks(self, populations):
+        """
+        Ranks the cities by population.
+        :param populations: The population of every row of the city list.
+        """
+        populations = np.asarray(populations, dtype=np.float64)
+        # Rank of every row: 0 for the most populous city. Ties keep spreadsheet order.
+        ranks = np.empty(len(populations), dtype=np.int64)
+        ranks[np.argsort(-populations, kind='stable')] = np.arange(len(populations))
+        self.ranks = ranks[self.rows]  # Rank of each sorted name.
+
+    def update(self, added_rows, removed_rows, populations):
+        """
+        Adds and removes cities in place of a rebuild (see city_delta.py). The names are inserted into (or deleted
+        from) the sorted list with binary searches; only the population ranks are recalculated.
+        :param added_rows: The rows of the new cities (after every row already in the index).
+        :param removed_rows: The rows of the removed cities.
+        :param populations: The population of every row of the city list (after the update).
+        """
+        rows = self.rows.tolist()
+        removed_rows = set(removed_rows)
+        for row_idx in removed_rows:
+            name = normalise_name(self.city_list[row_idx][1])
+            start, end = bisect.bisect_left(self.names, name), bisect.bisect_right(self.names, name)
+            if row_idx in rows[start:end]:
+                position = start + rows[start:end].index(row_idx)
+                del self.names[position], rows[position]
+        for row_idx in added_rows:
+            self.countries.append(normalise_name(self.city_list[row_idx][0]))
+            if row_idx in removed_rows:
+                continue  # Added and removed by the same delta.
+            name = normalise_name(self.city_list[row_idx][1])
+            position = bisect.bisect_right(self.names, name)  # After the earlier rows of the same name.
+            self.names.insert(position, name)
+            rows.insert(position, row_idx)
+        self.rows = np.array(rows, dtype=np.int64)
+        self.set_ranks(populations)
+
+    def name_range(self, prefix):
+        """
+        :param prefix: A normalised name prefix.
+        :return: The start and end positions of the names starting with the prefix.
+        """
+        if not prefix:
+            return 0, len(self.names)
+        return bisect.bisect_left(self.names, prefix), bisect.bisect_left(self.names, prefix_end(prefix))
+
+    def complete(self, query, k=5, unique_names=False):
+        """
+        Finds the most populous cities whose names start with the query.
+        "City, Country" queries also filter on the start of the country name.
+        :param query: The text typed so far.
+        :param k: The number of completions.
+        :param unique_names: Whether to return only the most populous city of each name.
+        :return: List of up to k row indices, most populous first.
+        """
+        name, comma, country = normalise_name(query).partition(",")
+        name, country = name.strip(), country.strip()
+        if not name or k <= 0:
+            return []
+        start, end = self.name_range(name)
+        ranks = self.ranks[start:end]
+        if comma or unique_names:
+            # Filters while walking the range in rank order. The range is sorted once only when it is needed.
+            order = np.argsort(ranks, kind='stable')
+        elif len(ranks) > k:
+            order = np.argpartition(ranks, k)[:k]
+            order = order[np.argsort(ranks[order])]
+        else:
+            order = np.argsort(ranks)
+        results = []
+        seen = set()
+        for row_idx in self.rows[start:end][order].tolist():
+            if comma and not self.countries[row_idx].startswith(country):
+                continue
+            if unique_names:
+                row_name = normalise_name(self.city_list[row_idx][1])
+                if row_name in seen:
+                    continue
+                seen.add(row_name)
+            results.append(row_idx)
+            if len(results) == k:
+                break
+        return results
+
+    def labels(self, query, k=5, unique_names=False):
+        """
+        :param query: The text typed so far.
+        :param k: The number of completions.
+        :param unique_names: Whether to return only the most populous city of each name.
+        :return: List of "City, Country" completions, most populous first.
+        """
+        return ["{}, {}".format(self.city_list[row_idx][1], self.city_list[row_idx][0])
+                for row_idx in self.complete(query, k, unique_names)]
+
+
+class TabCompleter:
+    def __init__(self, prefix_index, k=20):
+        """
+        readline completer offering "City, Country" completions for the text typed at a prompt.
+        :param prefix_index: The PrefixIndex.
+        :param k: The largest number of completions offered.
+        """
+        self.prefix_index = prefix_index
+        self.k = k
+        self.matches = []
+
+    def __call__(self, text, state):
+        """
+        Called by readline with state 0, 1, 2, ... until it returns None.
+        """
+        if state == 0:
+            self.matches = self.prefix_index.labels(text, self.k)
+        return self.matches[state] if state < len(self.matches) else None
+
+
+def enable_tab_completion(prefix_index):
+    """
+    Turns on Tab completion of city names for input() if readline is available and the program runs in a terminal.
+    :param prefix_index: The PrefixIndex.
+    :return: True if Tab completion was turned on.
+    """
+    if not (sys.stdin.isatty() and sys.stdout.isatty()):
+        return False
+    try:
+        import readline
+    except ImportError:  # Not available on Windows.
+        return False
+    readline.set_completer(TabCompleter(prefix_index))
+    readline.set_completer_delims('\t\n')  # Completes the whole input, which can contain spaces and commas.
+    if 'libedit' in (readline.__doc__ or ''):  # macOS Python uses libedit, which has its own binding syntax.
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
+    return True
@@ -0,0 +1,418 @@
+"""
+Non-interactive batch routing: reads origin/destination pairs from a CSV file (or stdin) in chunks and streams the
+travel time rows to an output CSV file (or stdout) in the same format as Program.write_to_file.
+Each chunk is resolved through the city index (with the fuzzy matcher as a fallback for misspelt names), calculated
+with one vectorised BatchRouter call and written straight away, so memory use does not grow with the input size.
+A misspelt name is only replaced by a city name within a few edits of it (see max_fuzzy_distance); names further from
+every city are written as "City not found". Every replacement is listed on stderr at the end.
+
+With --workers the chunks are spread across a pool of worker processes. The dataset is exported once as plain .npy
+columns (REA_columns, see dataset_cache.export_columns) which every worker memory-maps read-only, so the coordinates,
+populations and country codes are one copy in the OS page cache shared by all the workers rather than a private copy
+(or a pickled one) per worker. Each worker still builds its own name list and CityIndex. Workers receive blocks of raw
+input lines and results are written in input order.
+
+With --format npz the results are written as numeric columns (whole minutes, distances and mode codes) instead of
+formatted text, see columnar_output.py.
+
+Usage: python batch_writer.py [input.csv|-] [output.csv|-] [--chunk-size N] [--no-header] [--no-fuzzy] [--workers N]
+                              [--format csv|npz] [--compress]
+The input has one route per row: origin city, destination city ("City" or "City, Country" in quotes).
+With --workers a route must not span several lines.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import io
+import itertools
+import os
+import sys
+import numpy as np
+
+from city_index import CityIndex
+from columnar_output import ColumnarWriter
+from fuzzy_match import FuzzyMatcher
+from route_calc import BatchRouter
+from city_table import city_columns
+
+DEFAULT_CHUNK_SIZE = 50000
+MAX_RESOLVED_NAMES = 100000  # Limits the memory used by the resolved name memo.
+NOT_FOUND = -1
+MAX_FUZZY_DISTANCE = 3  # Most edits between a misspelt name and the city name that replaces it.
+REPORTED_SUBSTITUTIONS = 20  # Replaced names listed on stderr (the rest are only counted).
+WORKER_WRITER = None  # The BatchWriter of a worker process (see write_parallel).
+# Column titles of the shipped modes whose header label differs from the speed sheet name. Other modes use their name.
+HEADER_LABELS = {'High Speed Rail': 'High-speed Rail'}
+
+
+def read_chunks(rows, chunk_size):
+    """
+    Splits an iterable of CSV rows into lists of at most chunk_size rows.
+    :param rows: Iterable of rows.
+    :param chunk_size: The number of rows per chunk.
+    :return: Generator of lists of rows.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def header_row(modes_list):
+    """
+    :param modes_list: The names of the modes of transport (one travel time column each).
+    :return: The header row of the CSV output. The shipped modes keep the titles of the original write_to_file.
+    """
+    return ["Origin to Destination", "Recommended travel"] + ["Via " + HEADER_LABELS.get(mode, mode)
+                                                              for mode in modes_list]
+
+
+def format_time(minutes):
+    """
+    :param minutes: Whole minutes.
+    :return: The travel time in the "{}h.{}m." format of write_to_file.
+    """
+    return "{}h.{}m.".format(minutes // 60, minutes % 60)
+
+
+def max_fuzzy_distance(name):
+    """
+    :param name: A misspelt city name.
+    :return: The most edits allowed to replace it: one per four characters (at least 1, at most MAX_FUZZY_DISTANCE).
+    """
+    return min(MAX_FUZZY_DISTANCE, max(1, len(name) // 4))
+
+
+def report_substitutions(substitutions, file=sys.stderr):
+    """
+    Lists the misspelt names that were replaced by a city name.
+    :param substitutions: List of (input name, city name).
+    :param file: File object to print to.
+    """
+    if not substitutions:
+        return
+    print("Replaced {} misspelt city names (use --no-fuzzy to leave them unresolved):".format(len(substitutions)),
+          file=file)
+    for name, city_name in substitutions[:REPORTED_SUBSTITUTIONS]:
+        print("  {} -> {}".format(name, city_name), file=file)
+    if len(substitutions) > REPORTED_SUBSTITUTIONS:
+        print("  ...", file=file)
+
+
+def unresolved_text(pairs, found):
+    """
+    :param pairs: List of [origin name, destination name] rows.
+    :param found: Boolean array of the routes that were found.
+    :return: List of the "origin to destination" text of the routes that were not found.
+    """
+    return [" to ".join(pair) for pair, is_found in zip(pairs, found.tolist()) if not is_found]
+
+
+class TimeText(dict):
+    """
+    Dictionary of whole minutes -> formatted travel time. Each distinct time is formatted once, on first use.
+    """
+    def __missing__(self, minutes):
+        text = self[minutes] = format_time(minutes)
+        return text
+
+
+class BatchWriter:
+    def __init__(self, city_list, modes_list, speeds_list, fuzzy=True, city_index=None, fuzzy_matcher=None):
+        """
+        Sets up the lookup structures. Prebuilt structures (e.g. from Program) can be passed in to be reused.
+        :param city_list: CityTable or list of rows from the geo_city sheet. Format: Country, City, Latitude, ...
+        :param modes_list: The names of the modes of transport.
+        :param speeds_list: The ModeRegistry (the transport list from load_table), or the speed of each mode of
+                            transport in km/h for the default formulas.
+        :param fuzzy: Whether names without an exact match are replaced by the closest city name (if it is within
+                      max_fuzzy_distance edits).
+        :param city_index: Optional prebuilt CityIndex.
+        :param fuzzy_matcher: Optional prebuilt FuzzyMatcher. Otherwise it is built on the first misspelt name.
+        """
+        self.city_list = city_list
+        self.names = city_columns(city_list)[1]  # Read once per route when formatting, so kept as a list.
+        self.modes_list = list(modes_list)
+        self.fuzzy = fuzzy
+        self.city_index = city_index or CityIndex(city_list)
+        self.fuzzy_matcher = fuzzy_matcher
+        self.router = BatchRouter(city_list, speeds_list)
+        self.resolved = {}  # Input name -> row index (or NOT_FOUND). Names repeat a lot in route files.
+        self.substitutions = []  # (Input name, city name) of every misspelt name replaced by the fuzzy matcher.
+        self.time_text = TimeText()  # Formatting every cell is the slowest part of a batch.
+
+    def resolve(self, name):
+        """
+        Finds the row index for a city name, using the fuzzy matcher when there is no exact match. Replacements are
+        recorded in self.substitutions.
+        :param name: The city name ("City" or "City, Country").
+        :return: The row index, or NOT_FOUND.
+        """
+        row_idx = self.resolved.get(name)
+        if row_idx is not None:
+            return row_idx
+        row_idx = self.city_index.lookup(name)
+        if row_idx is None:
+            row_idx = NOT_FOUND
+            if self.fuzzy and name.strip():
+                if self.fuzzy_matcher is None:
+                    self.fuzzy_matcher = FuzzyMatcher(self.names)
+                matches = self.fuzzy_matcher.suggest(name.strip(), 1, max_fuzzy_distance(name.strip()))
+                if matches:
+                    row_idx = matches[0][2]
+                    self.substitutions.append((name, matches[0][0]))
+        if len(self.resolved) >= MAX_RESOLVED_NAMES:
+            self.resolved.clear()
+        self.resolved[name] = row_idx
+        return row_idx
+
+    def resolve_chunk(self, pairs):
+        """
+        Resolves the origin and destination of every pair.
+        :param pairs: List of [origin name, destination name] rows.
+        :return: Arrays of origin and destination row indices (NOT_FOUND where a name could not be resolved).
+        """
+        origin_idx = np.array([self.resolve(pair[0]) if pair else NOT_FOUND for pair in pairs], dtype=np.int64)
+        dest_idx = np.array([self.resolve(pair[1]) if len(pair) > 1 else NOT_FOUND for pair in pairs],
+                            dtype=np.int64)
+        return origin_idx, dest_idx
+
+    def calculate_chunk(self, pairs):
+        """
+        Resolves and calculates a chunk of routes.
+        :param pairs: List of [origin name, destination name] rows.
+        :return: Origin rows, destination rows, a boolean array of the routes that were found, the distances, the
+                 whole minutes per mode and the index of the fastest mode (arrays cover the found routes only).
+        """
+        origin_idx, dest_idx = self.resolve_chunk(pairs)
+        found = (origin_idx != NOT_FOUND) & (dest_idx != NOT_FOUND)
+        distance, minutes = self.router.travel_times(origin_idx[found], dest_idx[found])
+        return origin_idx, dest_idx, found, distance, minutes, self.router.fastest_modes(minutes)
+
+    def format_rows(self, origin_idx, dest_idx, found, minutes, fastest, unresolved):
+        """
+        Formats calculated routes as output rows (the CSV formatter on top of the numeric results).
+        :param origin_idx: Array of origin rows.
+        :param dest_idx: Array of destination rows.
+        :param found: Boolean array of the routes that were found.
+        :param minutes: The whole minutes per mode of the found routes.
+        :param fastest: The index of the fastest mode of the found routes.
+        :param unresolved: List of the "origin to destination" text of the routes that were not found.
+        :return: List of output rows in the write_to_file format.
+        """
+        time_text = self.time_text.__getitem__
+        names = self.names
+        results = iter(zip(minutes.tolist(), fastest.tolist()))
+        unresolved = iter(unresolved)
+        rows = []
+        for origin, dest, is_found in zip(origin_idx.tolist(), dest_idx.tolist(), found.tolist()):
+            if is_found:
+                times, mode = next(results)
+                rows.append([names[origin] + " to " + names[dest], self.modes_list[mode]] +
+                            list(map(time_text, times)))
+            else:
+                rows.append([next(unresolved), "City not found"] + [""] * len(self.modes_list))
+        return rows
+
+    def format_chunk(self, pairs):
+        """
+        Creates the output rows for a chunk of routes.
+        :param pairs: List of [origin name, destination name] rows.
+        :return: List of output rows in the write_to_file format.
+        """
+        origin_idx, dest_idx, found, distance, minutes, fastest = self.calculate_chunk(pairs)
+        return self.format_rows(origin_idx, dest_idx, found, minutes, fastest, unresolved_text(pairs, found))
+
+    def columns_chunk(self, pairs):
+        """
+        Calculates a chunk of routes for the numeric output.
+        :param pairs: List of [origin name, destination name] rows.
+        :return: The arguments of ColumnarWriter.write_chunk.
+        """
+        origin_idx, dest_idx, found, distance, minutes, fastest = self.calculate_chunk(pairs)
+        return origin_idx, dest_idx, found, distance, minutes, fastest, unresolved_text(pairs, found)
+
+    def write(self, pairs, output, chunk_size=DEFAULT_CHUNK_SIZE, header=True):
+        """
+        Streams every pair through the calculation and writes the results as they are ready.
+        :param pairs: Iterable of [origin name, destination name] rows.
+        :param output: File object to write the CSV rows to.
+        :param chunk_size: The number of routes calculated per vectorised call.
+        :param header: Whether to write the header row first.
+        :return: The number of routes written.
+        """
+        rec_write = csv.writer(output, delimiter=',', quotechar='"', lineterminator='\n', quoting=csv.QUOTE_MINIMAL)
+        if header:
+            rec_write.writerow(header_row(self.modes_list))
+        count = 0
+        for chunk in read_chunks(pairs, chunk_size):
+            rec_write.writerows(self.format_chunk(chunk))
+            count += len(chunk)
+        return count
+
+    def write_columns(self, pairs, path, chunk_size=DEFAULT_CHUNK_SIZE, compress=False):
+        """
+        Streams every pair through the calculation and writes the numeric results (see columnar_output).
+        :param pairs: Iterable of [origin name, destination name] rows.
+        :param path: Path of the .npz file to write.
+        :param chunk_size: The number of routes calculated per vectorised call (and per chunk of the file).
+        :param compress: Whether the columns are deflate-compressed.
+        :return: The number of routes written.
+        """
+        with ColumnarWriter(path, self.modes_list, compress) as writer:
+            for chunk in read_chunks(pairs, chunk_size):
+                writer.write_chunk(*self.columns_chunk(chunk))
+        return writer.routes
+
+
+def init_worker(column_dir, fuzzy):
+    """
+    Sets up a worker process: memory-maps the exported dataset columns and builds its BatchWriter.
+    :param column_dir: The column directory written by dataset_cache.export_columns.
+    :param fuzzy: Whether misspelt names are replaced by the closest city name.
+    """
+    global WORKER_WRITER
+    from dataset_cache import load_mapped_table
+    city_list, transport_list = load_mapped_table(column_dir)
+    WORKER_WRITER = BatchWriter(city_list, transport_list.names, transport_list, fuzzy=fuzzy)
+
+
+def format_lines(text):
+    """
+    Worker task: calculates a block of input lines.
+    :param text: The raw CSV lines of one chunk.
+    :return: The number of routes, the CSV text of the output rows and the names replaced by the fuzzy matcher.
+    """
+    output = io.StringIO()
+    count = WORKER_WRITER.write(csv.reader(io.StringIO(text)), output, header=False)
+    return count, output.getvalue(), take_substitutions()
+
+
+def calculate_lines(text):
+    """
+    Worker task: calculates a block of input lines for the numeric output.
+    :param text: The raw CSV lines of one chunk.
+    :return: The number of routes, the arguments of ColumnarWriter.write_chunk and the names replaced by the fuzzy
+             matcher.
+    """
+    pairs = list(csv.reader(io.StringIO(text)))
+    return len(pairs), WORKER_WRITER.columns_chunk(pairs), take_substitutions()
+
+
+def take_substitutions():
+    """
+    :return: The names replaced by the fuzzy matcher of the worker since the last call.
+    """
+    substitutions, WORKER_WRITER.substitutions = WORKER_WRITER.substitutions, []
+    return substitutions
+
+
+def write_parallel(in_file, out_file, xlsx_path, workers, chunk_size=DEFAULT_CHUNK_SIZE, fuzzy=True, header=True,
+                   substitutions=None):
+    """
+    Streams the input lines through a pool of worker processes and writes the results in input order.
+    At most two chunks per worker are in flight, so memory use does not grow with the input size.
+    :param in_file: File object of input CSV lines (header already skipped).
+    :param out_file: File object to write the CSV rows to, or a ColumnarWriter for the numeric output.
+    :param xlsx_path: Path of REA.xlsx.
+    :param workers: The number of worker processes.
+    :param chunk_size: The number of lines sent to a worker per task.
+    :param fuzzy: Whether misspelt names are replaced by the closest city name.
+    :param header: Whether to write the CSV header row first.
+    :param substitutions: Optional list extended with the (input name, city name) replaced by the fuzzy matcher.
+    :return: The number of routes written.
+    """
+    from dataset_cache import export_columns, load_cache, load_modes
+    column_dir = export_columns(xlsx_path)  # Exports the columns once, before the workers map them.
+    columnar = isinstance(out_file, ColumnarWriter)
+    if header and not columnar:
+        csv.writer(out_file, lineterminator='\n').writerow(header_row(load_modes(load_cache(xlsx_path)).names))
+    count = 0
+    pending = collections.deque()
+
+    def collect():
+        """
+        Waits for the oldest chunk in flight and writes its results.
+        :return: The number of routes in the chunk.
+        """
+        routes, output, replaced = pending.popleft().result()
+        if substitutions is not None:
+            substitutions.extend(replaced)
+        if columnar:
+            out_file.write_chunk(*output)
+        else:
+            out_file.write(output)
+        return routes
+
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker,
+                                                initargs=(column_dir, fuzzy)) as executor:
+        for lines in read_chunks(in_file, chunk_size):
+            pending.append(executor.submit(calculate_lines if columnar else format_lines, "".join(lines)))
+            if len(pending) >= 2 * workers:
+                count += collect()
+        while pending:
+            count += collect()
+    return count
+
+
+def main():
+    """
+    Command line entry point for batch jobs.
+    """
+    from dataset_cache import load_cache, load_modes, load_table
+    parser = argparse.ArgumentParser(description="Writes travel times for a CSV file of origin/destination pairs.")
+    parser.add_argument('input', nargs='?', default='-', help="Input CSV file (- for stdin).")
+    parser.add_argument('output', nargs='?', default='-', help="Output CSV file (- for stdout) or .npz file.")
+    parser.add_argument('--format', choices=('csv', 'npz'), default='csv',
+                        help="csv: formatted travel times. npz: numeric columns (see columnar_output.py).")
+    parser.add_argument('--compress', action='store_true', help="Compress the npz columns.")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Routes per vectorised chunk.")
+    parser.add_argument('--no-header', action='store_true', help="The input file has no header row.")
+    parser.add_argument('--no-fuzzy', action='store_true', help="Don't replace misspelt names with the closest city.")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (1 = no pool, 0 = one per CPU).")
+    args = parser.parse_args()
+    xlsx_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx')
+    columnar = args.format == 'npz'
+    if columnar and args.output == '-':
+        parser.error("The npz format needs an output file.")
+
+    substitutions = []
+    in_file = sys.stdin if args.input == '-' else open(args.input, newline='')
+    if columnar:
+        out_file = None
+    else:
+        out_file = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        if args.workers != 1:
+            if not args.no_header:
+                next(in_file, None)
+            if columnar:
+                out_file = ColumnarWriter(args.output, load_modes(load_cache(xlsx_path)).names, args.compress)
+            count = write_parallel(in_file, out_file, xlsx_path, args.workers or os.cpu_count(), args.chunk_size,
+                                   fuzzy=not args.no_fuzzy, substitutions=substitutions)
+        else:
+            city_list, transport_list = load_table(xlsx_path)
+            writer = BatchWriter(city_list, transport_list.names, transport_list, fuzzy=not args.no_fuzzy)
+            pairs = csv.reader(in_file)
+            if not args.no_header:
+                next(pairs, None)
+            if columnar:
+                count = writer.write_columns(pairs, args.output, args.chunk_size, args.compress)
+            else:
+                count = writer.write(pairs, out_file, args.chunk_size)
+            substitutions = writer.substitutions
+    finally:
+        if in_file is not sys.stdin:
+            in_file.close()
+        if out_file is not None and out_file is not sys.stdout:
+            out_file.close()
+    print("Wrote {} routes.".format(count), file=sys.stderr)
+    report_substitutions(substitutions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: per-keystroke latency of prefix completion, a linear scan with startswith vs the sorted PrefixIndex.
+Every prefix of 1,000 city names (one query per keystroke) is completed to the top 5 cities by population, and the
+results of both paths are compared.
+Usage: python benchmarks/bench_autocomplete.py [number of names]
+"""
+
+import random
+import sys
+import time
+import numpy as np
+
+from bench_utils import REA_PATH, print_rate
+from autocomplete import PrefixIndex
+from city_index import normalise_name
+from dataset_cache import load_dataset
+
+
+def linear_scan(city_list, names, query, k=5):
+    """
+    :param city_list: The city list.
+    :param names: The normalised city names.
+    :param query: The typed prefix.
+    :param k: The number of completions.
+    :return: The k most populous rows whose names start with the prefix (ties in spreadsheet order).
+    """
+    prefix = normalise_name(query)
+    rows = [row_idx for row_idx, name in enumerate(names) if name.startswith(prefix)]
+    return sorted(rows, key=lambda row_idx: (-city_list[row_idx][4], row_idx))[:k]
+
+
+def latencies_us(func, queries):
+    """
+    :return: Array of the latency of every call in microseconds.
+    """
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    city_list, _ = load_dataset(REA_PATH)
+    rng = random.Random(3)
+    typed = [rng.choice(city_list)[1] for _ in range(count)]
+    queries = [name[:length] for name in typed for length in range(1, len(name) + 1)]
+
+    start = time.perf_counter()
+    index = PrefixIndex(city_list)
+    print("Index build: {:.1f} ms".format((time.perf_counter() - start) * 1000))
+    names = [normalise_name(city[1]) for city in city_list]
+    mismatches = sum(1 for query in queries[::10] if index.complete(query, 5) != linear_scan(city_list, names, query))
+    print("Checked {} prefixes against the linear scan: {} mismatches".format(len(queries[::10]), mismatches))
+
+    scan = latencies_us(lambda query: linear_scan(city_list, names, query), queries[::10])
+    fast = latencies_us(lambda query: index.complete(query, 5), queries)
+    for label, times in (("Linear scan (before)", scan), ("PrefixIndex (after)", fast)):
+        print_rate(label + " mean", times.mean(), "us/keystroke")
+        print_rate(label + " p99", np.percentile(times, 99), "us/keystroke")
+    print("Speedup (mean): {:.0f}x".format(scan.mean() / fast.mean()))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: routes per second for the scalar Program.latlng_to_dist/travel_time path and the vectorised BatchRouter.
+Also checks that both paths give identical distances and travel times for every sampled route.
+Usage: python benchmarks/bench_batch_routes.py [number of routes]
+"""
+
+import contextlib
+import io
+import sys
+import time
+import numpy as np
+
+from bench_utils import load_program, print_rate
+from route_calc import BatchRouter
+
+
+def scalar_routes(program, origin_idx, dest_idx):
+    """
+    Runs the interactive path (city records, latlng_to_dist, travel_time) for every route, hiding its printing.
+    :param program: The Program instance.
+    :param origin_idx: List of origin row indices.
+    :param dest_idx: List of destination row indices.
+    :return: List of (distance, [minutes per mode]) per route.
+    """
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origin, dest in zip(origin_idx, dest_idx):
+            program.ocity_list = program.city_index.record(origin)
+            program.dcity_list = program.city_index.record(dest)
+            distance = program.latlng_to_dist()
+            program.travel_time(distance)
+            results.append((distance, [hours * 60 + minutes for hours, minutes in program.times_list]))
+    return results
+
+
+def main():
+    routes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    program = load_program()
+    router = BatchRouter(program.city_list, program.speeds_list)
+    rng = np.random.default_rng(0)
+    origin_idx = rng.integers(0, len(program.city_list), routes)
+    dest_idx = rng.integers(0, len(program.city_list), routes)
+
+    sample = min(routes, 20000)
+    start = time.perf_counter()
+    expected = scalar_routes(program, origin_idx[:sample].tolist(), dest_idx[:sample].tolist())
+    scalar_rate = sample / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    distance, minutes = router.travel_times(origin_idx, dest_idx)
+    router.fastest_modes(minutes)
+    batch_rate = routes / (time.perf_counter() - start)
+
+    mismatches = sum(1 for i, (dist, mins) in enumerate(expected)
+                     if dist != distance[i] or mins != minutes[i].tolist())
+    print("Checked {} routes against the scalar path: {} mismatches".format(sample, mismatches))
+    print_rate("Scalar travel_time (before)", scalar_rate, "routes/s")
+    print_rate("BatchRouter, {} routes (after)".format(routes), batch_rate, "routes/s")
+    print("Speedup: {:.0f}x".format(batch_rate / scalar_rate))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
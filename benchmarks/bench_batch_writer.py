@@ -0,0 +1,88 @@
+"""
+Benchmark: routes per second and peak memory of the streaming batch writer (batch_writer.py).
+Generates route files of random city names, runs the writer on each in a fresh interpreter and reports the
+throughput and peak resident memory, plus the per-route loop write_to_file used before (city_check, latlng_to_dist
+and travel_time for every pair) on a smaller sample for comparison.
+Usage: python benchmarks/bench_batch_writer.py [route counts, e.g. 100000 1000000]
+"""
+
+import contextlib
+import csv
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import PROGRAM_DIR, load_program, print_rate
+
+CHILD_CODE = """
+import resource, sys, time
+sys.argv = ['batch_writer.py', {input!r}, {output!r}]
+import batch_writer
+start = time.perf_counter()
+batch_writer.main()
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_route_file(path, city_list, routes, seed=0):
+    """
+    Writes a route file of random origin/destination city names.
+    :param path: The file to write.
+    :param city_list: The city list.
+    :param routes: The number of routes.
+    :param seed: The random seed.
+    """
+    rng = random.Random(seed)
+    names = [city[1] for city in city_list]
+    with open(path, 'w', newline='') as file:
+        rec_write = csv.writer(file)
+        rec_write.writerow(['origin', 'destination'])
+        for _ in range(routes):
+            rec_write.writerow([rng.choice(names), rng.choice(names)])
+
+
+def per_route_loop(program, pairs):
+    """
+    The loop write_to_file used before the batch writer: one city_check/latlng_to_dist/travel_time per route.
+    :param program: The Program instance.
+    :param pairs: List of [origin name, destination name].
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origin_destination in pairs:
+            cities = []
+            for instance in origin_destination:
+                program.input = instance
+                cities.append(program.city_check())
+            program.ocity_list, program.dcity_list = cities
+            program.travel_time(program.latlng_to_dist())
+
+
+def main():
+    route_counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    program = load_program()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sample_path = os.path.join(tmp_dir, 'sample.csv')
+        write_route_file(sample_path, program.city_list, 10000)
+        with open(sample_path, newline='') as file:
+            pairs = list(csv.reader(file))[1:]
+        start = time.perf_counter()
+        per_route_loop(program, pairs)
+        print_rate("Per-route loop (before), 10,000 routes", len(pairs) / (time.perf_counter() - start), "routes/s")
+
+        for routes in route_counts:
+            input_path = os.path.join(tmp_dir, 'routes.csv')
+            output_path = os.path.join(tmp_dir, 'results.csv')
+            write_route_file(input_path, program.city_list, routes)
+            result = subprocess.run([sys.executable, '-c', CHILD_CODE.format(input=input_path, output=output_path)],
+                                    cwd=PROGRAM_DIR, check=True, capture_output=True, text=True)
+            elapsed, max_rss_kb = result.stdout.split()
+            print_rate("batch_writer, {:,} routes".format(routes), routes / float(elapsed), "routes/s")
+            print("{:<40}{:>16,.1f} MB".format("  peak resident memory", int(max_rss_kb) / 1024))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: charts per second when rendering the travel time bar chart of 1,000 random routes to PNG files.
+Compares building a new pyplot figure per chart (the Program.mpl_hbc approach, on the Agg backend) with the reused
+ChartRenderer figure, in this process and across a process pool.
+Usage: python benchmarks/bench_chart_renderer.py [--routes 1000] [--format png|svg] [--workers N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from bench_utils import REA_PATH, print_rate
+from chart_renderer import FORMATS, chart_file_name, chart_rows, render_routes
+from dataset_cache import load_table
+from route_calc import BatchRouter
+
+
+def random_routes(city_list, speeds_list, count, seed=0):
+    """
+    :return: List of (origin name, destination name, [whole minutes per mode]) for random routes.
+    """
+    rng = np.random.default_rng(seed)
+    origin_idx, dest_idx = rng.integers(0, len(city_list), count), rng.integers(0, len(city_list), count)
+    minutes = BatchRouter(city_list, speeds_list).travel_times(origin_idx, dest_idx)[1]
+    return [(city_list.name(o), city_list.name(d), times) for o, d, times in
+            zip(origin_idx.tolist(), dest_idx.tolist(), minutes.tolist())]
+
+
+def render_new_figures(modes_list, routes, out_dir, file_format):
+    """
+    Renders every chart with a new pyplot figure, like Program.mpl_hbc.
+    """
+    for number, (origin, destination, minutes) in enumerate(routes):
+        rows = chart_rows(modes_list, minutes)
+        hours = [time / 60 for _, time in rows]
+        fig = plt.figure(figsize=(12, 8), dpi=80, facecolor='w', edgecolor='k')
+        positions = list(range(len(rows)))
+        plt.barh(positions, hours, align='center', alpha=0.5, color=["#00d6ab"] * (len(rows) - 1) + ["#c900d4"])
+        plt.yticks(positions, [mode for mode, _ in rows])
+        plt.xlabel('Travel Time - Hours', fontsize=12)
+        plt.title("Travel Time: " + origin + " - " + destination, fontsize=20, fontweight="bold", y=1.05)
+        for position, (_, time) in enumerate(rows):
+            plt.text(hours[position], position, "   {}hr. {}min.".format(time // 60, time % 60), va='center',
+                     color="#222222", fontweight="bold")
+        plt.figtext(0.32, 0.02, "Recommended mode of transport: " + rows[-1][0], fontsize=14, color="#c900d4",
+                    fontweight='bold')
+        fig.savefig(os.path.join(out_dir, chart_file_name(number, origin, destination, file_format)))
+        plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--routes', type=int, default=1000)
+    parser.add_argument('--format', choices=FORMATS, default='png')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    city_list, transport_list = load_table(REA_PATH)
+    modes_list, speeds_list = zip(*transport_list)
+    routes = random_routes(city_list, speeds_list, args.routes)
+    print("{} routes, {} files, {} CPUs".format(len(routes), args.format, os.cpu_count()))
+
+    cases = [("New pyplot figure per chart (before)", lambda out_dir: render_new_figures(
+                 modes_list, routes, out_dir, args.format)),
+             ("Reused ChartRenderer figure", lambda out_dir: render_routes(
+                 modes_list, routes, out_dir, args.format, 1))]
+    if args.workers > 1:
+        cases.append(("Reused figures, {} worker processes".format(args.workers), lambda out_dir: render_routes(
+            modes_list, routes, out_dir, args.format, args.workers)))
+    for label, render in cases:
+        with tempfile.TemporaryDirectory() as out_dir:
+            start = time.perf_counter()
+            render(out_dir)
+            elapsed = time.perf_counter() - start
+            written = len(os.listdir(out_dir))
+        print_rate(label, len(routes) / elapsed, "charts/s")
+        if written != len(routes):
+            print("  Wrote {} of {} charts".format(written, len(routes)))
+
+
+if __name__ == '__main__':
+    main()
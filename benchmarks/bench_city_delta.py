@@ -0,0 +1,178 @@
+"""
+Benchmark: applying a 100-city delta (40 added, 40 moved and 20 removed cities, see city_delta.py) to the loaded city
+data and its lookup structures in place vs rebuilding CityIndex, PrefixIndex, FuzzyMatcher and SpatialIndex from the
+updated city list (the only option before deltas; the route cache had to be emptied as well).
+Also checks that the updated structures answer exactly like freshly built ones: lookups, prefix completions, spell
+check suggestions and nearest/within searches, and that only the cached routes of moved or removed cities are dropped.
+Usage: python benchmarks/bench_city_delta.py [repeats]
+"""
+
+import csv
+import os
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+from bench_utils import REA_PATH
+from autocomplete import PrefixIndex
+from city_delta import HEADER, apply_delta, read_delta
+from city_index import CityIndex
+from city_table import CityTable
+from dataset_cache import load_table
+from fuzzy_match import FuzzyMatcher
+from route_cache import RouteCache
+from spatial_index import SpatialIndex
+
+ADDS, MOVES, REMOVES = 40, 40, 20
+CACHED_ROUTES = 20000
+
+
+def write_delta(city_list, path, rng):
+    """
+    Writes a random delta file. Half the added cities reuse an existing name in a new place (a duplicate name).
+    :param city_list: The CityTable.
+    :param path: Path of the CSV file to write.
+    :param rng: numpy random Generator.
+    :return: The number of changes written.
+    """
+    picks = rng.choice(len(city_list), ADDS + MOVES + REMOVES, replace=False).tolist()
+    lines = []
+    for i, row_idx in enumerate(picks[:ADDS]):
+        name = city_list.name(row_idx) if i % 2 else city_list.name(row_idx)[::-1].title()
+        lines.append(('add', 'Newland', name, round(rng.uniform(-60, 70), 4), round(rng.uniform(-180, 180), 4),
+                      int(rng.integers(1000, 5000000))))
+    for row_idx in picks[ADDS:ADDS + MOVES]:
+        lines.append(('move', city_list[row_idx][0], city_list.name(row_idx),
+                      round(city_list.lats[row_idx] + rng.uniform(-1, 1), 4),
+                      round(city_list.lngs[row_idx] + rng.uniform(-1, 1), 4), ''))
+    for row_idx in picks[ADDS + MOVES:]:
+        lines.append(('remove', city_list[row_idx][0], city_list.name(row_idx), '', '', ''))
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        writer.writerows(lines)
+    return len(lines)
+
+
+def build_structures(city_list):
+    """
+    :param city_list: The CityTable.
+    :return: The CityIndex, PrefixIndex, FuzzyMatcher and SpatialIndex built from it.
+    """
+    return (CityIndex(city_list), PrefixIndex(city_list), FuzzyMatcher(city_list.names()),
+            SpatialIndex(city_list.lats, city_list.lngs))
+
+
+def fill_route_cache(num_rows, rng):
+    """
+    :param num_rows: The number of cities.
+    :param rng: numpy random Generator.
+    :return: A RouteCache holding CACHED_ROUTES random routes.
+    """
+    route_cache = RouteCache(max_size=CACHED_ROUTES)
+    for origin, dest in rng.integers(0, num_rows, (CACHED_ROUTES, 2)).tolist():
+        route_cache.put(origin, dest, 1.0, (1,))
+    return route_cache
+
+
+def live_table(city_list):
+    """
+    :param city_list: A CityTable with removed rows.
+    :return: A new CityTable without the removed rows and the array of their rows in city_list.
+    """
+    live_rows = np.flatnonzero(~city_list.removed)
+    names = city_list.names()
+    return CityTable([names[row_idx] for row_idx in live_rows.tolist()], city_list.countries,
+                     city_list.country_codes[live_rows], city_list.lats[live_rows], city_list.lngs[live_rows],
+                     city_list.populations[live_rows]), live_rows
+
+
+def check(city_list, updated, changes, rng):
+    """
+    Compares the updated structures with structures built from the updated city list (without the removed rows).
+    :param city_list: The updated CityTable.
+    :param updated: The updated CityIndex, PrefixIndex, FuzzyMatcher and SpatialIndex.
+    :param changes: The applied CityChange list.
+    :param rng: numpy random Generator.
+    :return: The number of queries compared and the number of mismatches.
+    """
+    table, live_rows = live_table(city_list)
+    city_index, prefix_index, fuzzy_matcher, spatial_index = updated
+    fresh_index, fresh_prefix, fresh_fuzzy, fresh_spatial = build_structures(table)
+    to_row = live_rows.tolist()
+    names = sorted(set(city_list.names()))
+    sample = [names[i] for i in rng.choice(len(names), 2000, replace=False).tolist()]
+    sample += [change.city for change in changes] + [change.city + ", " + change.country for change in changes]
+    queries, mismatches = 0, 0
+
+    def compare(result, expected):
+        nonlocal queries, mismatches
+        queries += 1
+        mismatches += result != expected
+
+    for name in sample:
+        fresh = fresh_index.lookup(name)
+        compare(city_index.lookup(name), None if fresh is None else to_row[fresh])
+        compare(city_index.matches(name), [to_row[row_idx] for row_idx in fresh_index.matches(name)])
+        for prefix in (name[:1], name[:3]):
+            for unique_names in (False, True):
+                compare(prefix_index.complete(prefix, 5, unique_names),
+                        [to_row[row_idx] for row_idx in fresh_prefix.complete(prefix, 5, unique_names)])
+    for name in sample[::10]:
+        typo = name[1:] + name[:1]
+        compare(fuzzy_matcher.suggest(typo, 5),
+                [(match, dist, to_row[row_idx]) for match, dist, row_idx in fresh_fuzzy.suggest(typo, 5)])
+    lats = np.concatenate([rng.uniform(-60, 70, 1000), [change.lat or 0.0 for change in changes]])
+    lngs = np.concatenate([rng.uniform(-180, 180, 1000), [change.lng or 0.0 for change in changes]])
+    rows, dists = spatial_index.nearest(lats, lngs, 3)
+    fresh_rows, fresh_dists = fresh_spatial.nearest(lats, lngs, 3)
+    for i in range(len(lats)):
+        compare((rows[i].tolist(), dists[i].tolist()), (live_rows[fresh_rows[i]].tolist(), fresh_dists[i].tolist()))
+    for (rows, dists), (fresh_rows, fresh_dists) in zip(spatial_index.within(lats, lngs, 50),
+                                                        fresh_spatial.within(lats, lngs, 50)):
+        compare((rows.tolist(), dists.tolist()), (live_rows[fresh_rows].tolist(), fresh_dists.tolist()))
+    return queries, mismatches
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = np.random.default_rng(0)
+    delta_path = os.path.join(tempfile.mkdtemp(), 'delta.csv')
+    num_changes = write_delta(load_table(REA_PATH)[0], delta_path, rng)
+
+    delta_times, rebuild_times = [], []
+    for _ in range(repeats):
+        city_list = load_table(REA_PATH)[0]
+        structures = build_structures(city_list)
+        route_cache = fill_route_cache(len(city_list), np.random.default_rng(1))
+        routes_before = dict(route_cache.entries)
+        start = time.perf_counter()
+        changes = read_delta(delta_path)
+        summary = apply_delta(changes, city_list, *structures, route_cache=route_cache)
+        delta_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        build_structures(live_table(city_list)[0])
+        rebuild_times.append(time.perf_counter() - start)
+
+    original = load_table(REA_PATH)[0]
+    moved = np.flatnonzero(original.lats != city_list.lats[:len(original)]).tolist()
+    stale = set(moved) | set(np.flatnonzero(city_list.removed).tolist())
+    kept = {key: value for key, value in routes_before.items() if key[0] not in stale and key[1] not in stale}
+    queries, mismatches = check(city_list, structures, changes, rng)
+
+    print("Delta of {} changes: {} added, {} moved, {} removed".format(num_changes, summary.added, summary.moved,
+                                                                       summary.removed))
+    print("{:<44}{:>12.1f} ms".format("Full rebuild of the indices (before)", statistics.median(rebuild_times) * 1e3))
+    print("{:<44}{:>12.1f} ms".format("Incremental delta (read + apply)", statistics.median(delta_times) * 1e3))
+    print("Speed-up: {:.0f}x".format(statistics.median(rebuild_times) / statistics.median(delta_times)))
+    print("Route cache: {:,} of {:,} routes kept ({:,} discarded), {} mismatches against the expected routes".format(
+        len(route_cache.entries), len(routes_before), summary.routes_discarded,
+        int(route_cache.entries != kept)))
+    print("Checked {:,} queries against freshly built indices: {} mismatches".format(queries, mismatches))
+
+
+if __name__ == '__main__':
+    main()
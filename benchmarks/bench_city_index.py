@@ -0,0 +1,50 @@
+"""
+Benchmark: exact city lookups per second.
+Compares the linear scan city_check used before the index with CityIndex.lookup.
+Usage: python benchmarks/bench_city_index.py
+"""
+
+import random
+import time
+
+from bench_utils import load_sheets, time_calls, print_rate
+from city_index import CityIndex
+
+
+def linear_scan(city_list, query):
+    """
+    The lookup loop Program.city_check used before the index (kept here as the baseline).
+    :param city_list: The city list.
+    :param query: The city name.
+    :return: The city information list or None.
+    """
+    for city_idx in range(len(city_list)):
+        query = query.strip()
+        if city_list[city_idx][1].lower() == query.lower():
+            return [city_list[city_idx][1], city_list[city_idx][0], city_list[city_idx][2], city_list[city_idx][3]]
+    return None
+
+
+def main():
+    city_list, _ = load_sheets()
+    random.seed(0)
+    queries = [row[1] for row in random.sample(city_list, 200)]
+
+    start = time.perf_counter()
+    index = CityIndex(city_list)
+    build_time = time.perf_counter() - start
+    print("Index build time: {:.1f} ms for {} cities".format(build_time * 1000, len(city_list)))
+
+    # Both paths must agree before their speed is compared.
+    for query in queries:
+        assert linear_scan(city_list, query) == index.record(index.lookup(query))[:4], query
+
+    before = time_calls(lambda q: linear_scan(city_list, q), queries)
+    after = time_calls(lambda q: index.record(index.lookup(q)), queries)
+    print_rate("Linear scan (before)", before, "lookups/s")
+    print_rate("CityIndex (after)", after, "lookups/s")
+    print("Speedup: {:.0f}x".format(after / before))
+
+
+if __name__ == '__main__':
+    main()
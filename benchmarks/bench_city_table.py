@@ -0,0 +1,79 @@
+"""
+Benchmark: memory and lookup speed of the city list (list of row lists, as read from the spreadsheet) vs the columnar
+CityTable. Memory is measured in fresh interpreters (resident memory growth and tracemalloc allocations while the
+representation is built and kept alive). Lookup speed covers the city_check path (CityIndex.lookup and the record it
+returns, with every field read) and reading single rows.
+Usage: python benchmarks/bench_city_table.py
+"""
+
+import subprocess
+import sys
+
+from bench_utils import PROGRAM_DIR, REA_PATH, print_rate, time_calls
+from city_index import CityIndex
+from dataset_cache import load_cache, load_dataset, load_table
+
+CHILD_CODE = """
+import gc, resource, sys, tracemalloc
+sys.path.insert(0, {program_dir!r})
+from dataset_cache import load_cache, load_dataset, load_table
+load_cache({rea!r})  # Reads the cache file once first, so only the representation is measured.
+gc.collect()
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+cities = {loader}({rea!r})[0]
+gc.collect()
+allocated = tracemalloc.get_traced_memory()[0]
+print(allocated, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before)
+"""
+
+
+def measure_memory(loader):
+    """
+    :param loader: 'load_dataset' (list of rows) or 'load_table' (CityTable).
+    :return: The bytes allocated and kept by the representation, and the peak resident memory growth in KB.
+    """
+    code = CHILD_CODE.format(program_dir=PROGRAM_DIR, rea=REA_PATH, loader=loader)
+    output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout.split()
+    return int(output[0]), int(output[1])
+
+
+def main():
+    for label, loader in (("List of rows (before)", 'load_dataset'), ("CityTable (after)", 'load_table')):
+        allocated, rss_kb = measure_memory(loader)
+        print("{:<28}{:>10,.0f} KB allocated{:>10,.0f} KB resident growth".format(label, allocated / 1024, rss_kb))
+
+    load_cache(REA_PATH)
+    city_list = load_dataset(REA_PATH)[0]
+    table = load_table(REA_PATH)[0]
+    list_index, table_index = CityIndex(city_list), CityIndex(table)
+    queries = [row[1] for row in city_list[:2000]]
+    mismatches = sum(1 for query in queries if list(list_index.record(list_index.lookup(query))) !=
+                     list(table_index.record(table_index.lookup(query))))
+    mismatches += sum(1 for row_idx in range(len(city_list)) if list(table[row_idx]) != city_list[row_idx])
+    print("Checked every row and {} lookups: {} mismatches".format(len(queries), mismatches))
+
+    def city_check(index):
+        def check(query):
+            record = index.record(index.lookup(query))
+            return record[0], record[1], record[2], record[3], record[4]
+        return check
+
+    def read_row(cities):
+        def read(row_idx):
+            row = cities[row_idx]
+            return row[0], row[1], row[2], row[3]
+        return read
+
+    rows = list(range(0, len(city_list), 7))
+    print_rate("city_check, list of rows (before)", time_calls(city_check(list_index), queries), "lookups/s")
+    print_rate("city_check, CityTable (after)", time_calls(city_check(table_index), queries), "lookups/s")
+    print_rate("Row read, list of rows (before)", time_calls(read_row(city_list), rows), "rows/s")
+    print_rate("Row read, CityTable (after)", time_calls(read_row(table), rows), "rows/s")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: write throughput and file size of the batch writer's formatted CSV vs the numeric .npz columns (stored and
+compressed), plus the time a consumer needs to read the travel times back as numbers (parsing the "{}h.{}m." cells
+vs np.load). The CSV formatted from the .npz file is checked to be identical to the CSV written directly.
+Usage: python benchmarks/bench_columnar_output.py [number of routes]
+"""
+
+import csv
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import numpy as np
+
+from bench_utils import REA_PATH, print_rate
+from batch_writer import BatchWriter, header_row
+from columnar_output import NOT_FOUND, iter_chunks, load_columns
+from dataset_cache import load_table
+
+TIME_PATTERN = re.compile(r'(-?\d+)h\.(\d+)m\.')  # Hours are negative for the few routes of a few km.
+
+
+def parse_csv_minutes(path):
+    """
+    Reads the travel times of a CSV results file back into whole minutes, the way a consumer has to.
+    :return: Array of shape (routes, modes).
+    """
+    with open(path, newline='') as file:
+        rows = csv.reader(file)
+        next(rows)
+        return np.array([[int(hours) * 60 + int(minutes) for hours, minutes in
+                          (TIME_PATTERN.fullmatch(cell).groups() for cell in row[2:])]
+                         for row in rows if row[1] != "City not found"])
+
+
+def main():
+    routes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    city_list, transport_list = load_table(REA_PATH)
+    writer = BatchWriter(city_list, transport_list.names, transport_list, fuzzy=False)
+    rng = random.Random(0)
+    names = [city_list[row][1] for row in range(len(city_list))]
+    pairs = [[rng.choice(names), rng.choice(names)] for _ in range(routes)]
+    writer.write(pairs, io.StringIO())  # Fills the resolved name memo, so both formats are timed without lookups.
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'results.csv')
+        start = time.perf_counter()
+        with open(csv_path, 'w', newline='') as file:
+            writer.write(pairs, file)
+        print_rate("CSV", routes / (time.perf_counter() - start), "routes/s")
+        print("{:<40}{:>16,.1f} MB".format("  file size", os.path.getsize(csv_path) / 1e6))
+        for compress in (False, True):
+            npz_path = os.path.join(tmp_dir, 'results_{}.npz'.format(compress))
+            start = time.perf_counter()
+            writer.write_columns(pairs, npz_path, compress=compress)
+            print_rate("npz columns" + (", compressed" if compress else ""), routes / (time.perf_counter() - start),
+                       "routes/s")
+            print("{:<40}{:>16,.1f} MB".format("  file size", os.path.getsize(npz_path) / 1e6))
+
+        start = time.perf_counter()
+        expected = parse_csv_minutes(csv_path)
+        print_rate("Read minutes back, parse CSV", routes / (time.perf_counter() - start), "routes/s")
+        for compress in (False, True):
+            start = time.perf_counter()
+            columns = load_columns(os.path.join(tmp_dir, 'results_{}.npz'.format(compress)))
+            print_rate("Read minutes back, npz" + (" compressed" if compress else ""),
+                       routes / (time.perf_counter() - start), "routes/s")
+            assert np.array_equal(columns['minutes'][columns['recommended'] != NOT_FOUND], expected)
+
+        # The CSV formatter on top of the columns gives back the CSV written directly.
+        output = io.StringIO()
+        rec_write = csv.writer(output, lineterminator='\n')
+        rec_write.writerow(header_row(writer.modes_list))
+        for chunk in iter_chunks(os.path.join(tmp_dir, 'results_True.npz')):
+            found = chunk['recommended'] != NOT_FOUND
+            rec_write.writerows(writer.format_rows(chunk['origin'], chunk['destination'], found,
+                                                   chunk['minutes'][found], chunk['recommended'][found],
+                                                   chunk['unresolved'].tolist()))
+        with open(csv_path, newline='') as file:
+            assert output.getvalue() == file.read()
+
+
+if __name__ == '__main__':
+    main()
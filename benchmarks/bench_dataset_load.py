@@ -0,0 +1,61 @@
+"""
+Benchmark: time-to-first-query when the data is parsed from REA.xlsx with pandas and when it is loaded from the
+compiled binary cache (REA_cache.npz).
+Each path runs in a fresh interpreter so the import time of pandas/NumPy is included. The time is measured from
+launching the interpreter until the first city lookup returns.
+Usage: python benchmarks/bench_dataset_load.py [repeats]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_utils import PROGRAM_DIR, REA_PATH
+
+CHILD_CODE = {
+    'xlsx': """
+import pandas as pd
+rea_file = pd.ExcelFile({rea!r})
+city_list = pd.read_excel(rea_file, 'geo_city').values.tolist()
+transport_list = pd.read_excel(rea_file, 'speed').values.tolist()
+""",
+    'cache': """
+from dataset_cache import load_dataset
+city_list, transport_list = load_dataset({rea!r})
+""",
+}
+FIRST_QUERY = """
+from city_index import CityIndex
+assert CityIndex(city_list).lookup('Sydney') == 62
+"""
+
+
+def time_to_first_query(path):
+    """
+    Runs one load path in a fresh interpreter.
+    :param path: 'xlsx' or 'cache'.
+    :return: Seconds from launch until the first lookup returned.
+    """
+    code = CHILD_CODE[path].format(rea=REA_PATH) + FIRST_QUERY
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=PROGRAM_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    from dataset_cache import compile_cache, cache_path_for
+    start = time.perf_counter()
+    compile_cache(REA_PATH)
+    print("Cache compile time: {:.2f} s ({:.0f} KB, REA.xlsx is {:.0f} KB)".format(
+        time.perf_counter() - start, os.path.getsize(cache_path_for(REA_PATH)) / 1e3, os.path.getsize(REA_PATH) / 1e3))
+    for path in ('xlsx', 'cache'):
+        times = [time_to_first_query(path) for _ in range(repeats)]
+        print("{:<8} time-to-first-query: median {:.3f} s, min {:.3f} s".format(
+            path, statistics.median(times), min(times)))
+
+
+if __name__ == '__main__':
+    main()
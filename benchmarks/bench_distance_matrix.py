@@ -0,0 +1,67 @@
+"""
+Benchmark: build time, file size and query speed of the memory-mapped distance matrix.
+Builds a matrix for the N most populous cities in a temporary directory, checks it against the Haversine path and
+compares single and batch queries with Program.latlng_to_dist and BatchRouter.distances.
+Usage: python benchmarks/bench_distance_matrix.py [number of cities]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from bench_utils import load_program, time_calls, print_rate
+from distance_matrix import DistanceMatrix, build_distance_matrix, condensed_size
+from route_calc import BatchRouter
+
+
+def main():
+    num_cities = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    program = load_program()
+    program.distance_matrix = None  # Time the Haversine path.
+    router = BatchRouter(program.city_list, program.speeds_list)
+    rows = np.arange(num_cities)  # The city list is sorted by population.
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'distances.npy')
+        start = time.perf_counter()
+        build_distance_matrix(router.lats, router.lngs, rows, path)
+        build_time = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1e6
+        full_pairs = condensed_size(len(program.city_list))
+        print("Built {:,} cities in {:.2f} s, {:.1f} MB".format(num_cities, build_time, size_mb))
+        print("Estimate for all {:,} cities: {:.0f} s, {:.0f} MB".format(
+            len(program.city_list), build_time * full_pairs / condensed_size(num_cities), full_pairs * 4 / 1e6))
+
+        matrix = DistanceMatrix.open_if_valid(path, router.lats, router.lngs)
+        rng = np.random.default_rng(0)
+        origin_idx = rng.integers(0, num_cities, 1000000)
+        dest_idx = rng.integers(0, num_cities, 1000000)
+        assert np.array_equal(matrix.distances(origin_idx, dest_idx), router.distances(origin_idx, dest_idx))
+
+        pairs = [(program.city_index.record(o), program.city_index.record(d))
+                 for o, d in zip(origin_idx[:1000].tolist(), dest_idx[:1000].tolist())]
+
+        def scalar_haversine(pair):
+            program.ocity_list, program.dcity_list = pair
+            return program.latlng_to_dist()
+
+        for pair in pairs:
+            assert matrix.distance(pair[0][4], pair[1][4]) == scalar_haversine(pair)
+
+        print_rate("latlng_to_dist Haversine", time_calls(scalar_haversine, pairs), "queries/s")
+        print_rate("DistanceMatrix.distance", time_calls(lambda p: matrix.distance(p[0][4], p[1][4]), pairs),
+                   "queries/s")
+
+        start = time.perf_counter()
+        router.distances(origin_idx, dest_idx)
+        print_rate("BatchRouter.distances (1M routes)", 1e6 / (time.perf_counter() - start), "routes/s")
+        start = time.perf_counter()
+        matrix.distances(origin_idx, dest_idx)
+        print_rate("DistanceMatrix.distances (1M routes)", 1e6 / (time.perf_counter() - start), "routes/s")
+        del matrix
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: latency of fuzzy city matching over a fixed corpus of misspellings.
+Compares the NumPy matrix Levenshtein that Program.spell_check used before FuzzyMatcher, checks that FuzzyMatcher
+returns the same best match as a full Levenshtein scan for every misspelling, then reports the latency percentiles.
+Usage: python benchmarks/bench_fuzzy_match.py
+"""
+
+import random
+import string
+import time
+import numpy as np
+
+from bench_utils import load_sheets
+from fuzzy_match import FuzzyMatcher
+
+
+def misspell(name, rng):
+    """
+    Applies one or two random edits (substitution, deletion, insertion or transposition) to a name.
+    :param name: The correct name.
+    :param rng: The random number generator.
+    :return: The misspelt name.
+    """
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        pos = rng.randrange(len(chars))
+        edit = rng.choice("sdit")
+        if edit == "s":
+            chars[pos] = rng.choice(string.ascii_lowercase)
+        elif edit == "d" and len(chars) > 2:
+            del chars[pos]
+        elif edit == "i":
+            chars.insert(pos, rng.choice(string.ascii_lowercase))
+        elif pos + 1 < len(chars):
+            chars[pos], chars[pos + 1] = chars[pos + 1], chars[pos]
+    return "".join(chars)
+
+
+def misspelling_corpus(city_list, size=200, seed=7):
+    """
+    Creates the fixed corpus of misspellings. Half of the names are drawn from the 500 most populous cities.
+    :param city_list: The city list.
+    :param size: The number of misspellings.
+    :param seed: The random seed.
+    :return: List of misspelt names.
+    """
+    rng = random.Random(seed)
+    corpus = ["Sidney", "Melborne", "Tokio", "Bejing", "Pariss", "Londn", "Mosco", "Istambul", "Bankok", "Chicgo"]
+    while len(corpus) < size:
+        pool = city_list[:500] if len(corpus) % 2 else city_list
+        corpus.append(misspell(rng.choice(pool)[1], rng))
+    return corpus
+
+
+def matrix_levenshtein_argmin(query, city_names):
+    """
+    The NumPy matrix Levenshtein scan Program.spell_check used before FuzzyMatcher (kept here as the baseline).
+    :param query: The input string.
+    :param city_names: List of every city name.
+    :return: The closest city name.
+    """
+    index_diff = []
+    for idx in range(len(city_names)):
+        matrix_x = len(query) + 1
+        matrix_y = len(city_names[idx]) + 1
+        matrix = np.zeros((matrix_x, matrix_y))
+        for x in range(matrix_x):
+            matrix[x, 0] = x
+        for y in range(matrix_y):
+            matrix[0, y] = y
+        for x in range(1, matrix_x):
+            for y in range(1, matrix_y):
+                substitution = 0 if query[x - 1] == city_names[idx][y - 1] else 1
+                matrix[x, y] = min(matrix[x - 1, y] + 1, matrix[x - 1, y - 1] + substitution, matrix[x, y - 1] + 1)
+        index_diff.append(matrix[matrix_x - 1, matrix_y - 1])
+    return city_names[index_diff.index(min(index_diff))]
+
+
+def full_scan_argmin(query, city_names):
+    """
+    Full Levenshtein scan using plain Python lists, used to check FuzzyMatcher against every name.
+    :param query: The input string.
+    :param city_names: List of every city name.
+    :return: The closest city name (the first one in the list on ties).
+    """
+    best_name, best_dist = None, None
+    for name in city_names:
+        previous = list(range(len(name) + 1))
+        for x in range(1, len(query) + 1):
+            current = [x]
+            for y in range(1, len(name) + 1):
+                current.append(min(previous[y] + 1, current[y - 1] + 1,
+                                   previous[y - 1] + (query[x - 1] != name[y - 1])))
+            previous = current
+        if best_dist is None or previous[-1] < best_dist:
+            best_name, best_dist = name, previous[-1]
+    return best_name
+
+
+def percentile_ms(latencies, percent):
+    return float(np.percentile(latencies, percent)) * 1000
+
+
+def main():
+    city_list, _ = load_sheets()
+    city_names = [row[1] for row in city_list]
+    corpus = misspelling_corpus(city_list)
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(city_names)
+    print("FuzzyMatcher build time: {:.1f} ms".format((time.perf_counter() - start) * 1000))
+
+    # The old matrix scan takes seconds per query, so only a few queries are timed.
+    before = []
+    for query in corpus[:3]:
+        start = time.perf_counter()
+        expected = matrix_levenshtein_argmin(query, city_names)
+        before.append(time.perf_counter() - start)
+        assert matcher.suggest(query, 1)[0][0] == expected, query
+
+    print("Checking best matches against a full Levenshtein scan ({} misspellings)...".format(len(corpus)))
+    for query in corpus:
+        assert matcher.suggest(query, 1)[0][0] == full_scan_argmin(query, city_names), query
+
+    after = []
+    for query in corpus:
+        start = time.perf_counter()
+        matcher.suggest(query, 5)
+        after.append(time.perf_counter() - start)
+
+    print("{:<32}{:>12}{:>12}{:>12}".format("", "mean ms", "p50 ms", "p99 ms"))
+    for label, latencies in (("Matrix scan (before)", before), ("FuzzyMatcher top-5 (after)", after)):
+        print("{:<32}{:>12.2f}{:>12.2f}{:>12.2f}".format(label, float(np.mean(latencies)) * 1000,
+                                                       percentile_ms(latencies, 50), percentile_ms(latencies, 99)))
+    print("Speedup (mean): {:.0f}x".format(np.mean(before) / np.mean(after)))
+
+
+if __name__ == '__main__':
+    main()
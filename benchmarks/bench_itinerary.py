@@ -0,0 +1,53 @@
+"""
+Benchmark: multi-leg itinerary planning with ItineraryPlanner between random city pairs.
+Every query is planned with plain Dijkstra, A* with the great-circle bound and A* with the precomputed hub lower
+bounds; the total times must agree. Reports node expansions and p50/p95 latency per query for each, and the one-off
+build time of the hub lower bounds.
+Usage: python benchmarks/bench_itinerary.py [number of queries]
+"""
+
+import sys
+import time
+import numpy as np
+
+from bench_utils import REA_PATH
+from dataset_cache import load_table
+from itinerary import DIJKSTRA, GREAT_CIRCLE, HUB_BOUNDS, ItineraryPlanner
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    city_list, transport_list = load_table(REA_PATH)
+    start = time.perf_counter()
+    planner = ItineraryPlanner(city_list, transport_list)
+    print("ItineraryPlanner build time: {:.1f} ms".format((time.perf_counter() - start) * 1000))
+    start = time.perf_counter()
+    planner.hub_lower_bounds()
+    print("Hub lower bounds build time: {:.1f} ms".format((time.perf_counter() - start) * 1000))
+
+    rng = np.random.default_rng(0)
+    pairs = rng.integers(0, len(city_list), (queries, 2))
+    for origin_row, dest_row in pairs:
+        planner.legs(origin_row)  # Warms the leg cache, so every heuristic is timed on the same cached legs.
+        planner.legs(dest_row)
+
+    totals = {}
+    print("{:<16}{:>14}{:>12}{:>12}{:>12}".format("Heuristic", "expansions", "mean ms", "p50 ms", "p95 ms"))
+    for heuristic in (DIJKSTRA, GREAT_CIRCLE, HUB_BOUNDS):
+        latency, expansions, minutes = [], [], []
+        for origin_row, dest_row in pairs:
+            start = time.perf_counter()
+            itinerary = planner.plan(origin_row, dest_row, heuristic)
+            latency.append((time.perf_counter() - start) * 1000)
+            expansions.append(itinerary.expansions)
+            minutes.append(itinerary.minutes)
+        totals[heuristic] = np.array(minutes)
+        print("{:<16}{:>14.1f}{:>12.2f}{:>12.2f}{:>12.2f}".format(
+            heuristic, np.mean(expansions), np.mean(latency), np.percentile(latency, 50), np.percentile(latency, 95)))
+    for heuristic in (GREAT_CIRCLE, HUB_BOUNDS):
+        assert np.allclose(totals[heuristic], totals[DIJKSTRA]), heuristic
+    print("Unreachable pairs: {}".format(np.isinf(totals[DIJKSTRA]).sum()))
+
+
+if __name__ == '__main__':
+    main()
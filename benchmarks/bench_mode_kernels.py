@@ -0,0 +1,95 @@
+"""
+Benchmark: travel time formulas of the ModeRegistry kernels against the hard-coded per-row formulas they replaced.
+The reference functions below are the old branches on the row index (Program.travel_time for single routes and
+route_calc.mode_minutes for arrays). Every distance is checked for bit-identical minutes (including the distances of
+a few km where the hyperbolic corrections have their pole), for domestic and international routes.
+Usage: python benchmarks/bench_mode_kernels.py [number of distances]
+"""
+
+import sys
+import time
+import numpy as np
+
+from bench_utils import REA_PATH, print_rate
+from dataset_cache import load_table
+
+
+def reference_minutes(distance, speeds, domestic):
+    """
+    The per-row formulas of route_calc.mode_minutes before the mode registry.
+    :return: Array of shape (routes, modes) of travel times in minutes.
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    times = np.empty((distance.shape[0], len(speeds)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for row in range(len(speeds)):
+            time_min = distance / (float(speeds[row]) / 60)
+            if row == 0:
+                time_min = time_min * ((5.84 * (1 / (1.26 * time_min - 1.02))) + 1.2017)
+            elif row == 1:
+                time_min = time_min + np.where(domestic, 120, 180)
+            elif row == 2 or row == 3:
+                time_min = time_min * ((30 * (1 / (0.9888 * time_min - 1.402))) + 1.2987)
+            else:
+                time_min = time_min * 1.35
+            times[:, row] = time_min
+    return times
+
+
+def reference_route_minutes(distance, speeds, domestic):
+    """
+    The per-row formulas of Program.travel_time before the mode registry, for a single route.
+    :return: List of travel times in minutes.
+    """
+    times = []
+    for row in range(len(speeds)):
+        time_min = float(distance) / (float(speeds[row]) / 60)
+        if row == 0:
+            time_min *= ((5.84 * (1 / (1.26 * time_min - 1.02))) + 1.2017)
+        elif row == 1:
+            time_min += 120 if domestic else 180
+        elif row == 2 or row == 3:
+            time_min *= ((30 * (1 / (0.9888 * time_min - 1.402))) + 1.2987)
+        else:
+            time_min *= 1.35
+        times.append(time_min)
+    return times
+
+
+def main():
+    routes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    _, modes = load_table(REA_PATH)
+    speeds = modes.speed_values
+    rng = np.random.default_rng(0)
+    # Rounded distances like Program.latlng_to_dist: every 0.01 km up to 100 km, then random ones up to 20,000 km.
+    distance = np.concatenate([np.arange(1, 10000) / 100, np.round(rng.uniform(0, 20000, routes), 2)])
+    domestic = rng.random(len(distance)) < 0.5
+
+    start = time.perf_counter()
+    expected = reference_minutes(distance, speeds, domestic)
+    reference_rate = len(distance) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    result = modes.minutes(distance, domestic)
+    kernel_rate = len(distance) / (time.perf_counter() - start)
+    assert np.array_equal(result, expected, equal_nan=True)
+    print_rate("Per-row formulas, arrays", reference_rate, "routes/s")
+    print_rate("ModeRegistry kernels, arrays", kernel_rate, "routes/s")
+
+    sample = distance[:50000].tolist()
+    sample_domestic = domestic[:50000].tolist()
+    start = time.perf_counter()
+    expected = [reference_route_minutes(dist, speeds, home) for dist, home in zip(sample, sample_domestic)]
+    reference_rate = len(sample) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    result = [modes.route_minutes(dist, home) for dist, home in zip(sample, sample_domestic)]
+    kernel_rate = len(sample) / (time.perf_counter() - start)
+    assert result == expected
+    print_rate("Per-row formulas, single routes", reference_rate, "routes/s")
+    print_rate("ModeRegistry kernels, single routes", kernel_rate, "routes/s")
+    for mode in range(len(modes)):
+        assert np.array_equal(modes.minutes(distance, domestic, mode), modes.minutes(distance, domestic)[:, mode],
+                              equal_nan=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark: scaling of batch_writer.py --workers from 1 to N worker processes on a 1M-route file.
+Every run must write exactly the same output as the single-process writer.
+Usage: python benchmarks/bench_parallel_batch.py [routes] [max workers]
+"""
+
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import PROGRAM_DIR, print_rate
+from bench_batch_writer import write_route_file
+from dataset_cache import load_dataset
+
+
+def run_writer(input_path, output_path, workers):
+    """
+    Runs batch_writer.py in a fresh interpreter.
+    :return: The wall clock time in seconds (including start-up of the pool).
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'batch_writer.py', input_path, output_path, '--workers', str(workers)],
+                   cwd=PROGRAM_DIR, check=True, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    routes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    city_list, _ = load_dataset(os.path.join(PROGRAM_DIR, 'REA.xlsx'))
+    print("{} CPUs available".format(os.cpu_count()))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'routes.csv')
+        write_route_file(input_path, city_list, routes)
+        expected_path = os.path.join(tmp_dir, 'expected.csv')
+        baseline = run_writer(input_path, expected_path, 1)
+        print_rate("single process", routes / baseline, "routes/s")
+        for workers in range(2, max_workers + 1) if max_workers > 1 else [2]:
+            output_path = os.path.join(tmp_dir, 'results.csv')
+            elapsed = run_writer(input_path, output_path, workers)
+            assert filecmp.cmp(expected_path, output_path, shallow=False), "Output differs with {} workers".format(
+                workers)
+            print_rate("{} workers".format(workers), routes / elapsed, "routes/s")
+            print("{:<40}{:>16.2f}x".format("  speedup", baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: overhead of the --profile instrumentation on the hot per-route path (latlng_to_dist + travel_time).
+With profiling off the methods must be the original functions (nothing wrapped); with it on, every call is timed.
+Usage: python benchmarks/bench_profiler.py [number of routes]
+"""
+
+import contextlib
+import io
+import sys
+import numpy as np
+
+from bench_utils import load_program, print_rate, time_calls
+from profiler import Profiler
+
+
+def route_rate(program, routes):
+    """
+    :param program: The Program instance.
+    :param routes: List of (origin record, destination record).
+    :return: Routes per second through latlng_to_dist and travel_time, with printing hidden.
+    """
+    def run(route):
+        program.ocity_list, program.dcity_list = route
+        program.travel_time(program.latlng_to_dist())
+    with contextlib.redirect_stdout(io.StringIO()):
+        return time_calls(run, routes, 1.0)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    program = load_program()
+    program_class = type(program)
+    rng = np.random.default_rng(0)
+    routes = [(program.city_index.record(o), program.city_index.record(d))
+              for o, d in rng.integers(0, len(program.city_list), (count, 2)).tolist()]
+    methods = {'latlng_to_dist': 'latlng_to_dist', 'travel_time': 'travel_time'}
+    originals = {name: program_class.__dict__[name] for name in methods}
+
+    baseline = route_rate(program, routes)
+    disabled = Profiler()
+    disabled.instrument(program_class, methods)
+    unchanged = all(program_class.__dict__[name] is func for name, func in originals.items())
+    off_rate = route_rate(program, routes)
+
+    enabled = Profiler()
+    enabled.enabled = True  # Enabled without the exit report.
+    enabled.instrument(program_class, methods)
+    on_rate = route_rate(program, routes)
+
+    print("Methods unchanged with profiling off: {}".format(unchanged))
+    print_rate("No instrumentation", baseline, "routes/s")
+    print_rate("Profiling off", off_rate, "routes/s")
+    print_rate("Profiling on", on_rate, "routes/s")
+    print("Overhead with profiling on: {:.1f}%".format((baseline / on_rate - 1) * 100))
+    for name, calls, total, mean, p95 in enabled.summary():
+        print("{:<20}{:>10} calls, mean {:.2f} us, p95 {:.2f} us".format(name, calls, mean * 1e6, p95 * 1e6))
+    if not unchanged:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
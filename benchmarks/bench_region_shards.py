@@ -0,0 +1,104 @@
+"""
+Benchmark: startup time and memory of a process that loads every city (REA_cache.npz) vs one pinned to a region
+(REA_shards). Each configuration runs in a fresh interpreter and builds the same lookup structures as
+Program.build_indices (CityIndex, FuzzyMatcher, PrefixIndex, SpatialIndex). The time is measured from launching the
+interpreter until the first lookup returns (in runs without tracemalloc); memory is the tracemalloc allocations kept
+by the city data and indices, and the peak resident memory of the process. Also times paging in the regions of a
+cross-region lookup and checks that every city found through the shards matches the full city list.
+Usage: python benchmarks/bench_region_shards.py [repeats]
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_utils import PROGRAM_DIR, REA_PATH
+
+CHILD_CODE = """
+import resource, sys, time, tracemalloc
+start = time.perf_counter()
+sys.path.insert(0, {program_dir!r})
+if {trace!r}:
+    tracemalloc.start()
+from autocomplete import PrefixIndex
+from city_index import CityIndex
+from city_table import city_columns
+from fuzzy_match import FuzzyMatcher
+from spatial_index import SpatialIndex
+imported = tracemalloc.get_traced_memory()[0]
+if {regions!r}:
+    from region_shards import RegionShards
+    shards = RegionShards.open({rea!r})
+    city_list = shards.load(shards.resolve({regions!r}))
+else:
+    from dataset_cache import load_table
+    city_list = load_table({rea!r})[0]
+_, names, lats, lngs, _ = city_columns(city_list)
+indices = CityIndex(city_list), FuzzyMatcher(names), PrefixIndex(city_list), SpatialIndex(lats, lngs)
+assert indices[0].lookup({query!r}) is not None
+elapsed = time.perf_counter() - start
+print(elapsed, len(city_list), tracemalloc.get_traced_memory()[0] - imported,
+      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+CONFIGS = (("All regions (REA_cache.npz)", [], 'Sydney'), ("Oceania shard", ['Oceania'], 'Sydney'),
+           ("Europe shard", ['Europe'], 'Paris'), ("North America shard", ['North America'], 'Chicago'))
+CROSS_REGION = ('Paris', 'Tokyo', 'Chicago', 'Nairobi', 'Lima')  # Looked up from a process pinned to Oceania.
+
+
+def run_config(regions, query, trace=False):
+    """
+    Starts one configuration in a fresh interpreter.
+    :param regions: The regions to load ([] for every city from the cache).
+    :param query: A city in those regions.
+    :param trace: Whether allocations are traced (which slows the run down).
+    :return: Seconds to the first lookup, cities loaded, bytes allocated (0 if not traced) and peak resident memory in
+             KB.
+    """
+    code = CHILD_CODE.format(program_dir=PROGRAM_DIR, rea=REA_PATH, regions=regions, query=query, trace=trace)
+    output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout.split()
+    return float(output[0]), int(output[1]), int(output[2]), int(output[3])
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    from dataset_cache import load_table
+    from region_shards import RegionShards, build_shards
+    start = time.perf_counter()
+    build_shards(REA_PATH)
+    print("Shard build time: {:.2f} s".format(time.perf_counter() - start))
+
+    for label, regions, query in CONFIGS:
+        times = [run_config(regions, query)[0] for _ in range(repeats)]
+        _, cities, allocated, rss_kb = run_config(regions, query, trace=True)
+        print("{:<28}{:>7,} cities  time-to-first-lookup median {:.3f} s  {:>7,.0f} KB allocated {:>8,.0f} KB peak RSS"
+              .format(label, cities, statistics.median(times), allocated / 1024, rss_kb))
+
+    # Cross-region lookups from a process pinned to Oceania. The time includes rebuilding the CityIndex.
+    from city_index import CityIndex
+    full = load_table(REA_PATH)[0]
+    shards = RegionShards.open(REA_PATH)
+    table = shards.load(['Oceania'])
+    mismatches = 0
+    for query in CROSS_REGION:
+        start = time.perf_counter()
+        regions = shards.regions_for_name(query)
+        table = shards.load(regions)
+        index = CityIndex(table)
+        row = index.lookup(query)
+        print("Lookup {:<10} paged in {:<26}{:>8.1f} ms ({:,} cities loaded)".format(
+            query, ", ".join(regions) or "nothing", (time.perf_counter() - start) * 1e3, len(table)))
+        # A bare name resolves to the first match in the loaded regions, e.g. Lima, United States once North America
+        # is loaded, so the city found is compared by name.
+        mismatches += row is None or full[int(table.global_rows[row])][1] != query
+    table = shards.load(shards.unloaded())
+    mismatches += sum(1 for row_idx in range(len(table))
+                      if list(table[row_idx]) != list(full[int(table.global_rows[row_idx])]))
+    print("Checked {} cities: {} mismatches".format(len(table), mismatches))
+    if mismatches or len(table) != len(full):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
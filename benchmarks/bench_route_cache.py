@@ -0,0 +1,105 @@
+"""
+Benchmark: routes per second for repeated routes, Program.latlng_to_dist/travel_time on every route vs
+Program.calculate_route with the LRU route cache. The routes follow a Zipf-like distribution over a set of popular
+pairs (half of them asked in the reverse direction), like an interactive session or a batch file of common routes.
+Also checks that cached results are identical to recalculated ones, and times saving and loading the cache file.
+Usage: python benchmarks/bench_route_cache.py [number of routes] [number of distinct pairs]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+from bench_utils import load_program, print_rate
+from route_cache import RouteCache
+
+
+def cached_routes(program, origin_idx, dest_idx):
+    """
+    Runs Program.calculate_route for every route, hiding its printing.
+    :param program: The Program instance.
+    :param origin_idx: List of origin row indices.
+    :param dest_idx: List of destination row indices.
+    :return: List of [minutes per mode] per route.
+    """
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origin, dest in zip(origin_idx, dest_idx):
+            program.ocity_list = program.city_index.record(origin)
+            program.dcity_list = program.city_index.record(dest)
+            program.calculate_route()
+            results.append([hours * 60 + minutes for hours, minutes in program.times_list])
+    return results
+
+
+def uncached_routes(program, origin_idx, dest_idx):
+    """
+    Runs latlng_to_dist and travel_time for every route, hiding its printing.
+    :param program: The Program instance.
+    :param origin_idx: List of origin row indices.
+    :param dest_idx: List of destination row indices.
+    :return: List of [minutes per mode] per route.
+    """
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for origin, dest in zip(origin_idx, dest_idx):
+            program.ocity_list = program.city_index.record(origin)
+            program.dcity_list = program.city_index.record(dest)
+            program.travel_time(program.latlng_to_dist())
+            results.append([hours * 60 + minutes for hours, minutes in program.times_list])
+    return results
+
+
+def main():
+    routes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    program = load_program()
+    program.route_cache = RouteCache(max_size=pairs // 2, fingerprint=program.route_cache.fingerprint)
+    rng = np.random.default_rng(0)
+    pair_origins = rng.integers(0, len(program.city_list), pairs)
+    pair_dests = rng.integers(0, len(program.city_list), pairs)
+    weights = 1 / np.arange(1, pairs + 1)
+    picks = rng.choice(pairs, routes, p=weights / weights.sum())
+    reverse = rng.random(routes) < 0.5
+    origin_idx = np.where(reverse, pair_dests[picks], pair_origins[picks]).tolist()
+    dest_idx = np.where(reverse, pair_origins[picks], pair_dests[picks]).tolist()
+
+    start = time.perf_counter()
+    expected = uncached_routes(program, origin_idx, dest_idx)
+    uncached_rate = routes / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = cached_routes(program, origin_idx, dest_idx)
+    cached_rate = routes / (time.perf_counter() - start)
+
+    mismatches = sum(1 for result, exp in zip(results, expected) if result != exp)
+    print("Checked {} routes against the uncached path: {} mismatches".format(routes, mismatches))
+    print("Cache stats ({} distinct pairs): {}".format(pairs, program.route_cache.stats()))
+    print_rate("travel_time on every route (before)", uncached_rate, "routes/s")
+    print_rate("calculate_route with cache (after)", cached_rate, "routes/s")
+    print("Speedup: {:.1f}x".format(cached_rate / uncached_rate))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'route_cache.npz')
+        start = time.perf_counter()
+        program.route_cache.save(path)
+        save_time = time.perf_counter() - start
+        loaded = RouteCache(max_size=pairs, fingerprint=program.route_cache.fingerprint)
+        start = time.perf_counter()
+        count = loaded.load(path)
+        load_time = time.perf_counter() - start
+        print("Saved {} routes in {:.1f} ms ({:.0f} KB), loaded in {:.1f} ms".format(
+            count, save_time * 1000, os.path.getsize(path) / 1024, load_time * 1000))
+        if loaded.entries != program.route_cache.entries:
+            print("Loaded cache differs from the saved cache")
+            mismatches += 1
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
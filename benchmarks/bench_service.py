@@ -0,0 +1,138 @@
+"""
+Load test for service.py: starts the service in a subprocess and sends GET /route requests from many concurrent
+keep-alive connections, then reports requests per second, p50/p99 latency and the mean route batch size.
+Each connection sends its next request as soon as the previous response arrives.
+Usage: python benchmarks/bench_service.py [connections] [seconds] [--port N]
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+import numpy as np
+
+from bench_utils import PROGRAM_DIR, print_rate
+from dataset_cache import load_dataset
+from bench_utils import REA_PATH
+
+
+async def request(reader, writer, target, method='GET', body=b''):
+    """
+    Sends one HTTP request on an open connection and reads the response.
+    :return: The status code and the decoded JSON body.
+    """
+    writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {}\r\n\r\n".format(
+        method, target, len(body)).encode('latin-1') + body)
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    length = next(int(line.split(':', 1)[1]) for line in lines if line.lower().startswith('content-length:'))
+    return int(lines[0].split(' ')[1]), json.loads(await reader.readexactly(length))
+
+
+async def client(port, targets, deadline, latencies):
+    """
+    One keep-alive connection sending requests until the deadline.
+    :param port: The service port.
+    :param targets: The request targets, used in turn.
+    :param deadline: perf_counter time to stop at.
+    :param latencies: List the latency of every request (in seconds) is appended to.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        status, _ = await request(reader, writer, targets[i % len(targets)])
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError("Request failed with status {}".format(status))
+        i += 1
+    writer.close()
+
+
+async def load_test(port, connections, seconds, targets):
+    """
+    Runs the clients and collects the latencies.
+    :return: The latencies of every request and the elapsed time.
+    """
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*(client(port, targets[i::connections], deadline, latencies) for i in range(connections)))
+    return latencies, time.perf_counter() - start
+
+
+async def wait_for_service(port, process, timeout=60):
+    """
+    Waits until the service answers GET /health.
+    """
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The service exited with code {}".format(process.returncode))
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            await request(reader, writer, '/health')
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("The service did not start within {} s".format(timeout))
+
+
+async def service_stats(port):
+    """
+    :return: The JSON of GET /stats.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    _, stats = await request(reader, writer, '/stats')
+    writer.close()
+    return stats
+
+
+def free_port():
+    """
+    :return: A TCP port that is free on localhost.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the routing service.")
+    parser.add_argument('connections', nargs='?', type=int, default=64)
+    parser.add_argument('seconds', nargs='?', type=float, default=10)
+    parser.add_argument('--port', type=int, default=0, help="Port for the service (0 = any free port).")
+    args = parser.parse_args()
+    port = args.port or free_port()
+
+    city_list, _ = load_dataset(REA_PATH)
+    rng = np.random.default_rng(0)
+    names = ["{}, {}".format(city[1], city[0]) for city in city_list]
+    targets = ["/route?origin={}&destination={}".format(quote(names[o]), quote(names[d]))
+               for o, d in rng.integers(0, len(names), (10000, 2)).tolist()]
+
+    process = subprocess.Popen([sys.executable, 'service.py', '--port', str(port)], cwd=PROGRAM_DIR,
+                               stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_for_service(port, process))
+        latencies, elapsed = asyncio.run(load_test(port, args.connections, args.seconds, targets))
+        stats = asyncio.run(service_stats(port))
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies = np.array(latencies) * 1000
+    print("{} connections, {:.0f} s, {} requests".format(args.connections, elapsed, len(latencies)))
+    print_rate("GET /route", len(latencies) / elapsed, "requests/s")
+    print_rate("Latency p50", float(np.percentile(latencies, 50)), "ms")
+    print_rate("Latency p99", float(np.percentile(latencies, 99)), "ms")
+    print_rate("Mean route batch size", stats['mean_batch_size'], "routes/batch")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: nearest-city and radius queries with SpatialIndex against brute force over every city.
+Query points are "depot" locations scattered up to ~50 km around random cities, plus a share of uniformly random
+points on the globe (mostly ocean, the worst case for the grid). Every result is checked against brute force.
+Usage: python benchmarks/bench_spatial_index.py [number of queries]
+"""
+
+import sys
+import time
+import numpy as np
+
+from bench_utils import load_sheets, print_rate
+from route_calc import haversine, round_2dp
+from spatial_index import SpatialIndex
+
+
+def brute_force_nearest(lats, lngs, qlat, qlng, k):
+    """
+    Computes the distance to every city for every query (rounded like latlng_to_dist) and sorts them.
+    :return: Arrays of shape (queries, k) of city rows and distances.
+    """
+    rows, dists = [], []
+    all_rows = np.arange(len(lats))
+    for lat, lng in zip(qlat, qlng):
+        dist = round_2dp(haversine(lat, lng, lats, lngs))
+        order = np.lexsort((all_rows, dist))[:k]
+        rows.append(order)
+        dists.append(dist[order])
+    return np.array(rows), np.array(dists)
+
+
+def brute_force_within(lats, lngs, qlat, qlng, radius_km):
+    """
+    :return: List of (city rows, distances) per query, nearest first.
+    """
+    results = []
+    for lat, lng in zip(qlat, qlng):
+        dist = round_2dp(haversine(lat, lng, lats, lngs))
+        inside = np.flatnonzero(dist <= radius_km)
+        inside = inside[np.lexsort((inside, dist[inside]))]
+        results.append((inside, dist[inside]))
+    return results
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    city_list, _ = load_sheets()
+    lats = np.array([city[2] for city in city_list])
+    lngs = np.array([city[3] for city in city_list])
+    start = time.perf_counter()
+    index = SpatialIndex(lats, lngs)
+    print("SpatialIndex build time: {:.1f} ms".format((time.perf_counter() - start) * 1000))
+
+    rng = np.random.default_rng(0)
+    near_city = rng.integers(0, len(lats), queries - queries // 10)
+    qlat = np.clip(np.concatenate([lats[near_city] + rng.uniform(-0.45, 0.45, len(near_city)),
+                                   np.degrees(np.arcsin(rng.uniform(-1, 1, queries // 10)))]), -90, 90)
+    qlng = np.concatenate([lngs[near_city] + rng.uniform(-0.45, 0.45, len(near_city)),
+                           rng.uniform(-180, 180, queries // 10)])
+    qlng = (qlng + 180) % 360 - 180
+
+    for k in (1, 10):
+        start = time.perf_counter()
+        expected = brute_force_nearest(lats, lngs, qlat, qlng, k)
+        brute_rate = queries / (time.perf_counter() - start)
+        start = time.perf_counter()
+        result = index.nearest(qlat, qlng, k)
+        index_rate = queries / (time.perf_counter() - start)
+        assert np.array_equal(result[0], expected[0]) and np.array_equal(result[1], expected[1])
+        print_rate("k={} nearest, brute force".format(k), brute_rate, "queries/s")
+        print_rate("k={} nearest, SpatialIndex batch".format(k), index_rate, "queries/s")
+        start = time.perf_counter()
+        for lat, lng in zip(qlat[:500], qlng[:500]):
+            index.nearest(lat, lng, k)
+        print_rate("k={} nearest, SpatialIndex one by one".format(k), 500 / (time.perf_counter() - start),
+                   "queries/s")
+
+    for radius_km in (25, 100, 500):
+        sample = min(queries, 1000)
+        start = time.perf_counter()
+        expected = brute_force_within(lats, lngs, qlat[:sample], qlng[:sample], radius_km)
+        brute_rate = sample / (time.perf_counter() - start)
+        start = time.perf_counter()
+        result = index.within(qlat[:sample], qlng[:sample], radius_km)
+        index_rate = sample / (time.perf_counter() - start)
+        for (rows, dist), (expected_rows, expected_dist) in zip(result, expected):
+            assert np.array_equal(rows, expected_rows) and np.array_equal(dist, expected_dist)
+        print_rate("within {} km, brute force".format(radius_km), brute_rate, "queries/s")
+        print_rate("within {} km, SpatialIndex batch".format(radius_km), index_rate, "queries/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Startup regression check for the non-plotting path, based on python -X importtime.
+Runs the program's batch path (create Program, resolve two cities, calculate the travel times) in a fresh interpreter
+and fails (exit code 1) if a charting library is imported or the total import time is over the budget.
+Usage: python benchmarks/bench_startup_imports.py [budget in ms]
+"""
+
+import os
+import subprocess
+import sys
+
+from bench_utils import PROGRAM_DIR
+
+# Modules that must only be loaded once a chart is requested (pandas only when REA.xlsx has to be parsed).
+LAZY_MODULES = ('turtle', 'tkinter', 'matplotlib', 'pandas')
+DEFAULT_BUDGET_MS = 250
+CHILD_CODE = """
+import contextlib, io, runpy
+program = runpy.run_path({script!r}, run_name='startup_check')['Program']()
+with contextlib.redirect_stdout(io.StringIO()):
+    program.input = 'Sydney'
+    program.ocity_list = program.city_check()
+    program.input = 'Melbourne'
+    program.dcity_list = program.city_check()
+    program.travel_time(program.latlng_to_dist())
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parses the output of python -X importtime.
+    :param stderr: The stderr text of the interpreter.
+    :return: Dictionary of module name -> cumulative import time in microseconds, and the total of the top level
+             imports in microseconds.
+    """
+    modules = {}
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+        if not name.startswith('  '):  # Top level imports (nested ones are indented further).
+            total_us += int(cumulative)
+    return modules, total_us
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    script = os.path.join(PROGRAM_DIR, 'Route Estimator V3.py')
+    # Warm-up run so the dataset cache exists and the timed run measures a normal start.
+    subprocess.run([sys.executable, '-c', CHILD_CODE.format(script=script)], cwd=PROGRAM_DIR, check=True)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD_CODE.format(script=script)],
+                            cwd=PROGRAM_DIR, check=True, capture_output=True, text=True)
+    modules, total_us = parse_importtime(result.stderr)
+
+    slowest = sorted(((us, name) for name, us in modules.items() if '.' not in name), reverse=True)[:8]
+    print("Slowest top level imports:")
+    for us, name in slowest:
+        print("  {:<24}{:>8.1f} ms".format(name, us / 1000))
+    print("Total import time: {:.1f} ms (budget {:.0f} ms)".format(total_us / 1000, budget_ms))
+
+    failures = [name for name in modules if name.split('.')[0] in LAZY_MODULES]
+    if failures:
+        print("FAIL: charting modules imported on the non-plotting path: " + ", ".join(sorted(failures)[:10]))
+    if total_us / 1000 > budget_ms:
+        print("FAIL: import time is over budget.")
+    if failures or total_us / 1000 > budget_ms:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: many-to-many travel time matrices and isochrone queries with TravelMatrix.
+- matrix: routes per second and peak traced memory of one BatchRouter call over the repeated/tiled route arrays (the
+  way POST /matrix works) vs TravelMatrix.matrix, checked equal, then the full origins x all cities matrix written to
+  memory-mapped .npy files in a temporary directory.
+- isochrone: queries per second for every mode with the latitude-sorted cities vs scanning every city, checked equal.
+Usage: python benchmarks/bench_travel_matrix.py [--origins 5000] [--queries 200]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from bench_utils import REA_PATH, print_rate
+from dataset_cache import load_table
+from route_calc import BatchRouter
+from travel_matrix import TravelMatrix
+
+COMPARE_ORIGINS = 200  # Origins of the matrix compared with a single BatchRouter call.
+ISOCHRONE_HOURS = (0.5, 1, 3, 8)
+
+
+def traced(func, *args, **kwargs):
+    """
+    Runs a function with tracemalloc switched on.
+    :return: The result, the elapsed seconds and the peak traced memory in MB.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks travel time matrices and isochrones.")
+    parser.add_argument('--origins', type=int, default=5000, help="Origins of the full matrix (all cities are "
+                                                                  "destinations).")
+    parser.add_argument('--queries', type=int, default=200, help="Isochrone queries per mode.")
+    args = parser.parse_args()
+    city_list, transport_list = load_table(REA_PATH)
+    modes_list, speeds_list = zip(*transport_list)
+    router = BatchRouter(city_list, speeds_list)
+    travel_matrix = TravelMatrix(router)
+    num_cities = len(city_list)
+    rng = np.random.default_rng(0)
+    dests = np.arange(num_cities)
+
+    origins = rng.integers(0, num_cities, COMPARE_ORIGINS)
+    routes = len(origins) * num_cities
+    expected, elapsed, peak = traced(router.travel_times, np.repeat(origins, num_cities), np.tile(dests, len(origins)))
+    print_rate("{}x{} BatchRouter, one call".format(len(origins), num_cities), routes / elapsed, "routes/s")
+    print("{:<40}{:>16,.1f} MB".format("  peak memory", peak))
+    result, elapsed, peak = traced(travel_matrix.matrix, origins, dests)
+    print_rate("{}x{} TravelMatrix, tiled".format(len(origins), num_cities), routes / elapsed, "routes/s")
+    print("{:<40}{:>16,.1f} MB".format("  peak memory (incl. the result)", peak))
+    assert np.array_equal(result[0].ravel(), expected[0])
+    assert np.array_equal(result[1].reshape(len(modes_list), -1).T, expected[1])
+    del expected, result
+
+    origins = rng.integers(0, num_cities, args.origins)
+    routes = len(origins) * num_cities
+    with tempfile.TemporaryDirectory() as out_dir:
+        result, elapsed, peak = traced(travel_matrix.matrix, origins, dests, os.path.join(out_dir, 'matrix'))
+        size = sum(array.nbytes for array in result) / 1e6
+        del result
+    print_rate("{}x{} TravelMatrix to .npy".format(len(origins), num_cities), routes / elapsed, "routes/s")
+    print("{:<40}{:>16,.1f} MB ({:,.0f} MB on disk)".format("  peak memory", peak, size))
+
+    all_rows = np.arange(num_cities)
+    for mode, name in enumerate(modes_list):
+        queries = rng.integers(0, num_cities, args.queries)
+        for hours in ISOCHRONE_HOURS:
+            start = time.perf_counter()
+            expected = []
+            for origin in queries.tolist():
+                minutes = router.travel_times(np.full(num_cities, origin), all_rows)[1][:, mode]
+                expected.append(np.flatnonzero((minutes <= hours * 60) & (all_rows != origin)))
+            scan_rate = len(queries) / (time.perf_counter() - start)
+            start = time.perf_counter()
+            results = [travel_matrix.isochrone(origin, hours, mode) for origin in queries.tolist()]
+            index_rate = len(queries) / (time.perf_counter() - start)
+            for (rows, _, _), expected_rows in zip(results, expected):
+                assert np.array_equal(np.sort(rows), expected_rows)
+            print_rate("{} {} h, scan every city".format(name, hours), scan_rate, "queries/s")
+            print_rate("{} {} h, TravelMatrix".format(name, hours), index_rate, "queries/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Shared helpers for the benchmark scripts.
+The benchmarks run headless from any working directory; they add the program directory to the import path and read
+REA.xlsx from there.
+"""
+
+import os
+import sys
+import time
+
+PROGRAM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REA_PATH = os.path.join(PROGRAM_DIR, 'REA.xlsx')
+if PROGRAM_DIR not in sys.path:
+    sys.path.insert(0, PROGRAM_DIR)
+
+
+def load_sheets():
+    """
+    Reads the geo_city and speed sheets the same way Program.__init__ does.
+    :return: The city list and the transport list. Formats: [Country, City, Lat, Lng, Population], [Mode, Speed].
+    """
+    import pandas as pd
+    rea_file = pd.ExcelFile(REA_PATH)
+    city_list = pd.read_excel(rea_file, 'geo_city').values.tolist()
+    transport_list = pd.read_excel(rea_file, 'speed').values.tolist()
+    return city_list, transport_list
+
+
+def time_calls(func, items, min_time=0.5):
+    """
+    Calls func once for every item, repeating the whole pass until at least min_time seconds have elapsed.
+    :param func: The function to time. Called as func(item).
+    :param items: The items to pass to the function.
+    :param min_time: The minimum run time in seconds.
+    :return: The number of calls per second.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        calls += len(items)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def print_rate(label, rate, unit):
+    """
+    Prints a throughput figure in a fixed width format.
+    :param label: Name of the measured path.
+    :param rate: The measured rate.
+    :param unit: The unit of the rate, e.g. "lookups/s".
+    """
+    print("{:<40}{:>16,.1f} {}".format(label, rate, unit))
+
+
+def load_program():
+    """
+    Imports "Route Estimator V3.py" as a module (its file name is not a valid module name) and creates a Program.
+    Waits for the background warm-up, so every data structure is built when it returns.
+    :return: The Program instance.
+    """
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('route_estimator', os.path.join(PROGRAM_DIR, 'Route Estimator V3.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    program = module.Program()
+    program.warm_up.wait_all()
+    return program
@@ -0,0 +1,76 @@
+"""
+Benchmark: time-to-prompt and time-to-first-answer of the interactive program, building every data structure before
+the menu (REA_WARM_UP=0, the behaviour before the warm-up) vs in the background (the default).
+Each run starts "Route Estimator V3.py" in a fresh interpreter with its input and output connected to pipes and
+answers every prompt as soon as it appears (the worst case for the warm-up: a person takes longer to type). Times are
+measured from launching the interpreter:
+- prompt: the "Select task:" menu prompt is shown,
+- answer: the travel times of Sydney -> Melbourne are printed (the city_check lookups and the route),
+- suggestion: the first spell check suggestion for a misspelt city is offered (needs the fuzzy matcher).
+Usage: python benchmarks/bench_warm_up.py [repeats]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_utils import PROGRAM_DIR
+
+PROGRAM_PATH = os.path.join(PROGRAM_DIR, 'Route Estimator V3.py')
+# Scripts of (text the program prints, reply). The time each marker appears is recorded.
+SCRIPTS = {
+    'answer': (("Select task: ", "1"), ("origin city: ", "Sydney"), ("destination city: ", "Melbourne"),
+               ("(Y/N) ", "Y"), ("by Car", None)),
+    'suggestion': (("Select task: ", "1"), ("origin city: ", "Sydnei"), ("Did you mean", None)),
+}
+TIMEOUT = 60  # Seconds before a run is abandoned.
+
+
+def run_script(script, warm_up):
+    """
+    Runs the program once, replying to its prompts.
+    :param script: Sequence of (marker, reply). reply None ends the run when the marker appears.
+    :param warm_up: Whether the data structures are built in the background.
+    :return: List of seconds from launch until each marker appeared.
+    """
+    env = dict(os.environ, REA_WARM_UP='1' if warm_up else '0')
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-u', PROGRAM_PATH], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL, env=env)
+    output, seen, times = b'', 0, []
+    try:
+        for marker, reply in script:
+            marker = marker.encode('utf-8')
+            while output.find(marker, seen) < 0:
+                chunk = os.read(process.stdout.fileno(), 1 << 16)
+                if not chunk or time.perf_counter() - start > TIMEOUT:
+                    raise RuntimeError("The program stopped before printing " + repr(marker))
+                output += chunk
+            times.append(time.perf_counter() - start)
+            seen = output.find(marker, seen) + len(marker)
+            if reply is None:
+                break
+            process.stdin.write(reply.encode('utf-8') + b'\n')
+            process.stdin.flush()
+    finally:
+        process.kill()
+        process.wait()
+    return times
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("{:<26}{:>14}{:>14}{:>16}".format("Median of {} runs (s)".format(repeats), "Prompt", "Answer",
+                                            "Suggestion"))
+    for label, warm_up in (("Blocking start (before)", False), ("Background warm-up", True)):
+        answers = [run_script(SCRIPTS['answer'], warm_up) for _ in range(repeats)]
+        suggestions = [run_script(SCRIPTS['suggestion'], warm_up) for _ in range(repeats)]
+        print("{:<26}{:>14.3f}{:>14.3f}{:>16.3f}".format(
+            label, statistics.median(times[0] for times in answers + suggestions),
+            statistics.median(times[-1] for times in answers), statistics.median(times[-1] for times in suggestions)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Reproducible benchmark suite for the program's hot paths. Every case runs headless against REA.xlsx in a fresh
+interpreter, so each one reports its own peak resident memory. Results are saved as JSON and compared with a stored
+baseline: the suite exits with 1 if a case is slower (or uses more memory) than the baseline by more than the
+threshold.
+
+Cases (rates are per second, best of ROUNDS rounds, fixed random seeds):
+- dataset_load      load_dataset from the compiled cache
+- program_init      Program() (dataset load and every index)
+- city_check_exact  Program.city_check on exact names ("City" and "City, Country")
+- spell_check_fuzzy the FuzzyMatcher.suggest call of spell_check, on the fixed misspelling corpus
+- route_single      Program.latlng_to_dist + travel_time, one route at a time
+- route_batch       BatchRouter.travel_times on 1M routes
+- write_10k/100k/1m BatchWriter.write (the write_to_file path) streaming 10k/100k/1M routes to a CSV file
+A fixed calibration workload (pure Python and NumPy) is run with every suite. Rates are compared with the baseline
+after dividing by the calibration rate of their own run, so a machine that is busier or slower overall (e.g. a shared
+VM) does not show up as a regression of every case.
+
+Usage: python benchmarks/run_suite.py [--cases a b ...] [--out results.json] [--baseline baseline.json]
+                                      [--runs 2] [--threshold 0.3] [--update-baseline]
+The stored baseline was recorded on the development machine. Record a new one with --update-baseline when running
+on different hardware.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from bench_utils import REA_PATH, load_program, time_calls
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, 'results.json')
+DEFAULT_THRESHOLD = 0.3
+DEFAULT_RUNS = 2
+ROUNDS = 5  # Each case is timed this many times and the best round is kept, which filters out noise.
+MIN_TIME = 0.2  # Seconds each round of a repeated case runs for.
+
+
+def peak_rss_mb():
+    """
+    :return: The peak resident memory of this process in MB, or None where the resource module is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, KB on Linux.
+
+
+def best_rate(func, items):
+    """
+    :param func: The function to time. Called as func(item).
+    :param items: The items to pass to the function.
+    :return: The best calls per second over ROUNDS rounds.
+    """
+    return max(time_calls(func, items, MIN_TIME) for _ in range(ROUNDS))
+
+
+def random_rows(city_list, count, seed=0):
+    """
+    :return: Arrays of random origin and destination rows.
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, len(city_list), count), rng.integers(0, len(city_list), count)
+
+
+def case_dataset_load():
+    from dataset_cache import load_dataset
+    load_dataset(REA_PATH)  # Makes sure the cache is current.
+    return best_rate(lambda _: load_dataset(REA_PATH), [None]), "loads/s"
+
+
+def case_program_init():
+    load_program()
+    return best_rate(lambda _: load_program(), [None]), "inits/s"
+
+
+def case_city_check_exact():
+    program = load_program()
+    names = [city[1] for city in program.city_list[:500]] + \
+            ["{}, {}".format(city[1], city[0]) for city in program.city_list[500:1000]]
+
+    def check(name):
+        program.input = name
+        program.city_check()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return best_rate(check, names), "lookups/s"
+
+
+def case_spell_check_fuzzy():
+    from bench_fuzzy_match import misspelling_corpus
+    program = load_program()
+    corpus = misspelling_corpus(program.city_list)
+    return best_rate(lambda query: program.fuzzy_matcher.suggest(query, 3), corpus), "queries/s"
+
+
+def case_route_single():
+    program = load_program()
+    origin_idx, dest_idx = random_rows(program.city_list, 10000)
+    routes = [(program.city_index.record(o), program.city_index.record(d))
+              for o, d in zip(origin_idx.tolist(), dest_idx.tolist())]
+
+    def route(cities):
+        program.ocity_list, program.dcity_list = cities
+        program.travel_time(program.latlng_to_dist())
+    with contextlib.redirect_stdout(io.StringIO()):
+        return best_rate(route, routes), "routes/s"
+
+
+def case_route_batch():
+    from route_calc import BatchRouter
+    program = load_program()
+    router = BatchRouter(program.city_list, program.speeds_list)
+    origin_idx, dest_idx = random_rows(program.city_list, 1000000)
+
+    def batch(_):
+        router.fastest_modes(router.travel_times(origin_idx, dest_idx)[1])
+    return best_rate(batch, [None]) * len(origin_idx), "routes/s"
+
+
+def write_case(routes):
+    """
+    Creates a case streaming the given number of random routes through BatchWriter.write to a CSV file.
+    """
+    def case():
+        from batch_writer import BatchWriter
+        from dataset_cache import load_dataset
+        city_list, transport_list = load_dataset(REA_PATH)
+        modes_list, speeds_list = zip(*transport_list)
+        writer = BatchWriter(city_list, modes_list, speeds_list)
+        origin_idx, dest_idx = random_rows(city_list, routes)
+        rates = []
+        for _ in range(max(1, min(ROUNDS, 1000000 // routes))):  # 1M routes take seconds, so fewer rounds.
+            pairs = ([city_list[o][1], city_list[d][1]] for o, d in zip(origin_idx.tolist(), dest_idx.tolist()))
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                with open(os.path.join(tmp_dir, 'RE_Calculations.csv'), 'w', newline='') as file:
+                    start = time.perf_counter()
+                    writer.write(pairs, file)
+                    rates.append(routes / (time.perf_counter() - start))
+        return max(rates), "routes/s"
+    return case
+
+
+def case_calibration():
+    values = np.random.default_rng(0).random(100000)
+
+    def workload(_):
+        sum(i * i for i in range(100000))
+        np.sort(np.sin(values))
+    return best_rate(workload, [None]), "runs/s"
+
+
+CASES = {
+    'calibration': case_calibration,
+    'dataset_load': case_dataset_load,
+    'program_init': case_program_init,
+    'city_check_exact': case_city_check_exact,
+    'spell_check_fuzzy': case_spell_check_fuzzy,
+    'route_single': case_route_single,
+    'route_batch': case_route_batch,
+    'write_10k': write_case(10000),
+    'write_100k': write_case(100000),
+    'write_1m': write_case(1000000),
+}
+
+
+def run_case(name, runs=DEFAULT_RUNS):
+    """
+    Runs one case in fresh interpreters (with a fixed string hash seed, so dictionary layouts repeat).
+    :param name: The case name.
+    :param runs: The number of interpreters to run the case in. The best rate is kept.
+    :return: Dictionary with the rate, its unit and the peak resident memory (MB).
+    """
+    env = dict(os.environ, PYTHONHASHSEED='0')
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', name], check=True, env=env,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return max(results, key=lambda result: result['rate'])
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results with a baseline. Rates are normalised by the calibration rate of their run when both have one.
+    :param results: The case results.
+    :param baseline: The baseline case results.
+    :param threshold: The allowed relative slowdown (or memory growth), e.g. 0.3.
+    :return: List of (case, rate change, memory change, status) and whether any case regressed.
+    """
+    machine_speed = 1.0
+    if 'calibration' in results and 'calibration' in baseline:
+        machine_speed = results['calibration']['rate'] / baseline['calibration']['rate']
+    rows = []
+    failed = False
+    for name, result in results.items():
+        base = baseline.get(name)
+        if name == 'calibration' or base is None:
+            rows.append((name, None, None, "new" if base is None else "machine speed {:+.1f}%".format(
+                (machine_speed - 1) * 100)))
+            continue
+        rate_change = result['rate'] / machine_speed / base['rate'] - 1
+        memory_change = None
+        if result.get('peak_rss_mb') and base.get('peak_rss_mb'):
+            memory_change = result['peak_rss_mb'] / base['peak_rss_mb'] - 1
+        regressed = rate_change < -threshold or (memory_change is not None and memory_change > threshold)
+        failed = failed or regressed
+        rows.append((name, rate_change, memory_change, "REGRESSION" if regressed else "ok"))
+    return rows, failed
+
+
+def percent(change):
+    return "" if change is None else "{:+.1f}%".format(change * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the benchmark suite and compares it with a baseline.")
+    parser.add_argument('--case', help=argparse.SUPPRESS)  # Runs a single case (used by the child processes).
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES),
+                        help="Cases to run (calibration always runs).")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help="Fresh interpreters per case (the best rate is kept).")
+    parser.add_argument('--out', default=DEFAULT_RESULTS, help="JSON file to save the results to.")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown or memory growth before a case fails.")
+    parser.add_argument('--update-baseline', action='store_true', help="Save the results as the new baseline.")
+    args = parser.parse_args()
+
+    if args.case:
+        rate, unit = CASES[args.case]()
+        print(json.dumps({'rate': rate, 'unit': unit, 'peak_rss_mb': peak_rss_mb()}))
+        return
+
+    results = {}
+    for name in ['calibration'] + [case for case in args.cases if case != 'calibration']:
+        results[name] = run_case(name, args.runs)
+        print("{:<20}{:>16,.1f} {:<10}{:>10} MB".format(name, results[name]['rate'], results[name]['unit'],
+                                                     "{:.1f}".format(results[name]['peak_rss_mb'] or 0)))
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'platform': platform.platform(),
+              'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'cases': results}
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=2)
+    print("Results saved to " + args.out)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)['cases']
+        baseline.update(results)
+        report['cases'] = baseline
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print("Baseline saved to " + args.baseline)
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline at " + args.baseline + ". Run with --update-baseline to record one.")
+        return
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)['cases']
+    rows, failed = compare(results, baseline, args.threshold)
+    print("\nCompared with {} (threshold {:.0f}%):".format(args.baseline, args.threshold * 100))
+    for name, rate_change, memory_change, status in rows:
+        print("{:<20}{:>10} rate{:>10} memory  {}".format(name, percent(rate_change), percent(memory_change), status))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
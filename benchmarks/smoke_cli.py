@@ -0,0 +1,120 @@
+"""
+Smoke run of every command line entry point: each script runs in a fresh interpreter on a tiny input (in a
+temporary directory) and must exit with status 0 and write its output. This catches errors that only show up when
+main() runs, such as a name left behind by a refactor.
+Usage: python benchmarks/smoke_cli.py
+"""
+
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from bench_utils import PROGRAM_DIR
+
+ROUTES = ('origin,destination\nSydney,Melbourne\nTokyo,Damascus\n"Paris, France",Berlin\nNowhere123,Paris\n')
+DELTA = ('action,country,city,lat,lng,population\nadd,Australia,Smoketown,-30.0,150.0,1000\n'
+         'move,Australia,Sydney,-33.9,151.2,\nremove,Australia,Melbourne,,,\n')
+TIMEOUT = 120  # Seconds before a script is considered hung.
+
+
+def run(args):
+    """
+    Runs a script of the program directory.
+    :param args: The script file name and its arguments.
+    :return: The standard output.
+    :raises RuntimeError: If the script exits with a non-zero status.
+    """
+    result = subprocess.run([sys.executable] + list(args), cwd=PROGRAM_DIR, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, universal_newlines=True, timeout=TIMEOUT)
+    if result.returncode:
+        raise RuntimeError("{} exited with {}:\n{}".format(" ".join(args), result.returncode, result.stderr))
+    return result.stdout
+
+
+def check_file(path):
+    """
+    :param path: A file a script should have written.
+    :raises RuntimeError: If the file is missing or empty.
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        raise RuntimeError("Expected output " + path + " was not written.")
+
+
+def check_service():
+    """
+    Starts service.py on a free port, requests /health and stops it.
+    """
+    process = subprocess.Popen([sys.executable, 'service.py', '--port', '0'], cwd=PROGRAM_DIR,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    try:
+        line = process.stdout.readline()
+        if not line.startswith("Serving on "):
+            raise RuntimeError("service.py did not start:\n" + process.stderr.read())
+        with urllib.request.urlopen(line.split()[-1] + '/health', timeout=TIMEOUT) as response:
+            if json.loads(response.read().decode('utf-8'))['status'] != 'ok':
+                raise RuntimeError("service.py /health did not report ok.")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        routes_path = os.path.join(tmp_dir, 'routes.csv')
+        cities_path = os.path.join(tmp_dir, 'cities.txt')
+        delta_path = os.path.join(tmp_dir, 'delta.csv')
+        with open(routes_path, 'w', encoding='utf-8') as file:
+            file.write(ROUTES)
+        with open(cities_path, 'w', encoding='utf-8') as file:
+            file.write("Sydney\nTokyo\nParis, France\n")
+        with open(delta_path, 'w', encoding='utf-8') as file:
+            file.write(DELTA)
+        path = functools.partial(os.path.join, tmp_dir)
+        # (label, arguments, file that must be written or None).
+        checks = [
+            ("batch_writer.py (csv)", ['batch_writer.py', routes_path, path('results.csv')], path('results.csv')),
+            ("batch_writer.py (workers)", ['batch_writer.py', routes_path, path('workers.csv'), '--workers', '2'],
+             path('workers.csv')),
+            ("batch_writer.py (npz)", ['batch_writer.py', routes_path, path('results.npz'), '--format', 'npz'],
+             path('results.npz')),
+            ("columnar_output.py", ['columnar_output.py', path('results.npz'), path('columns.csv')],
+             path('columns.csv')),
+            ("chart_renderer.py", ['chart_renderer.py', routes_path, path('charts'), '--workers', '1'],
+             path('charts', '000000_Sydney-Melbourne.png')),
+            ("chart_renderer.py (workers)", ['chart_renderer.py', routes_path, path('charts_svg'), '--format', 'svg',
+                                             '--workers', '2'], path('charts_svg', '000000_Sydney-Melbourne.svg')),
+            ("travel_matrix.py matrix", ['travel_matrix.py', 'matrix', cities_path, cities_path, '--out',
+                                         path('matrix')], None),
+            ("travel_matrix.py isochrone", ['travel_matrix.py', 'isochrone', 'Sydney', '1'], None),
+            ("itinerary.py", ['itinerary.py', 'Sydney', 'Melbourne'], None),
+            ("distance_matrix.py", ['distance_matrix.py', '--top', '50', '--out', path('distances.npy')],
+             path('distances.npy')),
+            ("city_delta.py", ['city_delta.py', delta_path], None),
+            ("region_shards.py", ['region_shards.py'], None),
+        ]
+        failures = 0
+        for label, args, expected in checks + [("service.py", None, None)]:
+            start = time.perf_counter()
+            try:
+                if args is None:
+                    check_service()
+                else:
+                    run(args)
+                    if expected is not None:
+                        check_file(expected)
+                status = "ok"
+            except (RuntimeError, OSError, subprocess.SubprocessError) as error:
+                failures += 1
+                status = "FAILED\n" + str(error)
+            print("{:<36}{:>8.2f} s  {}".format(label, time.perf_counter() - start, status))
+    print("{} of {} entry points failed.".format(failures, len(checks) + 1))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Headless rendering of the travel time horizontal bar chart (the Program.mpl_hbc design) to PNG or SVG files, for
+reports covering many routes.
+Charts are drawn with Matplotlib's Agg canvas directly (no pyplot, no GUI window). A ChartRenderer builds its figure,
+axes, bars and text once and only updates the bar lengths, labels and titles for each route, which is much faster
+than building a new figure per chart. Many routes can be spread across a process pool; each worker keeps its own
+renderer.
+
+Usage: python chart_renderer.py routes.csv out_dir [--format png|svg] [--workers N] [--no-header]
+The input has one route per row: origin city, destination city (like batch_writer.py). One file is written per route.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import os
+import re
+
+FORMATS = ('png', 'svg')
+BAR_COLOR = "#00d6ab"
+RECOMMENDED_COLOR = "#c900d4"
+TEXT_COLOR = "#222222"
+CHUNK_SIZE = 50  # Charts per worker task.
+WORKER_RENDERER = None  # The ChartRenderer of a worker process (see render_routes).
+
+
+def chart_rows(modes_list, minutes):
+    """
+    Sorts the modes of transport for a chart: fastest at the top.
+    :param modes_list: The names of the modes of transport.
+    :param minutes: Whole minutes for each mode.
+    :return: List of (mode, minutes) from slowest (bottom bar) to fastest (top bar).
+    """
+    return sorted(zip(modes_list, minutes), key=lambda row: row[1], reverse=True)
+
+
+def set_window_title(figure, title):
+    """
+    Sets the window title of a pyplot figure. Figure.canvas.set_window_title was removed in Matplotlib 3.6; the
+    title now belongs to the figure manager, which headless backends do not have.
+    :param figure: The figure.
+    :param title: The window title.
+    """
+    manager = getattr(figure.canvas, 'manager', None)
+    if manager is not None:
+        manager.set_window_title(title)
+    elif hasattr(figure.canvas, 'set_window_title'):
+        figure.canvas.set_window_title(title)
+
+
+def chart_file_name(number, origin, destination, file_format):
+    """
+    :param number: The route number (keeps file names unique and in input order).
+    :param origin: The origin city name.
+    :param destination: The destination city name.
+    :param file_format: 'png' or 'svg'.
+    :return: A file name that is safe on every operating system.
+    """
+    name = re.sub(r'[^\w-]+', '_', origin + "-" + destination).strip('_')
+    return "{:06d}_{}.{}".format(number, name, file_format)
+
+
+class ChartRenderer:
+    def __init__(self, modes_list, figsize=(12, 8), dpi=80):
+        """
+        Builds the figure once: axes, one bar and one time label per mode of transport, title and footer.
+        :param modes_list: The names of the modes of transport.
+        :param figsize: Figure size in inches.
+        :param dpi: Dots per inch of PNG files.
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.modes_list = list(modes_list)
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor='w', edgecolor='k')
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot(1, 1, 1)
+        positions = list(range(len(self.modes_list)))
+        self.bars = self.axes.barh(positions, [1] * len(positions), align='center', alpha=0.5, color=BAR_COLOR)
+        self.bars[-1].set_color(RECOMMENDED_COLOR)  # The top bar is always the fastest mode.
+        self.bars[-1].set_alpha(0.5)
+        self.axes.set_yticks(positions)
+        self.axes.set_xlabel('Travel Time - Hours', fontsize=12)
+        self.labels = [self.axes.text(0, position, "", va='center', color=TEXT_COLOR, fontweight="bold")
+                       for position in positions]
+        self.title = self.axes.set_title("", fontsize=20, fontweight="bold", y=1.05)
+        self.footer = self.figure.text(0.32, 0.02, "", fontsize=14, color=RECOMMENDED_COLOR, fontweight='bold')
+
+    def update(self, origin, destination, minutes):
+        """
+        Updates the chart for a route.
+        :param origin: The origin city name.
+        :param destination: The destination city name.
+        :param minutes: Whole minutes for each mode of transport.
+        """
+        rows = chart_rows(self.modes_list, minutes)
+        hours = [max(time, 0) / 60 for _, time in rows]
+        for bar, label, (mode, time), length in zip(self.bars, self.labels, rows, hours):
+            bar.set_width(length)
+            label.set_x(length)
+            label.set_text("   {}hr. {}min.".format(time // 60, time % 60))
+        self.axes.set_yticklabels([mode for mode, _ in rows])
+        # Leaves room on the right for the time label of the longest bar.
+        self.axes.set_xlim(0, max(max(hours) * 1.25, 0.1))
+        self.title.set_text("Travel Time: " + origin + " - " + destination)
+        self.footer.set_text("Recommended mode of transport: " + rows[-1][0])
+
+    def render(self, origin, destination, minutes, path, file_format=None):
+        """
+        Writes the chart of a route to an image file.
+        :param origin: The origin city name.
+        :param destination: The destination city name.
+        :param minutes: Whole minutes for each mode of transport.
+        :param path: The file to write.
+        :param file_format: 'png' or 'svg' (default: from the file extension).
+        """
+        self.update(origin, destination, minutes)
+        self.figure.savefig(path, format=file_format)
+
+
+def init_worker(modes_list):
+    """
+    Sets up a worker process with its own renderer.
+    :param modes_list: The names of the modes of transport.
+    """
+    global WORKER_RENDERER
+    WORKER_RENDERER = ChartRenderer(modes_list)
+
+
+def render_chunk(charts):
+    """
+    Worker task: renders a list of charts.
+    :param charts: List of (origin, destination, minutes, path).
+    :return: The number of charts written.
+    """
+    for origin, destination, minutes, path in charts:
+        WORKER_RENDERER.render(origin, destination, minutes, path)
+    return len(charts)
+
+
+def render_routes(modes_list, routes, out_dir, file_format='png', workers=1):
+    """
+    Renders one chart per route into a directory.
+    :param modes_list: The names of the modes of transport.
+    :param routes: Iterable of (origin name, destination name, [whole minutes per mode]).
+    :param out_dir: The directory to write the files to (created if needed).
+    :param file_format: 'png' or 'svg'.
+    :param workers: The number of worker processes (1 renders in this process).
+    :return: List of the paths written, in route order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    charts = [(origin, destination, list(minutes),
+               os.path.join(out_dir, chart_file_name(number, origin, destination, file_format)))
+              for number, (origin, destination, minutes) in enumerate(routes)]
+    if workers == 1:
+        renderer = ChartRenderer(modes_list)
+        for origin, destination, minutes, path in charts:
+            renderer.render(origin, destination, minutes, path)
+    else:
+        chunks = [charts[start:start + CHUNK_SIZE] for start in range(0, len(charts), CHUNK_SIZE)]
+        with concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker,
+                                                    initargs=(list(modes_list),)) as executor:
+            for _ in executor.map(render_chunk, chunks):
+                pass
+    return [chart[3] for chart in charts]
+
+
+def main():
+    """
+    Command line entry point: renders a chart for every route in a CSV file.
+    """
+    from batch_writer import BatchWriter, read_chunks
+    from dataset_cache import load_table
+    parser = argparse.ArgumentParser(description="Renders travel time charts for a CSV file of routes.")
+    parser.add_argument('input', help="Input CSV file of origin/destination pairs.")
+    parser.add_argument('out_dir', help="Directory to write the charts to.")
+    parser.add_argument('--format', choices=FORMATS, default='png', help="Image format.")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (0 = one per CPU).")
+    parser.add_argument('--no-header', action='store_true', help="The input file has no header row.")
+    args = parser.parse_args()
+
+    city_list, transport_list = load_table(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx'))
+    writer = BatchWriter(city_list, transport_list.names, transport_list)
+    with open(args.input, newline='') as in_file:
+        pairs = csv.reader(in_file)
+        if not args.no_header:
+            next(pairs, None)
+        routes = []
+        skipped = 0
+        for chunk in read_chunks(pairs, 50000):
+            origin_idx, dest_idx, found, _, minutes, _ = writer.calculate_chunk(chunk)
+            skipped += int((~found).sum())
+            routes.extend((writer.names[origin], writer.names[dest], times) for origin, dest, times in
+                          zip(origin_idx[found].tolist(), dest_idx[found].tolist(), minutes.tolist()))
+    paths = render_routes(transport_list.names, routes, args.out_dir, args.format, args.workers or os.cpu_count())
+    print("Wrote {} charts to {} ({} routes with unknown cities skipped).".format(len(paths), args.out_dir, skipped))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Incremental updates of the city data of a running program, without rebuilding its indices.
+A delta is a CSV file with the header action,country,city,lat,lng,population and one change per line:
+- add: a new city. It is appended after the last row, so every other city keeps its row.
+- move: new coordinates (and population, if given) of the city "City, Country" (the first row with that city and
+  country, like CityIndex.lookup).
+- remove: removes the city "City, Country". The row stays in the table (marked in CityTable.removed), so row indices
+  held elsewhere stay valid, but no index returns it any more. lat, lng and population may be left empty.
+The adds are applied first, then the moves and removes in file order (so "remove X" followed by "add X" replaces the
+old row of X with a new one).
+
+apply_delta() updates every structure in place: the CityTable, CityIndex, PrefixIndex, FuzzyMatcher and SpatialIndex
+are edited for the changed cities only (see their update methods), and the route cache and the distance matrix only
+drop the entries involving a moved or removed city. Routes between unchanged cities stay cached.
+
+Usage: python city_delta.py patch.csv  (checks a delta against REA.xlsx and prints what it would change)
+"""
+
+import argparse
+import collections
+import csv
+import os
+import numpy as np
+
+from city_index import normalise_name
+
+HEADER = ('action', 'country', 'city', 'lat', 'lng', 'population')
+ADD, MOVE, REMOVE = 'add', 'move', 'remove'
+
+CityChange = collections.namedtuple('CityChange', 'action country city lat lng population')
+DeltaSummary = collections.namedtuple('DeltaSummary', 'added moved removed routes_discarded')
+
+
+def read_delta(path):
+    """
+    Reads a delta CSV file.
+    :param path: Path of the file.
+    :return: List of CityChange, in file order (lat, lng and population are None where not given).
+    :raises ValueError: If the header, an action or a number is invalid, or a value needed by an action is missing.
+    """
+    changes = []
+    with open(path, newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        header = [column.strip().lower() for column in next(reader, [])]
+        if tuple(header[:len(HEADER)]) != HEADER:
+            raise ValueError(path + " must start with the header " + ",".join(HEADER) + ".")
+        for line_num, fields in enumerate(reader, 2):
+            if not any(field.strip() for field in fields):
+                continue
+            fields = [field.strip() for field in fields] + [''] * (len(HEADER) - len(fields))
+            action, country, city = fields[0].lower(), fields[1], fields[2]
+            if action not in (ADD, MOVE, REMOVE):
+                raise ValueError("Line {}: unknown action {!r}. Choose from: add, move, remove.".format(line_num,
+                                                                                                      fields[0]))
+            if not country or not city:
+                raise ValueError("Line {}: the country and city are required.".format(line_num))
+            try:
+                lat, lng = [float(value) if value else None for value in fields[3:5]]
+                population = int(float(fields[5])) if fields[5] else None
+            except ValueError:
+                raise ValueError("Line {}: invalid number.".format(line_num))
+            if action != REMOVE:
+                if lat is None or lng is None:
+                    raise ValueError("Line {}: {} needs lat and lng.".format(line_num, action))
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                    raise ValueError("Line {}: coordinates out of range.".format(line_num))
+            changes.append(CityChange(action, country, city, lat, lng, population))
+    return changes
+
+
+def apply_delta(changes, city_list, city_index, prefix_index=None, fuzzy_matcher=None, spatial_index=None,
+                route_cache=None, distance_matrix=None):
+    """
+    Applies a delta to a CityTable and the structures built from it. Structures given as None are skipped.
+    :param changes: List of CityChange (see read_delta).
+    :param city_list: The CityTable.
+    :param city_index: The CityIndex (needed to find the moved and removed cities).
+    :param prefix_index: The PrefixIndex.
+    :param fuzzy_matcher: The FuzzyMatcher.
+    :param spatial_index: The SpatialIndex.
+    :param route_cache: The RouteCache.
+    :param distance_matrix: The DistanceMatrix.
+    :return: DeltaSummary of the rows added, moved and removed and the number of cached routes discarded.
+    :raises KeyError: If a moved or removed city is not in the city list. Nothing is changed in that case.
+    """
+    # Checks that every moved and removed city exists (counting the rows of each city and country) before any change.
+    adds = [change for change in changes if change.action == ADD]
+    available = collections.Counter()
+    for change in changes:
+        key = (normalise_name(change.city), normalise_name(change.country))
+        if key not in available:
+            available[key] = sum(1 for row_idx in city_index.by_name.get(key[0], [])
+                                 if normalise_name(city_list[row_idx][0]) == key[1])
+            available[key] += sum(1 for add in adds if (normalise_name(add.city), normalise_name(add.country)) == key)
+        if change.action != ADD and available[key] <= 0:
+            raise KeyError("No entry for " + change.city + ", " + change.country + " in database.")
+        if change.action == REMOVE:
+            available[key] -= 1
+
+    added = city_list.append_rows([change.country for change in adds], [change.city for change in adds],
+                                  [change.lat for change in adds], [change.lng for change in adds],
+                                  [change.population or 0 for change in adds])
+    for row_idx in added.tolist():
+        city_index.add_row(row_idx, city_list[row_idx])
+    if fuzzy_matcher is not None:
+        fuzzy_matcher.add_names(added.tolist(), [city_list.name(row_idx) for row_idx in added.tolist()])
+
+    moves = {}  # Row -> (lat, lng, population), the last move of each city.
+    removed = []
+    for change in changes:
+        if change.action == ADD:
+            continue
+        row_idx = city_index.by_name_country[(normalise_name(change.city), normalise_name(change.country))]
+        if change.action == MOVE:
+            population = change.population if change.population is not None else city_list.populations.item(row_idx)
+            moves[row_idx] = (change.lat, change.lng, population)
+        else:
+            moves.pop(row_idx, None)
+            removed.append(row_idx)
+            city_index.remove_row(row_idx)
+            if fuzzy_matcher is not None:
+                name = city_list.name(row_idx)
+                others = [other for other in city_index.matches(name) if city_list.name(other) == name]
+                fuzzy_matcher.remove_name(row_idx, name, min(others) if others else None)
+
+    moved = np.array(sorted(moves), dtype=np.int64)
+    if len(moved):
+        city_list.move_rows(moved, *zip(*[moves[row_idx] for row_idx in moved.tolist()]))
+    city_list.remove_rows(removed)
+    if prefix_index is not None:
+        prefix_index.update(added.tolist(), removed, city_list.populations)
+    changed = np.concatenate([added, moved])
+    if spatial_index is not None:
+        spatial_index.update(changed, city_list.lats[changed], city_list.lngs[changed], removed)
+    stale = set(moved.tolist()) | set(removed)
+    routes_discarded = route_cache.discard_rows(stale) if route_cache is not None else 0
+    if distance_matrix is not None:
+        distance_matrix.forget_rows(stale, len(city_list))
+    return DeltaSummary(len(added), len(moved), len(removed), routes_discarded)
+
+
+def main():
+    """
+    Command line entry point: applies a delta to a copy of the city data and prints the changes.
+    """
+    from city_index import CityIndex
+    from dataset_cache import load_table
+    parser = argparse.ArgumentParser(description="Checks a city delta (CSV patch) against REA.xlsx.")
+    parser.add_argument('delta', help="CSV file with the header " + ",".join(HEADER) + ".")
+    args = parser.parse_args()
+    try:
+        changes = read_delta(args.delta)
+    except ValueError as error:
+        parser.error(error.args[0])
+    city_list = load_table(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx'))[0]
+    try:
+        summary = apply_delta(changes, city_list, CityIndex(city_list))
+    except KeyError as error:
+        parser.error(error.args[0])
+    print("{} added, {} moved, {} removed ({:,} cities after the delta).".format(
+        summary.added, summary.moved, summary.removed, len(city_list) - int(city_list.removed.sum())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Hashed lookup index for the cities in the geo_city sheet of REA.xlsx.
+The index is built once from Program.city_list (a CityTable, whose rows index like the sheet rows: Country, City,
+Latitude, Longitude, Population) so that finding a city by name is a single dictionary lookup instead of a scan over
+every row.
+"""
+
+from city_table import CityTable, city_columns
+
+
+def normalise_name(name):
+    """
+    Normalises a city or country name so that lookups ignore case and surrounding white space.
+    :param name: The name to normalise.
+    :return: The normalised name.
+    """
+    return str(name).strip().lower()
+
+
+class CityIndex:
+    def __init__(self, city_list):
+        """
+        Builds the name lookup tables from the city list.
+        Rows keep their spreadsheet order, so a bare city name resolves to the same (first) row the linear scan in
+        Program.city_check used to find. "City, Country" resolves duplicated city names to a specific country.
+        :param city_list: CityTable or list of rows from the geo_city sheet. Format: Country, City, Latitude, ...
+        """
+        self.city_list = city_list
+        self.by_name = {}  # Normalised city name -> list of row indices (in spreadsheet order).
+        self.by_name_country = {}  # (Normalised city name, normalised country) -> first row index.
+        countries, names = city_columns(city_list)[:2]
+        for row_idx, row in enumerate(zip(countries, names)):
+            self.add_row(row_idx, row)
+
+    def add_row(self, row_idx, row):
+        """
+        Adds a single row of the city list to the lookup tables.
+        :param row_idx: The index of the row within the city list.
+        :param row: The row. Format: Country, City, Latitude, Longitude, ...
+        """
+        name = normalise_name(row[1])
+        self.by_name.setdefault(name, []).append(row_idx)
+        self.by_name_country.setdefault((name, normalise_name(row[0])), row_idx)
+
+    def remove_row(self, row_idx):
+        """
+        Removes a single row of the city list from the lookup tables (see city_delta.py). A "City, Country" key held by
+        the row moves to the next row with the same city and country, if there is one.
+        :param row_idx: The index of the row within the city list.
+        """
+        row = self.city_list[row_idx]
+        name, country = normalise_name(row[1]), normalise_name(row[0])
+        rows = self.by_name.get(name, [])
+        if row_idx not in rows:
+            return
+        rows.remove(row_idx)
+        if not rows:
+            del self.by_name[name]
+        if self.by_name_country.get((name, country)) == row_idx:
+            del self.by_name_country[(name, country)]
+            for other_idx in rows:
+                if normalise_name(self.city_list[other_idx][0]) == country:
+                    self.by_name_country[(name, country)] = other_idx
+                    break
+
+    def lookup(self, query):
+        """
+        Finds the row index for a city name. Accepts either "City" or "City, Country".
+        :param query: The city name input by the user.
+        :return: The row index of the city, or None if there is no exact match.
+        """
+        name = normalise_name(query)
+        rows = self.by_name.get(name)
+        if rows:
+            return rows[0]
+
+        # Country names can contain commas themselves (e.g. "Korea, South"), so every split point is tried.
+        parts = name.split(",")
+        for split in range(1, len(parts)):
+            key = (",".join(parts[:split]).strip(), ",".join(parts[split:]).strip())
+            if key in self.by_name_country:
+                return self.by_name_country[key]
+        return None
+
+    def matches(self, query):
+        """
+        Finds every row that shares the city name of the query (used to let the user know about duplicate names).
+        :param query: The city name.
+        :return: List of row indices with that name.
+        """
+        return list(self.by_name.get(normalise_name(query), []))
+
+    def record(self, row_idx):
+        """
+        Creates the city information list for a row, in the format returned by Program.city_check.
+        :param row_idx: The index of the row within the city list.
+        :return: List (a CityRecord view for a CityTable) containing the City, Country, latitude, longitude, and city
+                 list row index (in that order).
+        """
+        if isinstance(self.city_list, CityTable):
+            return self.city_list.record(row_idx)
+        row = self.city_list[row_idx]
+        return [row[1], row[0], row[2], row[3], row_idx]
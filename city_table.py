@@ -0,0 +1,267 @@
+"""
+Compact columnar store of the geo_city sheet, used instead of a list of row lists.
+A list of rows keeps a list, four boxed numbers and a name string per city (plus a duplicate country string); the
+table keeps contiguous arrays instead:
+- lat, lng (float64) and population (int64),
+- city names as one string pool with offsets,
+- countries as an interned table of unique names plus an int16 code per city.
+Rows are read through lightweight __slots__ views that are created on access.
+Cities can be added, moved and removed in place (see city_delta.py). Added cities are appended and removed cities stay
+as rows marked in the removed mask, so the row of every other city never changes. CityRow views index like the old rows
+(Country, City, Latitude, Longitude, Population), so code written for Program.city_list keeps working unchanged, and
+CityRecord views index like the city information list returned by Program.city_check.
+"""
+
+import hashlib
+import numpy as np
+
+
+class RecordView:
+    """
+    Read-only view of one row of a CityTable. GETTERS gives the fields in indexing order, as functions of
+    (table, row index).
+    """
+    __slots__ = ('table', 'row_idx')
+    GETTERS = ()
+
+    def __init__(self, table, row_idx):
+        self.table = table
+        self.row_idx = row_idx
+
+    @property
+    def city(self):
+        return self.table.name(self.row_idx)
+
+    @property
+    def country(self):
+        return self.table.country(self.row_idx)
+
+    @property
+    def lat(self):
+        return self.table.lats.item(self.row_idx)
+
+    @property
+    def lng(self):
+        return self.table.lngs.item(self.row_idx)
+
+    @property
+    def population(self):
+        return self.table.populations.item(self.row_idx)
+
+    def __getitem__(self, index):
+        getter = self.GETTERS[index]
+        if type(getter) is tuple:  # A slice.
+            return [field(self.table, self.row_idx) for field in getter]
+        return getter(self.table, self.row_idx)
+
+    def __len__(self):
+        return len(self.GETTERS)
+
+    def __iter__(self):
+        return (field(self.table, self.row_idx) for field in self.GETTERS)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, RecordView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CityRow(RecordView):
+    """
+    A row in the geo_city sheet format: Country, City, Latitude, Longitude, Population.
+    """
+    __slots__ = ()
+    GETTERS = ()  # Set below CityTable.
+
+
+class CityRecord(RecordView):
+    """
+    A city in the Program.city_check format: City, Country, Latitude, Longitude, Row index.
+    """
+    __slots__ = ()
+    GETTERS = ()  # Set below CityTable.
+
+
+class CityTable:
+    def __init__(self, names, countries, country_codes, lats, lngs, populations):
+        """
+        Creates the table from its columns.
+        :param names: List of city names.
+        :param countries: List of the unique country names.
+        :param country_codes: The index into countries of every city.
+        :param lats: Latitude of every city.
+        :param lngs: Longitude of every city.
+        :param populations: Population of every city.
+        """
+        self.name_pool = "".join(names)
+        self.name_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        self.name_offsets[1:] = np.cumsum([len(name) for name in names])
+        self.countries = [str(country) for country in countries]
+        self.country_codes = np.asarray(country_codes, dtype=np.int16 if len(countries) < 1 << 15 else np.int32)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.populations = np.asarray(populations, dtype=np.int64)
+        self.removed = np.zeros(len(names), dtype=bool)  # Rows of removed cities (see remove_rows).
+        # Values are only boxed when a row is read. .item() returns plain floats and ints, like the old rows held.
+
+    @classmethod
+    def from_rows(cls, city_list):
+        """
+        :param city_list: List of rows. Format: Country, City, Latitude, Longitude, Population
+        :return: The CityTable holding the same data.
+        """
+        countries, codes = np.unique([str(row[0]) for row in city_list], return_inverse=True)
+        return cls([str(row[1]) for row in city_list], countries.tolist(), codes,
+                   [row[2] for row in city_list], [row[3] for row in city_list], [row[4] for row in city_list])
+
+    @classmethod
+    def from_cache(cls, cache):
+        """
+        :param cache: The arrays loaded by dataset_cache.load_cache.
+        :return: The CityTable.
+        """
+        from dataset_cache import decode_names
+        return cls(decode_names(cache['name_pool'], cache['name_offsets']), cache['countries'].tolist(),
+                   cache['country_codes'], cache['lat'], cache['lng'], cache['population'])
+
+    def __len__(self):
+        return len(self.lats)
+
+    def __getitem__(self, index):
+        """
+        :param index: A row index (or a slice).
+        :return: A CityRow view (or a list of views).
+        """
+        if isinstance(index, slice):
+            return [CityRow(self, row_idx) for row_idx in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("city table index out of range")
+        return CityRow(self, index)
+
+    def __iter__(self):
+        return (CityRow(self, row_idx) for row_idx in range(len(self)))
+
+    def name(self, row_idx):
+        """
+        :param row_idx: A row index.
+        :return: The city name.
+        """
+        return self.name_pool[self.name_offsets.item(row_idx):self.name_offsets.item(row_idx + 1)]
+
+    def country(self, row_idx):
+        """
+        :param row_idx: A row index.
+        :return: The country name.
+        """
+        return self.countries[self.country_codes.item(row_idx)]
+
+    def names(self):
+        """
+        :return: List of every city name, in row order.
+        """
+        pool, bounds = self.name_pool, self.name_offsets.tolist()
+        return [pool[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def country_names(self):
+        """
+        :return: List of the country of every city, in row order (the strings are shared, not copied).
+        """
+        countries = self.countries
+        return [countries[code] for code in self.country_codes.tolist()]
+
+    def append_rows(self, countries, names, lats, lngs, populations):
+        """
+        Adds cities after the last row.
+        :param countries: List of the country of every new city (new countries are added to the country table).
+        :param names: List of the new city names.
+        :param lats: Latitude of every new city.
+        :param lngs: Longitude of every new city.
+        :param populations: Population of every new city.
+        :return: Array of the rows of the new cities.
+        """
+        rows = np.arange(len(self), len(self) + len(names))
+        codes = []
+        for country in countries:
+            country = str(country)
+            if country not in self.countries:
+                self.countries.append(country)
+            codes.append(self.countries.index(country))
+        dtype = np.int16 if len(self.countries) < 1 << 15 else np.int32
+        self.name_pool += "".join(names)
+        self.name_offsets = np.concatenate([self.name_offsets, self.name_offsets[-1] +
+                                            np.cumsum([len(name) for name in names], dtype=np.int64)])
+        self.country_codes = np.concatenate([self.country_codes.astype(dtype), np.array(codes, dtype=dtype)])
+        self.lats = np.concatenate([self.lats, np.asarray(lats, dtype=np.float64)])
+        self.lngs = np.concatenate([self.lngs, np.asarray(lngs, dtype=np.float64)])
+        self.populations = np.concatenate([self.populations, np.asarray(populations, dtype=np.int64)])
+        self.removed = np.concatenate([self.removed, np.zeros(len(names), dtype=bool)])
+        return rows
+
+    def move_rows(self, rows, lats, lngs, populations):
+        """
+        Sets the coordinates and population of existing cities.
+        :param rows: The rows of the cities.
+        :param lats: The new latitudes.
+        :param lngs: The new longitudes.
+        :param populations: The new populations.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        # The columns may be views of arrays shared with other objects, so they are copied before they are changed.
+        self.lats, self.lngs, self.populations = self.lats.copy(), self.lngs.copy(), self.populations.copy()
+        self.lats[rows], self.lngs[rows], self.populations[rows] = lats, lngs, populations
+
+    def remove_rows(self, rows):
+        """
+        Marks cities as removed. Their rows stay in the table, but no index returns them.
+        :param rows: The rows of the cities.
+        """
+        self.removed[np.asarray(rows, dtype=np.int64)] = True
+
+    def record(self, row_idx):
+        """
+        :param row_idx: A row index.
+        :return: CityRecord view in the Program.city_check format.
+        """
+        return CityRecord(self, row_idx)
+
+    def digest(self):
+        """
+        :return: SHA-256 hex digest of the table contents.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.name_pool.encode('utf-8'))
+        digest.update("\n".join(self.countries).encode('utf-8'))
+        for column in (self.name_offsets, self.country_codes, self.lats, self.lngs, self.populations):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        if self.removed.any():  # Only hashed once a city is removed, so unchanged tables keep their digest.
+            digest.update(self.removed.tobytes())
+        return digest.hexdigest()
+
+
+CityRow.GETTERS = (CityTable.country, CityTable.name, lambda table, row_idx: table.lats.item(row_idx),
+                   lambda table, row_idx: table.lngs.item(row_idx),
+                   lambda table, row_idx: table.populations.item(row_idx))
+CityRecord.GETTERS = (CityTable.name, CityTable.country, CityRow.GETTERS[2], CityRow.GETTERS[3],
+                      lambda table, row_idx: row_idx)
+
+
+def city_columns(city_list):
+    """
+    Reads the columns of a city list, directly from the arrays when it is a CityTable.
+    :param city_list: A CityTable or a list of rows. Format: Country, City, Latitude, Longitude, Population
+    :return: Lists of the countries and names, float64 arrays of the latitudes and longitudes and an int64 array of
+             the populations.
+    """
+    if isinstance(city_list, CityTable):
+        return city_list.country_names(), city_list.names(), city_list.lats, city_list.lngs, city_list.populations
+    return ([row[0] for row in city_list], [row[1] for row in city_list],
+            np.array([row[2] for row in city_list], dtype=np.float64),
+            np.array([row[3] for row in city_list], dtype=np.float64),
+            np.array([row[4] for row in city_list], dtype=np.int64))
@@ -0,0 +1,260 @@
+"""
+Compiled binary cache of the REA.xlsx data.
+Parsing the spreadsheet takes seconds (and needs pandas and openpyxl), so the geo_city and speed sheets are compiled
+once into a NumPy .npz file with columnar arrays:
+- lat, lng (float64) and population (int64) per city,
+- city names as one UTF-8 byte pool with offsets,
+- countries as an interned table of unique names plus an integer code per city,
+- the modes of transport, their speeds and their travel time formulas (the optional Formula, A, B, C, D columns of
+  the speed sheet, see transport_modes).
+The cache stores the size, mtime and SHA-256 of the spreadsheet it was built from. It is rebuilt automatically when
+the spreadsheet changes; if only the mtime changed but the contents hash the same, the cache is kept.
+
+Arrays read from an .npz file are private copies, so processes that each need the dataset (the batch_writer.py
+workers) use export_columns() instead: it writes the arrays of the cache as plain .npy files in REA_columns, which
+load_mapped_table() memory-maps read-only. The pages of those files are then shared by every process through the OS
+page cache; only the decoded names and the objects built on top of the table are private to each process.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+
+from transport_modes import MAX_PARAMS, ModeRegistry
+
+CACHE_VERSION = 1
+SOURCE_KEYS = ('version', 'source_size', 'source_mtime_ns', 'source_sha256')  # Fingerprint of the source spreadsheet.
+COLUMN_MANIFEST = 'manifest.json'
+
+
+def cache_path_for(xlsx_path):
+    """
+    :param xlsx_path: Path of the spreadsheet.
+    :return: Path of its cache file (next to the spreadsheet).
+    """
+    return os.path.splitext(xlsx_path)[0] + '_cache.npz'
+
+
+def column_dir_for(xlsx_path):
+    """
+    :param xlsx_path: Path of the spreadsheet.
+    :return: Path of its directory of memory-mappable columns (next to the spreadsheet).
+    """
+    return os.path.splitext(xlsx_path)[0] + '_columns'
+
+
+def file_hash(path):
+    """
+    :param path: Path of a file.
+    :return: The SHA-256 hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_names(names):
+    """
+    Packs a list of strings into one UTF-8 byte pool with offsets.
+    :param names: List of strings.
+    :return: The uint8 pool and the int64 offsets (len(names) + 1 entries).
+    """
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(name) for name in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_names(pool, offsets):
+    """
+    Unpacks the strings packed by encode_names.
+    :param pool: The uint8 pool.
+    :param offsets: The offsets.
+    :return: List of strings.
+    """
+    data = pool.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)]
+
+
+def compile_cache(xlsx_path, cache_path=None):
+    """
+    Reads the geo_city and speed sheets from the spreadsheet and writes the binary cache.
+    :param xlsx_path: Path of the spreadsheet.
+    :param cache_path: Path of the cache file. Defaults to cache_path_for(xlsx_path).
+    :return: The path of the cache file.
+    """
+    import pandas as pd  # Only needed when the spreadsheet has to be read.
+    cache_path = cache_path or cache_path_for(xlsx_path)
+    stat = os.stat(xlsx_path)
+    rea_file = pd.ExcelFile(xlsx_path)
+    df_geo_city = pd.read_excel(rea_file, 'geo_city')
+    df_transport = pd.read_excel(rea_file, 'speed')
+
+    # The formula columns are optional; modes without a formula get the default of their row.
+    num_modes = len(df_transport)
+    formulas = [''] * num_modes
+    if df_transport.shape[1] > 2:
+        formulas = ['' if pd.isna(formula) else str(formula) for formula in df_transport.iloc[:, 2]]
+    params = np.full((num_modes, MAX_PARAMS), np.nan)
+    param_columns = df_transport.iloc[:, 3:3 + MAX_PARAMS]
+    params[:, :param_columns.shape[1]] = param_columns.to_numpy(dtype=np.float64, na_value=np.nan)
+    ModeRegistry(df_transport.iloc[:, 0].tolist(), df_transport.iloc[:, 1].tolist(), formulas, params)  # Validates.
+
+    name_pool, name_offsets = encode_names([str(name) for name in df_geo_city['City']])
+    countries, country_codes = np.unique([str(country) for country in df_geo_city['Country']], return_inverse=True)
+    arrays = {
+        'version': np.array(CACHE_VERSION),
+        'source_size': np.array(stat.st_size),
+        'source_mtime_ns': np.array(stat.st_mtime_ns),
+        'source_sha256': np.array(file_hash(xlsx_path)),
+        'lat': np.array(df_geo_city['Lat'].tolist(), dtype=np.float64),
+        'lng': np.array(df_geo_city['Lng'].tolist(), dtype=np.float64),
+        'population': np.array(df_geo_city['Population'].tolist(), dtype=np.int64),
+        'name_pool': name_pool,
+        'name_offsets': name_offsets,
+        'countries': countries,
+        'country_codes': country_codes.astype(np.int32),
+        'modes': np.array([str(mode) for mode in df_transport.iloc[:, 0]]),
+        'speeds': np.array(df_transport.iloc[:, 1].tolist(), dtype=np.int64),
+        'mode_formulas': np.array(formulas, dtype=str),
+        'mode_params': params,
+    }
+    # Writes to a temporary file first so a half written cache is never read.
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.savez(file, **arrays)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def cache_is_current(xlsx_path, cache):
+    """
+    Checks whether a cache was built from the current spreadsheet.
+    :param xlsx_path: Path of the spreadsheet.
+    :param cache: The loaded cache.
+    :return: True if the cache can be used.
+    """
+    if int(cache['version']) != CACHE_VERSION:
+        return False
+    stat = os.stat(xlsx_path)
+    if int(cache['source_size']) != stat.st_size:
+        return False
+    if int(cache['source_mtime_ns']) == stat.st_mtime_ns:
+        return True
+    # Only the mtime changed (e.g. the file was copied), so the contents decide.
+    return str(cache['source_sha256']) == file_hash(xlsx_path)
+
+
+def load_cache(xlsx_path, cache_path=None):
+    """
+    Loads the cached arrays for a spreadsheet, compiling the cache first if it is missing or out of date.
+    If the spreadsheet is missing but a cache exists, the cache is used as is.
+    :param xlsx_path: Path of the spreadsheet.
+    :param cache_path: Path of the cache file. Defaults to cache_path_for(xlsx_path).
+    :return: Dictionary of the cached arrays.
+    """
+    cache_path = cache_path or cache_path_for(xlsx_path)
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as npz:
+            cache = dict(npz)
+        if not os.path.exists(xlsx_path) or cache_is_current(xlsx_path, cache):
+            return cache
+    compile_cache(xlsx_path, cache_path)
+    with np.load(cache_path, allow_pickle=False) as npz:
+        return dict(npz)
+
+
+def export_columns(xlsx_path, column_dir=None):
+    """
+    Writes every data array of the cache as a .npy file ("<key>.npy"), compiling the cache first if needed. Nothing is
+    written if the columns were already exported from the current cache.
+    :param xlsx_path: Path of the spreadsheet.
+    :param column_dir: The column directory. Defaults to column_dir_for(xlsx_path).
+    :return: The path of the column directory.
+    """
+    column_dir = column_dir or column_dir_for(xlsx_path)
+    cache = load_cache(xlsx_path)
+    source = {key: cache[key].item() for key in SOURCE_KEYS}
+    manifest_path = os.path.join(column_dir, COLUMN_MANIFEST)
+    try:
+        with open(manifest_path, encoding='utf-8') as file:
+            if json.load(file)['source'] == source:
+                return column_dir
+    except (IOError, ValueError, KeyError):
+        pass
+    os.makedirs(column_dir, exist_ok=True)
+    # int16 country codes are used by CityTable as they are, so the mapped column is not copied.
+    cache['country_codes'] = cache['country_codes'].astype(np.int16 if len(cache['countries']) < 1 << 15
+                                                           else np.int32)
+    keys = [key for key in cache if key not in SOURCE_KEYS]
+    for key in keys:
+        np.save(os.path.join(column_dir, key + '.npy'), cache[key])
+    # The manifest is written last (and atomically), so columns are never read without a matching manifest.
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump({'source': source, 'keys': keys}, file)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return column_dir
+
+
+def load_mapped_table(column_dir):
+    """
+    Opens the columns written by export_columns as read-only memory maps.
+    :param column_dir: The column directory.
+    :return: The CityTable (its lat, lng, population and country code columns are the memory maps) and the transport
+             list (a ModeRegistry whose rows are [Mode, Speed]).
+    """
+    from city_table import CityTable
+    with open(os.path.join(column_dir, COLUMN_MANIFEST), encoding='utf-8') as file:
+        keys = json.load(file)['keys']
+    columns = {key: np.load(os.path.join(column_dir, key + '.npy'), mmap_mode='r', allow_pickle=False) for key in keys}
+    return CityTable.from_cache(columns), load_modes(columns)
+
+
+def load_modes(cache):
+    """
+    Creates the mode registry from the cached speed sheet. Caches written before the formula columns were added
+    give every mode its default formula.
+    :param cache: The loaded cache.
+    :return: The ModeRegistry (its rows index like the speed sheet rows: [Mode, Speed]).
+    """
+    return ModeRegistry(cache['modes'].tolist(), cache['speeds'].tolist(),
+                        cache['mode_formulas'].tolist() if 'mode_formulas' in cache else None,
+                        cache['mode_params'].tolist() if 'mode_params' in cache else None)
+
+
+def load_dataset(xlsx_path, cache_path=None):
+    """
+    Loads the city list and transport list in the same format as the spreadsheet rows read by pandas.
+    :param xlsx_path: Path of the spreadsheet.
+    :param cache_path: Path of the cache file. Defaults to cache_path_for(xlsx_path).
+    :return: The city list [[Country, City, Lat, Lng, Population], ...] and the transport list (a ModeRegistry whose
+             rows are [Mode, Speed]).
+    """
+    cache = load_cache(xlsx_path, cache_path)
+    names = decode_names(cache['name_pool'], cache['name_offsets'])
+    countries = cache['countries'].tolist()
+    city_list = [[countries[code], name, lat, lng, population] for code, name, lat, lng, population in
+                 zip(cache['country_codes'].tolist(), names, cache['lat'].tolist(), cache['lng'].tolist(),
+                     cache['population'].tolist())]
+    return city_list, load_modes(cache)
+
+
+def load_table(xlsx_path, cache_path=None):
+    """
+    Loads the cities as a compact columnar CityTable (its rows index like the city list rows) and the transport list.
+    :param xlsx_path: Path of the spreadsheet.
+    :param cache_path: Path of the cache file. Defaults to cache_path_for(xlsx_path).
+    :return: The CityTable and the transport list (a ModeRegistry whose rows are [Mode, Speed]).
+    """
+    from city_table import CityTable
+    cache = load_cache(xlsx_path, cache_path)
+    return CityTable.from_cache(cache), load_modes(cache)
+
+
+if __name__ == '__main__':
+    # Compiles the cache for the REA.xlsx file next to this program.
+    print("Wrote " + compile_cache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx')))
@@ -0,0 +1,184 @@
+"""
+Precomputed pairwise distances between a selected set of cities, stored on disk and opened as a memory map.
+The build step writes the condensed upper triangle of the distance matrix (i < j, diagonal is 0) as a float32 .npy
+file, plus a small file of the selected city rows and coordinates so a stale matrix is never used.
+Distances are rounded to 2 decimal places before they are stored. float32 keeps at least 0.002 km of precision up to
+the longest possible distance (~20,000 km), so round(value, 2) on read gives back exactly Program.latlng_to_dist.
+
+Size: n cities need n * (n - 1) / 2 * 4 bytes, e.g. 2,000 cities = 8 MB, 5,000 = 50 MB, all 15,493 = 480 MB.
+Only the pages holding the queried pairs are read from disk, so a query never loads the whole matrix into RAM.
+
+Build: python distance_matrix.py [--top N] [--out REA_distances.npy]
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+
+from route_calc import haversine, round_2dp
+
+DEFAULT_PATH = 'REA_distances.npy'
+
+
+def cities_path(path):
+    """
+    :param path: Path of the condensed matrix file.
+    :return: Path of the file storing the selected city rows and coordinates.
+    """
+    return os.path.splitext(path)[0] + '_cities.npy'
+
+
+def condensed_size(num_cities):
+    """
+    :param num_cities: The number of cities in the matrix.
+    :return: The number of stored pairs.
+    """
+    return num_cities * (num_cities - 1) // 2
+
+
+def build_distance_matrix(lats, lngs, rows, path=DEFAULT_PATH):
+    """
+    Calculates the distance between every pair of the selected cities and writes the condensed matrix to disk.
+    The matrix is written one row of the upper triangle at a time, so memory use stays small for any size.
+    :param lats: Latitudes of every city in the city list.
+    :param lngs: Longitudes of every city in the city list.
+    :param rows: The city list rows to include, in matrix order.
+    :param path: Path of the .npy file to write.
+    :return: The number of stored pairs.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    sub_lats = np.asarray(lats, dtype=np.float64)[rows]
+    sub_lngs = np.asarray(lngs, dtype=np.float64)[rows]
+    num_cities = len(rows)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(condensed_size(num_cities),))
+    offset = 0
+    for i in range(num_cities - 1):
+        dist = round_2dp(haversine(sub_lats[i], sub_lngs[i], sub_lats[i + 1:], sub_lngs[i + 1:]))
+        matrix[offset:offset + len(dist)] = dist
+        offset += len(dist)
+    matrix.flush()
+    del matrix
+    np.save(cities_path(path), np.column_stack([rows, sub_lats, sub_lngs]))
+    return condensed_size(num_cities)
+
+
+class DistanceMatrix:
+    def __init__(self, path, num_rows):
+        """
+        Opens a condensed distance matrix as a read-only memory map.
+        :param path: Path of the .npy file written by build_distance_matrix.
+        :param num_rows: The number of rows in the city list (used to map city rows to matrix positions).
+        """
+        cities = np.load(cities_path(path))
+        self.rows = cities[:, 0].astype(np.int64)
+        self.coordinates = cities[:, 1:]
+        self.num_cities = len(self.rows)
+        # Plain ndarray view of the memory map: single element reads skip the np.memmap __getitem__ overhead.
+        self.matrix = np.load(path, mmap_mode='r').view(np.ndarray)
+        # City list row -> position in the matrix, or -1 if the city was not selected.
+        self.positions = np.full(num_rows, -1, dtype=np.int64)
+        self.positions[self.rows] = np.arange(self.num_cities)
+        self.position_list = self.positions.tolist()  # Python ints for single queries.
+
+    @classmethod
+    def open_if_valid(cls, path, lats, lngs):
+        """
+        Opens the matrix if it exists and was built from the current city coordinates.
+        :param path: Path of the .npy file.
+        :param lats: Latitudes of every city in the city list.
+        :param lngs: Longitudes of every city in the city list.
+        :return: The DistanceMatrix, or None if there is no matrix or it is out of date.
+        """
+        if not (os.path.exists(path) and os.path.exists(cities_path(path))):
+            return None
+        matrix = cls(path, len(lats))
+        if matrix.rows.max(initial=-1) >= len(lats) or not (
+                np.array_equal(matrix.coordinates[:, 0], np.asarray(lats)[matrix.rows]) and
+                np.array_equal(matrix.coordinates[:, 1], np.asarray(lngs)[matrix.rows])):
+            print("Distance matrix " + path + " is out of date and will not be used. Rebuild it.")
+            return None
+        return matrix
+
+    def forget_rows(self, rows, num_rows):
+        """
+        Stops using the stored distances of cities that were moved or removed (see city_delta.py), and makes room for
+        rows added to the city list. Those cities are calculated instead, as if they had not been selected.
+        :param rows: The city list rows of the moved or removed cities.
+        :param num_rows: The number of rows in the city list (after the update).
+        """
+        positions = np.full(num_rows, -1, dtype=np.int64)
+        positions[:len(self.positions)] = self.positions[:num_rows]
+        positions[np.asarray(list(rows), dtype=np.int64)] = -1
+        self.positions = positions
+        self.position_list = positions.tolist()
+
+    def pair_offsets(self, origin_pos, dest_pos):
+        """
+        Converts pairs of matrix positions to offsets in the condensed matrix.
+        :param origin_pos: Array of origin positions.
+        :param dest_pos: Array of destination positions (must differ from the origin positions).
+        :return: Array of offsets.
+        """
+        i = np.minimum(origin_pos, dest_pos)
+        j = np.maximum(origin_pos, dest_pos)
+        return self.num_cities * i - i * (i + 1) // 2 + (j - i - 1)
+
+    def distance(self, origin_row, dest_row):
+        """
+        Reads the distance between two cities.
+        :param origin_row: The city list row of the origin city.
+        :param dest_row: The city list row of the destination city.
+        :return: The distance in kilometres rounded to 2 decimal places, or None if either city is not in the matrix.
+        """
+        origin_pos = self.position_list[origin_row]
+        dest_pos = self.position_list[dest_row]
+        if origin_pos < 0 or dest_pos < 0:
+            return None
+        if origin_pos == dest_pos:
+            return 0.0
+        i, j = min(origin_pos, dest_pos), max(origin_pos, dest_pos)
+        return round(self.matrix.item(self.num_cities * i - i * (i + 1) // 2 + (j - i - 1)), 2)
+
+    def distances(self, origin_idx, dest_idx):
+        """
+        Reads the distances for arrays of routes. Every city must be in the matrix.
+        :param origin_idx: Array of origin city list rows.
+        :param dest_idx: Array of destination city list rows.
+        :return: Array of distances in kilometres rounded to 2 decimal places.
+        """
+        origin_pos = self.positions[np.asarray(origin_idx)]
+        dest_pos = self.positions[np.asarray(dest_idx)]
+        if (origin_pos < 0).any() or (dest_pos < 0).any():
+            raise KeyError("Route includes a city that is not in the distance matrix.")
+        same = origin_pos == dest_pos
+        offsets = self.pair_offsets(origin_pos, dest_pos)
+        offsets[same] = 0  # Any valid offset, the distance is set to 0 below.
+        dist = np.round(self.matrix[offsets].astype(np.float64), 2)
+        dist[same] = 0.0
+        return dist
+
+
+def main():
+    """
+    Builds the distance matrix for the most populous cities (or all of them) from REA.xlsx.
+    """
+    import pandas as pd
+    parser = argparse.ArgumentParser(description="Builds the memory-mapped city distance matrix.")
+    parser.add_argument('--top', type=int, default=0, help="Number of most populous cities to include (0 = all).")
+    parser.add_argument('--out', default=DEFAULT_PATH, help="Output .npy file.")
+    args = parser.parse_args()
+
+    df_geo_city = pd.read_excel(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx'), 'geo_city')
+    rows = np.argsort(-df_geo_city['Population'].values, kind='stable')
+    if args.top:
+        rows = rows[:args.top]
+
+    start = time.perf_counter()
+    pairs = build_distance_matrix(df_geo_city['Lat'].values, df_geo_city['Lng'].values, rows, args.out)
+    print("Built {:,} pairs for {:,} cities in {:.1f} s ({:.1f} MB) -> {}".format(
+        pairs, len(rows), time.perf_counter() - start, pairs * 4 / 1e6, args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Fuzzy city name matching used by Program.spell_check.
+The matcher is built once from the list of city names. For each misspelt input it works out a cheap lower bound of
+the Levenshtein distance to every name (from the length difference, the number of shared trigrams and the difference
+in character counts), then runs a banded, early-terminating Levenshtein only on the names whose lower bound could
+still beat the current best matches.
+The results are identical to computing the full Levenshtein distance against every name.
+"""
+
+from collections import Counter
+import heapq
+import numpy as np
+
+GRAM_SIZE = 3  # Trigrams.
+REMOVED_BOUND = 1 << 30  # Lower bound given to removed names, so suggest() never reaches them.
+
+
+def grams(text):
+    """
+    Splits a string into its overlapping trigrams.
+    :param text: The string.
+    :return: Counter of trigram -> number of occurrences.
+    """
+    return Counter(text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1))
+
+
+def bounded_levenshtein(source, target, max_dist):
+    """
+    Calculates the Levenshtein distance between two strings, giving up as soon as it must be larger than max_dist.
+    Only the diagonal band of width max_dist is filled in, as cells outside of it are always larger than max_dist.
+    :param source: The first string.
+    :param target: The second string.
+    :param max_dist: The largest distance of interest.
+    :return: The distance, or max_dist + 1 if the distance is larger than max_dist.
+    """
+    too_far = max_dist + 1
+    if abs(len(source) - len(target)) > max_dist:
+        return too_far
+    target_len = len(target)
+    previous = [y if y <= max_dist else too_far for y in range(target_len + 1)]
+    for x in range(1, len(source) + 1):
+        char = source[x - 1]
+        lo = max(1, x - max_dist)
+        hi = min(target_len, x + max_dist)
+        current = [too_far] * (target_len + 1)
+        current[0] = x if x <= max_dist else too_far
+        row_min = current[0]
+        for y in range(lo, hi + 1):
+            value = previous[y - 1] + (char != target[y - 1])
+            if previous[y] + 1 < value:
+                value = previous[y] + 1
+            if current[y - 1] + 1 < value:
+                value = current[y - 1] + 1
+            if value > too_far:
+                value = too_far
+            current[y] = value
+            if value < row_min:
+                row_min = value
+        if row_min >= too_far:  # Every path through this row is already too long.
+            return too_far
+        previous = current
+    return previous[target_len]
+
+
+class FuzzyMatcher:
+    def __init__(self, city_names):
+        """
+        Builds the character histograms and the trigram index from the list of city names.
+        Duplicate names are stored once, in the order they first appear, so ties are broken the same way as the
+        original argmin over the city list (the first row wins).
+        :param city_names: List of city names in city list order.
+        """
+        self.names = []  # Unique names in order of first appearance.
+        self.rows = []  # The city list row index of the first appearance of each name.
+        self.ids = {}  # Name -> its index in names.
+        for row_idx, name in enumerate(city_names):
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+                self.rows.append(row_idx)
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.int32)
+        self.removed = np.zeros(len(self.names), dtype=bool)  # Names whose cities were all removed (see remove_name).
+
+        # Character histogram of every name: one column per character that appears in any name.
+        self.alphabet = {char: col for col, char in enumerate(sorted(set("".join(self.names))))}
+        self.histograms = np.zeros((len(self.names), len(self.alphabet)), dtype=np.int16)
+        for name_id, name in enumerate(self.names):
+            for char, count in Counter(name).items():
+                self.histograms[name_id, self.alphabet[char]] = count
+
+        # Inverted index: trigram -> (ids of the names containing it, number of times it occurs in each name).
+        postings = {}
+        for name_id, name in enumerate(self.names):
+            for gram, count in grams(name).items():
+                postings.setdefault(gram, ([], []))
+                postings[gram][0].append(name_id)
+                postings[gram][1].append(count)
+        self.postings = {gram: (np.array(ids, dtype=np.int32), np.array(counts, dtype=np.int32))
+                         for gram, (ids, counts) in postings.items()}
+
+    def lower_bounds(self, query):
+        """
+        Calculates a lower bound of the Levenshtein distance between the query and every name.
+        Uses the length difference, the q-gram lemma (strings within distance k share at least
+        max(len) - q + 1 - k * q q-grams) and the bag distance (each edit changes at most one character count on
+        each side).
+        :param query: The input string.
+        :return: Array of lower bounds, one per unique name.
+        """
+        common = np.zeros(len(self.names), dtype=np.int32)
+        for gram, count in grams(query).items():
+            if gram in self.postings:
+                ids, counts = self.postings[gram]
+                common[ids] += np.minimum(counts, count)
+        max_len = np.maximum(self.lengths, len(query))
+        gram_bound = -((common - max_len + GRAM_SIZE - 1) // GRAM_SIZE)  # Ceiling division.
+
+        query_histogram = np.zeros(len(self.alphabet), dtype=np.int16)
+        unknown_chars = 0  # Characters that do not appear in any name.
+        for char, count in Counter(query).items():
+            if char in self.alphabet:
+                query_histogram[self.alphabet[char]] = count
+            else:
+                unknown_chars += count
+        diff = self.histograms - query_histogram
+        name_extra = np.maximum(diff, 0).sum(axis=1)
+        query_extra = np.maximum(-diff, 0).sum(axis=1) + unknown_chars
+        bag_bound = np.maximum(name_extra, query_extra)
+        bounds = np.maximum(np.maximum(np.abs(self.lengths - len(query)), gram_bound), bag_bound)
+        bounds[self.removed] = REMOVED_BOUND
+        return bounds
+
+    def add_names(self, row_indices, names):
+        """
+        Adds the names of new cities (see city_delta.py). The histograms and trigram postings grow once for all the new
+        names; a name that is already indexed only has its first row updated.
+        :param row_indices: The city list rows of the cities, in increasing order.
+        :param names: The city names.
+        """
+        first_id = len(self.names)
+        for row_idx, name in zip(row_indices, names):
+            name_id = self.ids.get(name)
+            if name_id is None:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+                self.rows.append(row_idx)
+            elif self.removed[name_id] or row_idx < self.rows[name_id]:
+                self.rows[name_id] = row_idx
+                self.removed[name_id] = False
+        new_names = self.names[first_id:]
+        if not new_names:
+            return
+        self.lengths = np.concatenate([self.lengths, np.array([len(name) for name in new_names], dtype=np.int32)])
+        self.removed = np.concatenate([self.removed, np.zeros(len(new_names), dtype=bool)])
+        new_chars = sorted(set("".join(new_names)) - set(self.alphabet))
+        for char in new_chars:
+            self.alphabet[char] = len(self.alphabet)
+        histograms = np.zeros((len(new_names), len(self.alphabet)), dtype=np.int16)
+        postings = {}
+        for offset, name in enumerate(new_names):
+            for char, count in Counter(name).items():
+                histograms[offset, self.alphabet[char]] = count
+            for gram, count in grams(name).items():
+                postings.setdefault(gram, ([], []))
+                postings[gram][0].append(first_id + offset)
+                postings[gram][1].append(count)
+        self.histograms = np.vstack([np.pad(self.histograms, ((0, 0), (0, len(new_chars)))), histograms])
+        for gram, (ids, counts) in postings.items():
+            old_ids, old_counts = self.postings.get(gram, (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)))
+            self.postings[gram] = (np.concatenate([old_ids, np.array(ids, dtype=np.int32)]),
+                                   np.concatenate([old_counts, np.array(counts, dtype=np.int32)]))
+
+    def remove_name(self, row_idx, name, next_row=None):
+        """
+        Removes the city at a row from the suggestions (see city_delta.py).
+        :param row_idx: The city list row of the removed city.
+        :param name: The city name.
+        :param next_row: The first remaining row with the same name, or None if there is none.
+        """
+        name_id = self.ids.get(name)
+        if name_id is None or self.rows[name_id] != row_idx:
+            return  # The name is suggested with an earlier row, which is unchanged.
+        if next_row is None:
+            self.removed[name_id] = True
+        else:
+            self.rows[name_id] = next_row
+
+    def suggest(self, query, k=5, max_distance=None):
+        """
+        Finds the k city names closest to the query.
+        :param query: The input string.
+        :param k: The number of suggestions to return.
+        :param max_distance: Optional largest Levenshtein distance of a suggestion. Fewer than k (or no) suggestions
+                             are returned when there are not enough names that close.
+        :return: List of (city name, Levenshtein distance, city list row index), closest first.
+        """
+        bounds = self.lower_bounds(query)
+        order = np.argsort(bounds, kind='stable')
+        # Max-heap of the k best matches so far, stored as (-distance, -row, name_id). Ties go to the first row, which
+        # is the first name id too until a delta removes the first row of a name.
+        best = []
+        max_dist = max(len(query), int(self.lengths.max()))
+        if max_distance is not None:
+            max_dist = min(max_dist, max_distance)
+        rows = self.rows
+        for name_id, bound in zip(order.tolist(), bounds[order].tolist()):
+            if bound > max_dist:
+                break  # No remaining name can beat the current k best.
+            dist = bounded_levenshtein(query, self.names[name_id], max_dist)
+            if dist > max_dist:
+                continue
+            if len(best) < k:
+                heapq.heappush(best, (-dist, -rows[name_id], name_id))
+            elif (dist, rows[name_id]) < (-best[0][0], -best[0][1]):
+                heapq.heapreplace(best, (-dist, -rows[name_id], name_id))
+            if len(best) == k:
+                max_dist = -best[0][0]
+        matches = sorted((-neg_dist, -neg_row, name_id) for neg_dist, neg_row, name_id in best)
+        return [(self.names[name_id], dist, row) for dist, row, name_id in matches]
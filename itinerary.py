@@ -0,0 +1,339 @@
+"""
+Multi-leg itinerary planner: finds the fastest way between two cities when a trip can combine modes of transport and
+change at hub cities (e.g. car to a hub, a flight, then rail).
+The network is hub and spoke. The HUB_COUNT most populous cities are the hubs (stations and airports): flights,
+hyperloop and high-speed rail only run between two hubs, while rail and car also run from the origin to a hub, from a
+hub to the destination and straight from the origin to the destination. Every mode has a longest leg (MAX_LEG_KM),
+except that rail and car always reach the ACCESS_HUBS nearest hubs of a city, so remote towns are connected too.
+The graph is never built in full. Its nodes are (city row, mode the city was reached by), and the legs leaving a city
+are generated the first time the city is expanded, from the hubs in range found with a SpatialIndex (they are kept in
+a bounded cache for later queries).
+A leg takes the Program.travel_time time of its mode over its distance (never less than distance / speed, which the
+hyperbolic corrections drop below for very short legs). Changing mode at a hub adds the transfer penalty.
+The search is A* with a binary heap. Two admissible heuristics are available:
+- GREAT_CIRCLE: the great-circle distance to the destination at the fastest speed,
+- HUB_BOUNDS (the default): the fastest time from a hub to the destination's hubs without transfer penalties, from a
+  hub to hub table built once with Floyd-Warshall (HUB_COUNT^2 entries), plus the fastest last leg.
+Neither can be beaten by any sequence of legs, so the first time the destination is taken off the heap the itinerary
+is the fastest one. A node is also skipped when the same city was reached by another mode at least one transfer
+penalty sooner, as every trip from it could be made from the other node at no extra cost.
+
+Usage: python itinerary.py origin destination [--transfer-minutes 30]
+"""
+
+import argparse
+import collections
+import heapq
+import os
+import numpy as np
+
+from city_table import city_columns
+from route_calc import haversine, round_2dp
+from spatial_index import SpatialIndex
+from transport_modes import ModeRegistry
+
+HUB_COUNT = 500  # Stations and airports (most populous cities first).
+# Modes (by speed sheet name) that only run between two hubs.
+HUB_MODES = ('Hyperloop', 'Airplane', 'High Speed Rail')
+# Longest leg of each mode in km, by speed sheet name. Modes that are not listed have no limit.
+MAX_LEG_KM = {'Hyperloop': 1500, 'Airplane': np.inf, 'High Speed Rail': 1000, 'Rail': 800, 'Car': 500}
+ACCESS_HUBS = 3  # Nearest hubs a city can always reach by rail or car, however far away they are.
+TRANSFER_MINUTES = 30  # Added every time the trip changes mode.
+LEG_CACHE_SIZE = 4096  # Cities whose generated legs are kept between queries.
+DIJKSTRA, GREAT_CIRCLE, HUB_BOUNDS = 'dijkstra', 'great_circle', 'hub_bounds'  # Heuristics of plan().
+
+Leg = collections.namedtuple('Leg', 'origin_row dest_row mode distance minutes')
+Itinerary = collections.namedtuple('Itinerary', 'minutes legs expansions')
+
+
+class ItineraryPlanner:
+    def __init__(self, city_list, speeds_list, transfer_minutes=TRANSFER_MINUTES, hub_count=HUB_COUNT,
+                 hub_modes=HUB_MODES, max_leg_km=None, access_hubs=ACCESS_HUBS):
+        """
+        Picks the hubs and builds the spatial index used to find the hubs in range of a city.
+        :param city_list: CityTable or list of rows from the geo_city sheet. Format: Country, City, Latitude, ...
+        :param speeds_list: The ModeRegistry (the transport list from load_table), or the speed of each mode of
+                            transport in km/h (speed sheet order) for the default formulas.
+        :param transfer_minutes: Minutes added every time the trip changes mode.
+        :param hub_count: The number of most populous cities that are hubs.
+        :param hub_modes: The names of the modes that only run between two hubs.
+        :param max_leg_km: Dictionary of mode name -> longest leg in km (missing modes have no limit). Defaults to
+                           MAX_LEG_KM.
+        :param access_hubs: The number of nearest hubs every city can reach by the other modes, whatever the
+                            distance.
+        """
+        countries, _, self.lats, self.lngs, populations = city_columns(city_list)
+        _, self.country_codes = np.unique(countries, return_inverse=True)
+        self.modes = ModeRegistry.coerce(speeds_list)
+        self.speeds = self.modes.speeds
+        self.num_modes = len(self.speeds)
+        self.transfer_minutes = transfer_minutes
+        self.access_hubs = access_hubs
+        max_leg_km = MAX_LEG_KM if max_leg_km is None else max_leg_km
+        # The constraints follow the modes by name, so they hold whatever the order of the speed sheet rows.
+        self.max_leg = np.array([max_leg_km.get(name, np.inf) for name in self.modes.names], dtype=np.float64)
+        self.hub_only = np.array([name in hub_modes for name in self.modes.names], dtype=bool)
+        # Furthest hub a leg can reach from a hub and from any other city.
+        self.hub_reach = float(self.max_leg.max(initial=0))
+        self.spoke_reach = float(self.max_leg[~self.hub_only].max(initial=0))
+        self.max_speed = float(self.speeds.max())
+
+        self.hubs = np.sort(np.argsort(-np.asarray(populations), kind='stable')[:hub_count])
+        self.is_hub = np.zeros(len(self.lats), dtype=bool)
+        self.is_hub[self.hubs] = True
+        # Nodes of the search are numbered by slot: hub i is slot i (see plan).
+        self.hub_slots = np.full(len(self.lats), -1, dtype=np.int64)
+        self.hub_slots[self.hubs] = np.arange(len(self.hubs))
+        self.hub_index = SpatialIndex(self.lats[self.hubs], self.lngs[self.hubs])
+        # Transfer penalty of each next mode, per mode the city was reached by (the last row is the trip's start).
+        self.penalties = np.full((self.num_modes + 1, self.num_modes, 1), float(transfer_minutes))
+        self.penalties[np.arange(self.num_modes), np.arange(self.num_modes)] = 0.0
+        self.penalties[self.num_modes] = 0.0
+        self.leg_cache = collections.OrderedDict()  # City row -> (slots, distances, minutes). Oldest first.
+        self.hub_times = None  # Hub to hub lower bounds, built on first use (see hub_lower_bounds).
+
+    def leg_minutes(self, origin_row, rows, distance, access=None):
+        """
+        Calculates the time of every mode for legs from one city.
+        :param origin_row: The city the legs start at.
+        :param rows: Array of the cities the legs go to.
+        :param distance: Array of the leg distances in km.
+        :param access: Optional boolean array of the legs the modes that are not hub only can make at any distance.
+        :return: Array of shape (modes, legs) of minutes, inf where a mode can't make the leg.
+        """
+        domestic = self.country_codes[rows] == self.country_codes[origin_row]
+        minutes = np.ascontiguousarray(self.modes.minutes(distance, domestic).T)
+        # The hyperbolic corrections go negative for legs of a few km. A leg never beats distance / speed.
+        minutes = np.maximum(minutes, distance / (self.speeds[:, None] / 60))
+        allowed = distance <= self.max_leg[:, None]
+        if access is not None:
+            allowed[~self.hub_only] |= access
+        if not self.is_hub[origin_row]:
+            allowed[self.hub_only] = False
+        allowed[self.hub_only] &= self.is_hub[rows]
+        return np.where(allowed, minutes, np.inf)
+
+    def legs(self, city_row):
+        """
+        Generates (or reads from the cache) the legs from a city to the hubs in range and to its nearest hubs. Legs
+        are the same in both directions.
+        :param city_row: The city row.
+        :return: Arrays of the hub slots, the distances (km) and the minutes of shape (modes, legs) (inf where a
+                 mode is not allowed).
+        """
+        cached = self.leg_cache.get(city_row)
+        if cached is not None:
+            self.leg_cache.move_to_end(city_row)
+            return cached
+        lat, lng = self.lats[city_row], self.lngs[city_row]
+        reach = self.hub_reach if self.is_hub[city_row] else self.spoke_reach
+        if np.isinf(reach):
+            rows = self.hubs
+        else:
+            rows = self.hubs[self.hub_index.within(lat, lng, reach)[0][0]]
+        nearest = self.hubs[:0]
+        if self.access_hubs:
+            nearest = self.hubs[self.hub_index.nearest(lat, lng, self.access_hubs + 1)[0][0]]
+            nearest = nearest[nearest != city_row][:self.access_hubs]
+        rows = np.union1d(rows, nearest)
+        rows = rows[rows != city_row]
+        distance = round_2dp(haversine(lat, lng, self.lats[rows], self.lngs[rows]))
+        minutes = self.leg_minutes(city_row, rows, distance, np.isin(rows, nearest))
+        keep = np.isfinite(minutes).any(axis=0)
+        cached = self.leg_cache[city_row] = (self.hub_slots[rows[keep]], distance[keep],
+                                             np.ascontiguousarray(minutes[:, keep]))
+        while len(self.leg_cache) > LEG_CACHE_SIZE:
+            self.leg_cache.popitem(last=False)
+        return cached
+
+    def isolated(self, city_row):
+        """
+        :param city_row: The city row.
+        :return: True if no leg connects the city to a hub (e.g. a remote island).
+        """
+        return not self.is_hub[city_row] and not len(self.legs(city_row)[0])
+
+    def hub_lower_bounds(self):
+        """
+        Builds (on first use) the fastest time between every pair of hubs, over any number of legs and ignoring
+        transfer penalties, with the Floyd-Warshall algorithm.
+        :return: Array of shape (hubs, hubs) of minutes (inf where a hub can't be reached).
+        """
+        if self.hub_times is None:
+            # float32 halves the time of the HUB_COUNT^3 updates.
+            times = np.full((len(self.hubs), len(self.hubs)), np.inf, dtype=np.float32)
+            np.fill_diagonal(times, 0.0)
+            for slot, hub in enumerate(self.hubs.tolist()):
+                slots, _, minutes = self.legs(hub)
+                times[slot, slots] = minutes.min(axis=0)
+            for via in range(len(self.hubs)):
+                np.minimum(times, times[:, via, None] + times[None, via, :], out=times)
+            # Lowered by far more than the float32 rounding error of a few legs, so the bounds stay below.
+            self.hub_times = times.astype(np.float64) * (1 - 1e-5)
+        return self.hub_times
+
+    def estimates(self, dest, dest_distance, last_legs, heuristic):
+        """
+        Calculates the A* estimate of the time left from every slot to the destination.
+        :param dest: The slot of the destination.
+        :param dest_distance: Array of the distance from every slot to the destination in km.
+        :param last_legs: Array of shape (modes, slots) of the minutes of the last leg into a destination that is not
+                          a hub.
+        :param heuristic: DIJKSTRA, GREAT_CIRCLE or HUB_BOUNDS.
+        :return: Array of minutes, one per slot (0 for the origin and destination slots).
+        """
+        num_hubs = len(self.hubs)
+        estimate = np.zeros(num_hubs + 2)
+        if heuristic == DIJKSTRA:
+            return estimate
+        # Rounding to 2 d.p. can shorten a leg by 0.005 km, so the estimate is lowered by 0.01 km to stay below.
+        estimate[:num_hubs] = np.maximum(dest_distance[:num_hubs] - 0.01, 0) / (self.max_speed / 60)
+        if heuristic == HUB_BOUNDS:
+            times = self.hub_lower_bounds()
+            if dest < num_hubs:
+                to_dest = times[:, dest]
+            else:
+                # Through one of the hubs the destination can be reached from, then the fastest last leg.
+                last_leg = last_legs[:, :num_hubs].min(axis=0)
+                near = np.flatnonzero(np.isfinite(last_leg))
+                to_dest = (times[:, near] + last_leg[near]).min(axis=1, initial=np.inf)
+            estimate[:num_hubs] = np.maximum(estimate[:num_hubs], to_dest)
+        return estimate
+
+    def plan(self, origin_row, dest_row, heuristic=HUB_BOUNDS):
+        """
+        Finds the fastest itinerary between two cities.
+        The search works on slots: hub i is slot i, and the origin and destination get slots len(hubs) and
+        len(hubs) + 1 if they are not hubs. Node arrays have one row per mode the slot was reached by (plus a last
+        row for the start of the trip).
+        :param origin_row: The city list row of the origin city.
+        :param dest_row: The city list row of the destination city.
+        :param heuristic: HUB_BOUNDS, GREAT_CIRCLE or DIJKSTRA (no heuristic, for comparison).
+        :return: Itinerary of the total minutes, the list of Legs and the number of nodes expanded. The minutes are
+                 inf (and the legs empty) if the destination can't be reached.
+        """
+        if origin_row == dest_row:
+            return Itinerary(0.0, [], 0)
+        num_hubs = len(self.hubs)
+        slot_rows = np.append(self.hubs, [origin_row, dest_row])
+        origin = int(self.hub_slots[origin_row]) if self.is_hub[origin_row] else num_hubs
+        dest = int(self.hub_slots[dest_row]) if self.is_hub[dest_row] else num_hubs + 1
+        dest_distance = round_2dp(haversine(self.lats[slot_rows], self.lngs[slot_rows], self.lats[dest_row],
+                                            self.lngs[dest_row]))
+        if dest_distance[origin] > self.spoke_reach and (self.isolated(origin_row) or self.isolated(dest_row)):
+            return Itinerary(np.inf, [], 0)  # Only a direct leg could connect them, and it is too long.
+
+        # Last legs into a destination that is not a hub. Hubs in range have them (legs are the same both ways),
+        # as does an origin that is not a hub if the destination is in range.
+        last_legs = np.full((self.num_modes, num_hubs + 2), np.inf)
+        if dest == num_hubs + 1:
+            slots, _, minutes = self.legs(dest_row)
+            last_legs[:, slots] = minutes
+            if origin == num_hubs and dest_distance[origin] <= self.spoke_reach:
+                last_legs[:, origin] = self.leg_minutes(origin_row, np.array([dest_row]),
+                                                        dest_distance[[origin]])[:, 0]
+        has_last_leg = np.isfinite(last_legs).any(axis=0).tolist()
+        estimate = self.estimates(dest, dest_distance, last_legs, heuristic)
+
+        start = self.num_modes  # The row of the origin, which has not been reached by any mode.
+        best = np.full((self.num_modes + 1, num_hubs + 2), np.inf)  # Fastest time found to every node.
+        best[start, origin] = 0.0
+        parent_slots = np.full(best.shape, -1, dtype=np.int64)  # The node each node was reached from.
+        parent_modes = np.full(best.shape, -1, dtype=np.int64)
+        parent_minutes = np.zeros(best.shape)  # The minutes of the leg into each node.
+        slot_row_list = slot_rows.tolist()
+        heap = [(float(estimate[origin]), 0.0, origin, start)]
+        expansions = 0
+        while heap:
+            _, elapsed, slot, mode = heapq.heappop(heap)
+            if elapsed > best[mode, slot]:
+                continue  # A faster way to this node was found after this entry was pushed.
+            if slot == dest:
+                return Itinerary(elapsed, self.trace(slot_rows, parent_slots, parent_modes, parent_minutes, slot,
+                                                     mode), expansions)
+            expansions += 1
+            slots, _, minutes = self.legs(slot_row_list[slot])
+            if has_last_leg[slot]:
+                slots = np.append(slots, dest)
+                minutes = np.concatenate([minutes, last_legs[:, slot, None]], axis=1)
+            totals = elapsed + minutes + self.penalties[mode]
+            arrival = totals + estimate[slots]
+            # Only faster ways to a node are kept, and only if they can still beat the best arrival found so far.
+            # A node is dominated if another mode reached the city at least a transfer penalty sooner.
+            reached = best.take(slots, axis=1)  # Fancy indexing would give a column-major copy.
+            improved = ((totals < reached[:start]) & (arrival < best[:, dest].min()) &
+                        (totals < reached.min(axis=0) + self.transfer_minutes))
+            next_modes, legs = np.nonzero(improved)
+            if not len(legs):
+                continue
+            next_slots = slots[legs]
+            totals = totals[next_modes, legs]
+            best[next_modes, next_slots] = totals
+            parent_slots[next_modes, next_slots] = slot
+            parent_modes[next_modes, next_slots] = mode
+            parent_minutes[next_modes, next_slots] = minutes[next_modes, legs]
+            for entry in zip(arrival[next_modes, legs].tolist(), totals.tolist(), next_slots.tolist(),
+                             next_modes.tolist()):
+                heapq.heappush(heap, entry)
+        return Itinerary(np.inf, [], expansions)
+
+    def trace(self, slot_rows, parent_slots, parent_modes, parent_minutes, slot, mode):
+        """
+        Follows the parent links from the destination back to the origin.
+        :return: List of Legs from the origin to the destination.
+        """
+        legs = []
+        while parent_slots[mode, slot] >= 0:
+            prev_slot, prev_mode = int(parent_slots[mode, slot]), int(parent_modes[mode, slot])
+            origin_row, dest_row = int(slot_rows[prev_slot]), int(slot_rows[slot])
+            distance = round_2dp(haversine(self.lats[origin_row], self.lngs[origin_row], self.lats[dest_row],
+                                           self.lngs[dest_row]))
+            legs.append(Leg(origin_row, dest_row, mode, float(distance), float(parent_minutes[mode, slot])))
+            slot, mode = prev_slot, prev_mode
+        legs.reverse()
+        return legs
+
+
+def format_minutes(minutes):
+    """
+    :param minutes: Minutes (may be fractional).
+    :return: The time in the "{}h.{}m." format of Program.travel_time (whole minutes are truncated).
+    """
+    minutes = int(minutes)
+    return "{}h.{}m.".format(minutes // 60, minutes % 60)
+
+
+def main():
+    """
+    Command line entry point: prints the fastest itinerary between two cities.
+    """
+    from city_index import CityIndex
+    from dataset_cache import load_table
+    parser = argparse.ArgumentParser(description="Plans the fastest multi-leg itinerary between two cities.")
+    parser.add_argument('origin', help="Origin city (\"City\" or \"City, Country\").")
+    parser.add_argument('destination', help="Destination city (\"City\" or \"City, Country\").")
+    parser.add_argument('--transfer-minutes', type=float, default=TRANSFER_MINUTES,
+                        help="Minutes added for every change of mode.")
+    args = parser.parse_args()
+    city_list, transport_list = load_table(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx'))
+    modes_list = transport_list.names
+    city_index = CityIndex(city_list)
+    rows = [city_index.lookup(name) for name in (args.origin, args.destination)]
+    for name, row in zip((args.origin, args.destination), rows):
+        if row is None:
+            parser.error("No entry for " + name + " in database.")
+    planner = ItineraryPlanner(city_list, transport_list, transfer_minutes=args.transfer_minutes)
+    itinerary = planner.plan(rows[0], rows[1])
+    if not itinerary.legs:
+        print("No itinerary found." if rows[0] != rows[1] else "The origin and destination are the same city.")
+        return
+    for leg in itinerary.legs:
+        print("{:<16} {} -> {} ({:.2f} km, {})".format(modes_list[leg.mode], city_list[leg.origin_row][1],
+                                                       city_list[leg.dest_row][1], leg.distance,
+                                                       format_minutes(leg.minutes)))
+    print("Total: {} including {} min. per change of mode ({} cities expanded)".format(
+        format_minutes(itinerary.minutes), args.transfer_minutes, itinerary.expansions))
+
+
+if __name__ == '__main__':
+    main()
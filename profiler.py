@@ -0,0 +1,173 @@
+"""
+Per-stage timing instrumentation for the program.
+Profiling is switched on with the --profile command line flag or the REA_PROFILE=1 environment variable. When it is
+on, the methods listed by the program are wrapped with timers and blocks of code can be timed with
+PROFILER.stage(name). At exit a summary (count, total, mean and p95 per stage) is printed to stderr.
+A cProfile dump readable by pstats is written as well if a file is given (--profile=run.pstats or
+REA_PROFILE_DUMP=run.pstats). cProfile only profiles the thread that enabled it (the main thread), so the program
+builds its data structures in the main thread instead of the background warm-up when a dump is written.
+
+When profiling is off nothing is wrapped, so the instrumented methods run exactly as written, and stage() returns a
+shared do-nothing context manager.
+Note: stages that wait for the user (e.g. city_check, spell_check and the chart windows) include that waiting time.
+"""
+
+import array
+import atexit
+import contextlib
+import functools
+import os
+import sys
+import time
+
+ENV_VAR = 'REA_PROFILE'
+DUMP_ENV_VAR = 'REA_PROFILE_DUMP'
+FLAG = '--profile'
+NULL_STAGE = contextlib.nullcontext()
+
+
+class Stage:
+    """
+    Context manager adding the elapsed time of a block to a list of timings.
+    """
+    def __init__(self, timings):
+        self.timings = timings
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timings.append(time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Creates a disabled profiler.
+        """
+        self.enabled = False
+        self.timings = {}  # Stage name -> array of durations in seconds, in first-use order.
+        self.dump_path = None
+        self.cprofile = None
+
+    def enable(self, dump_path=None):
+        """
+        Switches profiling on and registers the exit report.
+        :param dump_path: Optional file to write a cProfile dump to at exit.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self.dump_path = dump_path
+        if dump_path:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        atexit.register(self.report)
+
+    def stage_timings(self, name):
+        """
+        :param name: The stage name.
+        :return: The array of durations of the stage (created on first use).
+        """
+        timings = self.timings.get(name)
+        if timings is None:
+            timings = self.timings[name] = array.array('d')
+        return timings
+
+    def stage(self, name):
+        """
+        Times a block of code: with PROFILER.stage('name'): ...
+        :param name: The stage name.
+        :return: A context manager (a shared do-nothing one when profiling is off).
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self.stage_timings(name))
+
+    def wrap(self, func, name):
+        """
+        :param func: The function to time.
+        :param name: The stage name.
+        :return: A function that calls func and records its duration.
+        """
+        timings = self.stage_timings(name)
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.append(perf_counter() - start)
+        return timed
+
+    def instrument(self, owner, methods):
+        """
+        Wraps methods of a class (or functions of a module) with timers. Does nothing when profiling is off.
+        :param owner: The class or module.
+        :param methods: Dictionary of attribute name -> stage name.
+        """
+        if not self.enabled:
+            return
+        for attribute, name in methods.items():
+            setattr(owner, attribute, self.wrap(getattr(owner, attribute), name))
+
+    def summary(self):
+        """
+        :return: List of (stage, count, total s, mean s, p95 s) for every stage that ran.
+        """
+        rows = []
+        for name, timings in self.timings.items():
+            if not timings:
+                continue
+            ordered = sorted(timings)
+            total = sum(ordered)
+            p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+            rows.append((name, len(ordered), total, total / len(ordered), p95))
+        return rows
+
+    def report(self, file=None):
+        """
+        Prints the summary table and writes the cProfile dump (if a dump file was given).
+        :param file: The file to print to (default stderr).
+        """
+        file = file or sys.stderr
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.dump_path)
+            print("cProfile dump written to " + self.dump_path + " (read it with python -m pstats)", file=file)
+        print('{:-^78}'.format("Profile"), file=file)
+        print("{:<30}{:>8}{:>14}{:>13}{:>13}".format("Stage", "Count", "Total (ms)", "Mean (ms)", "p95 (ms)"),
+              file=file)
+        for name, count, total, mean, p95 in self.summary():
+            print("{:<30}{:>8}{:>14.3f}{:>13.4f}{:>13.4f}".format(name, count, total * 1000, mean * 1000, p95 * 1000),
+                  file=file)
+        print('{:-^78}'.format(""), file=file)
+
+    def configure(self, argv=None, environ=None):
+        """
+        Enables profiling if the --profile flag (removed from argv) or the REA_PROFILE variable is set.
+        :param argv: The command line arguments (default sys.argv).
+        :param environ: The environment variables (default os.environ).
+        :return: True if profiling is on.
+        """
+        argv = sys.argv if argv is None else argv
+        environ = os.environ if environ is None else environ
+        dump_path = environ.get(DUMP_ENV_VAR) or None
+        enabled = environ.get(ENV_VAR, '').strip().lower() not in ('', '0', 'false', 'no')
+        for arg in list(argv[1:]):
+            if arg == FLAG or arg.startswith(FLAG + '='):
+                enabled = True
+                dump_path = arg.partition('=')[2] or dump_path
+                argv.remove(arg)
+        if enabled or dump_path:
+            self.enable(dump_path)
+        return self.enabled
+
+
+PROFILER = Profiler()
@@ -0,0 +1,346 @@
+"""
+Region-sharded copy of the city data, so a process that only routes within one region doesn't load every city.
+The cities of the compiled cache (REA_cache.npz) are split by region (REGION_COUNTRIES) into shards in the
+REA_shards directory next to the spreadsheet. Every shard column is a plain .npy file ("<region>_<column>.npy"), so a
+shard is memory-mapped rather than read:
+- rows: the int32 row of every city in the full city list (the shards keep the spreadsheet order within a region),
+- lat, lng (float64), population (int64), country_codes (int16 codes into the manifest's country table),
+- name_pool, name_offsets: the city names as one UTF-8 byte pool with offsets (see dataset_cache.encode_names).
+manifest.json holds the source spreadsheet fingerprint (checked like the cache's, see dataset_cache.cache_is_current),
+the country table, the modes of transport and per region its file prefix, countries, number of cities and bounding
+cap (the centre and chord radius on the unit sphere that cover every city in the region). names_hash.npy and
+names_region.npy map the CRC-32 of every normalised city name to its region, so a name outside the loaded regions
+tells which shard to page in without loading any shard.
+
+RegionShards.load() returns a ShardedCityTable of the regions loaded so far: a CityTable over the loaded cities in load
+order, so the rows of earlier regions keep their row numbers when more regions are paged in.
+
+Usage: python region_shards.py [--region Oceania]  (builds the shards and prints the regions)
+"""
+
+import argparse
+import json
+import os
+import zlib
+import numpy as np
+
+from city_index import normalise_name
+from city_table import CityTable
+from dataset_cache import CACHE_VERSION, cache_is_current, decode_names, encode_names, load_cache
+from spatial_index import km_to_chord, unit_vectors
+from transport_modes import ModeRegistry
+
+SHARD_VERSION = 1
+MANIFEST = 'manifest.json'
+SHARD_COLUMNS = ('rows', 'lat', 'lng', 'population', 'country_codes', 'name_pool', 'name_offsets')
+OTHER_REGION = 'Other'  # Region of the countries missing from REGION_COUNTRIES.
+CAP_SLACK_KM = 0.01  # Distances are rounded to 2 decimal places, so regions_near() allows for the rounding.
+# Region -> countries (spelled as in the geo_city sheet).
+REGION_COUNTRIES = {
+    'Africa': (
+        'Algeria', 'Angola', 'Benin', 'Botswana', 'Burkina Faso', 'Burundi', 'Cabo Verde', 'Cameroon',
+        'Central African Republic', 'Chad', 'Comoros', 'Congo (Brazzaville)', 'Congo (Kinshasa)',
+        'CÃ´te Dâ€™Ivoire', 'Djibouti', 'Egypt', 'Equatorial Guinea', 'Eritrea', 'Ethiopia',
+        'Gabon', 'Gambia, The', 'Ghana', 'Guinea', 'Guinea-Bissau', 'Kenya', 'Lesotho', 'Liberia', 'Libya',
+        'Madagascar', 'Malawi', 'Mali', 'Mauritania', 'Mauritius', 'Mayotte', 'Morocco', 'Mozambique', 'Namibia',
+        'Niger', 'Nigeria', 'Reunion', 'Rwanda', 'Saint Helena, Ascension, And Tristan Da Cunha',
+        'Sao Tome And Principe', 'Senegal', 'Seychelles', 'Sierra Leone', 'Somalia', 'South Africa', 'South Sudan',
+        'Sudan', 'Swaziland', 'Tanzania', 'Togo', 'Tunisia', 'Uganda', 'Zambia', 'Zimbabwe'),
+    'Asia': (
+        'Afghanistan', 'Armenia', 'Azerbaijan', 'Bahrain', 'Bangladesh', 'Bhutan', 'Brunei', 'Burma', 'Cambodia',
+        'China', 'Georgia', 'Hong Kong', 'India', 'Indonesia', 'Iran', 'Iraq', 'Israel', 'Japan', 'Jordan',
+        'Kazakhstan', 'Korea, North', 'Korea, South', 'Kuwait', 'Kyrgyzstan', 'Laos', 'Lebanon', 'Macau', 'Malaysia',
+        'Maldives', 'Mongolia', 'Nepal', 'Oman', 'Pakistan', 'Philippines', 'Qatar', 'Saudi Arabia', 'Singapore',
+        'Sri Lanka', 'Syria', 'Taiwan', 'Tajikistan', 'Thailand', 'Timor-Leste', 'Turkey', 'Turkmenistan',
+        'United Arab Emirates', 'Uzbekistan', 'Vietnam', 'West Bank', 'Yemen'),
+    'Europe': (
+        'Albania', 'Andorra', 'Austria', 'Belarus', 'Belgium', 'Bosnia And Herzegovina', 'Bulgaria', 'Croatia',
+        'Cyprus', 'Czechia', 'Denmark', 'Estonia', 'Faroe Islands', 'Finland', 'France', 'Germany', 'Gibraltar',
+        'Greece', 'Hungary', 'Iceland', 'Ireland', 'Isle Of Man', 'Italy', 'Kosovo', 'Latvia', 'Liechtenstein',
+        'Lithuania', 'Luxembourg', 'Macedonia', 'Malta', 'Moldova', 'Monaco', 'Montenegro', 'Netherlands', 'Norway',
+        'Poland', 'Portugal', 'Romania', 'Russia', 'San Marino', 'Serbia', 'Slovakia', 'Slovenia', 'Spain', 'Sweden',
+        'Switzerland', 'Ukraine', 'United Kingdom'),
+    'North America': (
+        'Antigua And Barbuda', 'Aruba', 'Bahamas, The', 'Barbados', 'Belize', 'Bermuda', 'Canada', 'Cayman Islands',
+        'Costa Rica', 'Cuba', 'CuraÃ§ao', 'Dominica', 'Dominican Republic', 'El Salvador', 'Greenland',
+        'Grenada', 'Guadeloupe', 'Guatemala', 'Haiti', 'Honduras', 'Jamaica', 'Martinique', 'Mexico', 'Nicaragua',
+        'Panama', 'Puerto Rico', 'Saint Kitts And Nevis', 'Saint Lucia', 'Saint Vincent And The Grenadines',
+        'Sint Maarten', 'Trinidad And Tobago', 'Turks And Caicos Islands', 'United States'),
+    'Oceania': (
+        'American Samoa', 'Australia', 'Cook Islands', 'Fiji', 'French Polynesia', 'Guam', 'Kiribati',
+        'Marshall Islands', 'Micronesia, Federated States Of', 'New Caledonia', 'New Zealand',
+        'Northern Mariana Islands', 'Palau', 'Papua New Guinea', 'Samoa', 'Solomon Islands', 'Tonga', 'Tuvalu',
+        'Vanuatu', 'Wallis And Futuna'),
+    'South America': (
+        'Argentina', 'Bolivia', 'Brazil', 'Chile', 'Colombia', 'Ecuador', 'Falkland Islands (Islas Malvinas)',
+        'French Guiana', 'Guyana', 'Paraguay', 'Peru', 'South Georgia And South Sandwich Islands', 'Suriname',
+        'Uruguay', 'Venezuela'),
+}
+
+
+def shard_dir_for(xlsx_path):
+    """
+    :param xlsx_path: Path of the spreadsheet.
+    :return: Path of its shard directory (next to the spreadsheet).
+    """
+    return os.path.splitext(xlsx_path)[0] + '_shards'
+
+
+def name_hash(name):
+    """
+    :param name: A city name.
+    :return: The CRC-32 of the normalised name (the key of the manifest name table).
+    """
+    return zlib.crc32(normalise_name(name).encode('utf-8'))
+
+
+def region_of(country):
+    """
+    :param country: A country name.
+    :return: The region of the country (OTHER_REGION if it is not in REGION_COUNTRIES).
+    """
+    for region, countries in REGION_COUNTRIES.items():
+        if country in countries:
+            return region
+    return OTHER_REGION
+
+
+def build_shards(xlsx_path, shard_dir=None):
+    """
+    Splits the cities of the compiled cache into region shards and writes the manifest.
+    :param xlsx_path: Path of the spreadsheet.
+    :param shard_dir: The shard directory. Defaults to shard_dir_for(xlsx_path).
+    :return: The path of the shard directory.
+    """
+    shard_dir = shard_dir or shard_dir_for(xlsx_path)
+    os.makedirs(shard_dir, exist_ok=True)
+    cache = load_cache(xlsx_path)
+    countries = cache['countries'].tolist()
+    names = decode_names(cache['name_pool'], cache['name_offsets'])
+    country_regions = [region_of(country) for country in countries]
+    regions = [region for region in list(REGION_COUNTRIES) + [OTHER_REGION] if region in country_regions]
+    city_regions = np.array([regions.index(region) for region in country_regions],
+                            dtype=np.uint8)[cache['country_codes']]
+    points = unit_vectors(cache['lat'], cache['lng'])
+
+    manifest_regions = {}
+    for code, region in enumerate(regions):
+        rows = np.flatnonzero(city_regions == code)
+        prefix = region.lower().replace(' ', '_')
+        name_pool, name_offsets = encode_names([names[row] for row in rows.tolist()])
+        columns = {'rows': rows.astype(np.int32), 'lat': cache['lat'][rows], 'lng': cache['lng'][rows],
+                   'population': cache['population'][rows],
+                   'country_codes': cache['country_codes'][rows].astype(np.int16),
+                   'name_pool': name_pool, 'name_offsets': name_offsets}
+        for column in SHARD_COLUMNS:
+            np.save(os.path.join(shard_dir, '{}_{}.npy'.format(prefix, column)), columns[column])
+        centre = points[rows].sum(axis=0)
+        centre /= np.linalg.norm(centre)
+        manifest_regions[region] = {
+            'prefix': prefix, 'cities': len(rows), 'centre': centre.tolist(),
+            'radius': float(np.linalg.norm(points[rows] - centre, axis=1).max()),
+            'countries': sorted({countries[code] for code in cache['country_codes'][rows].tolist()})}
+
+    hashes = np.array([name_hash(name) for name in names], dtype=np.uint32)
+    order = np.argsort(hashes, kind='stable')
+    np.save(os.path.join(shard_dir, 'names_hash.npy'), hashes[order])
+    np.save(os.path.join(shard_dir, 'names_region.npy'), city_regions[order])
+    manifest = {
+        'shard_version': SHARD_VERSION,
+        'source': {key: cache[key].item() for key in ('version', 'source_size', 'source_mtime_ns', 'source_sha256')},
+        'cities': len(names),
+        'countries': countries,
+        'modes': {'names': cache['modes'].tolist(), 'speeds': cache['speeds'].tolist(),
+                  'formulas': cache['mode_formulas'].tolist() if 'mode_formulas' in cache else None,
+                  'params': cache['mode_params'].tolist() if 'mode_params' in cache else None},
+        'regions': manifest_regions,
+    }
+    # The manifest is written last (and atomically), so shards are never read without a matching manifest.
+    tmp_path = os.path.join(shard_dir, MANIFEST + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, os.path.join(shard_dir, MANIFEST))
+    return shard_dir
+
+
+def read_manifest(shard_dir):
+    """
+    :param shard_dir: The shard directory.
+    :return: The manifest, or None if there is none or it was written by a different version of the program.
+    """
+    try:
+        with open(os.path.join(shard_dir, MANIFEST), encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (IOError, ValueError):
+        return None
+    if manifest.get('shard_version') != SHARD_VERSION or manifest['source']['version'] != CACHE_VERSION:
+        return None
+    return manifest
+
+
+class ShardedCityTable(CityTable):
+    def __init__(self, names, countries, country_codes, lats, lngs, populations, global_rows, regions):
+        """
+        A CityTable over the cities of the loaded regions.
+        :param global_rows: The row of every city in the full city list.
+        :param regions: The loaded regions, in load order.
+        (The other parameters are those of CityTable.)
+        """
+        super().__init__(names, countries, country_codes, lats, lngs, populations)
+        self.global_rows = global_rows
+        self.regions = list(regions)
+
+
+class RegionShards:
+    def __init__(self, shard_dir):
+        """
+        Opens the shard directory. No shard is loaded until load() is called.
+        :param shard_dir: The shard directory (see build_shards).
+        :raises IOError: If there is no current manifest in the directory.
+        """
+        self.shard_dir = shard_dir
+        self.manifest = read_manifest(shard_dir)
+        if self.manifest is None:
+            raise IOError("No region shards in " + shard_dir + ". Run region_shards.py to build them.")
+        self.regions = list(self.manifest['regions'])
+        self.countries = self.manifest['countries']
+        self.name_hashes = np.load(os.path.join(shard_dir, 'names_hash.npy'), mmap_mode='r')
+        self.name_regions = np.load(os.path.join(shard_dir, 'names_region.npy'), mmap_mode='r')
+        self.loaded = {}  # Region -> dictionary of its (memory-mapped) columns, in load order.
+        self.table = None
+
+    @classmethod
+    def open(cls, xlsx_path, shard_dir=None):
+        """
+        Opens the shards of a spreadsheet, building them first if they are missing or out of date.
+        If the spreadsheet is missing but shards exist, they are used as is.
+        :param xlsx_path: Path of the spreadsheet.
+        :param shard_dir: The shard directory. Defaults to shard_dir_for(xlsx_path).
+        :return: The RegionShards.
+        """
+        shard_dir = shard_dir or shard_dir_for(xlsx_path)
+        manifest = read_manifest(shard_dir)
+        if manifest is None or (os.path.exists(xlsx_path) and not cache_is_current(xlsx_path, manifest['source'])):
+            build_shards(xlsx_path, shard_dir)
+        return cls(shard_dir)
+
+    def modes(self):
+        """
+        :return: The ModeRegistry of the modes of transport stored in the manifest.
+        """
+        modes = self.manifest['modes']
+        return ModeRegistry(modes['names'], modes['speeds'], modes['formulas'], modes['params'])
+
+    def resolve(self, names):
+        """
+        Finds the regions to pin a process to.
+        :param names: Region or country names (case insensitive).
+        :return: List of region names.
+        :raises ValueError: If a name is neither a region nor a country.
+        """
+        by_name = {normalise_name(region): region for region in self.regions}
+        for region in self.regions:
+            for country in self.manifest['regions'][region]['countries']:
+                by_name.setdefault(normalise_name(country), region)
+        regions = []
+        for name in names:
+            region = by_name.get(normalise_name(name))
+            if region is None:
+                raise ValueError("Unknown region " + str(name).strip() + ". Choose a country or one of: " +
+                                 ", ".join(self.regions) + ".")
+            if region not in regions:
+                regions.append(region)
+        return regions
+
+    def unloaded(self):
+        """
+        :return: List of the regions that are not loaded yet.
+        """
+        return [region for region in self.regions if region not in self.loaded]
+
+    def load(self, regions):
+        """
+        Pages in the shards of more regions.
+        :param regions: Region names. Regions already loaded are skipped.
+        :return: The ShardedCityTable of every region loaded so far.
+        """
+        for region in regions:
+            if region not in self.loaded:
+                prefix = os.path.join(self.shard_dir, self.manifest['regions'][region]['prefix'])
+                self.loaded[region] = {column: np.load('{}_{}.npy'.format(prefix, column), mmap_mode='r')
+                                       for column in SHARD_COLUMNS}
+        if self.table is None or self.table.regions != list(self.loaded):
+            shards = list(self.loaded.values())
+            if len(shards) == 1:  # A single shard is used straight from the memory maps.
+                columns = shards[0]
+            else:
+                columns = {column: np.concatenate([shard[column] for shard in shards])
+                           for column in SHARD_COLUMNS if column not in ('name_pool', 'name_offsets')}
+            names = [name for shard in shards for name in decode_names(shard['name_pool'], shard['name_offsets'])]
+            self.table = ShardedCityTable(names, self.countries, columns['country_codes'], columns['lat'],
+                                          columns['lng'], columns['population'], columns['rows'], self.loaded)
+        return self.table
+
+    def regions_for_name(self, query):
+        """
+        Finds the unloaded regions that have a city with the name of a query (CRC-32 collisions can add a region).
+        :param query: "City" or "City, Country".
+        :return: List of region names.
+        """
+        name = normalise_name(query)
+        parts = name.split(",")
+        # Country names can contain commas themselves, so the city part of every split point is tried.
+        candidates = [name] + [",".join(parts[:split]).strip() for split in range(1, len(parts))]
+        hashes = np.array([name_hash(candidate) for candidate in candidates], dtype=np.uint32)
+        starts = np.searchsorted(self.name_hashes, hashes, side='left')
+        ends = np.searchsorted(self.name_hashes, hashes, side='right')
+        codes = {code for start, end in zip(starts.tolist(), ends.tolist())
+                 for code in self.name_regions[start:end].tolist()}
+        return [region for region in self.unloaded() if self.regions.index(region) in codes]
+
+    def regions_near(self, lat, lng, km):
+        """
+        Finds the unloaded regions that could have a city within a distance of a point.
+        :param lat: Latitude in degrees.
+        :param lng: Longitude in degrees.
+        :param km: The distance in km.
+        :return: List of region names.
+        """
+        point = unit_vectors([lat], [lng])[0]
+        reach = km_to_chord(km + CAP_SLACK_KM)
+        regions = []
+        for region in self.unloaded():
+            info = self.manifest['regions'][region]
+            # Chord lengths obey the triangle inequality, so this is a lower bound of the chord to any city.
+            if np.linalg.norm(point - np.array(info['centre'])) - info['radius'] <= reach:
+                regions.append(region)
+        return regions
+
+
+def main():
+    """
+    Command line entry point: builds the shards and prints the regions (or times loading some of them).
+    """
+    import time
+    parser = argparse.ArgumentParser(description="Builds the region shards of the city data.")
+    parser.add_argument('--region', action='append', default=[],
+                        help="Region or country to load (repeatable); prints the load time.")
+    args = parser.parse_args()
+    xlsx_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx')
+    shards = RegionShards(build_shards(xlsx_path))
+    for region in shards.regions:
+        info = shards.manifest['regions'][region]
+        print("{:<16}{:>8,} cities {:>5} countries".format(region, info['cities'], len(info['countries'])))
+    if args.region:
+        try:
+            regions = shards.resolve(args.region)
+        except ValueError as error:
+            parser.error(error.args[0])
+        start = time.perf_counter()
+        table = shards.load(regions)
+        print("Loaded {} ({:,} cities) in {:.1f} ms".format(", ".join(regions), len(table),
+                                                           (time.perf_counter() - start) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Bounded least-recently-used cache of route results (distance plus the travel time of every mode of transport).
+Routes are keyed on the city list rows of the two cities. The distance is symmetric and the flight padding only
+depends on whether both cities are in the same country, so A -> B and B -> A share one entry.
+The cache can be saved to and loaded from a .npz file between runs. The file stores a fingerprint of the dataset, so
+results calculated from different city or speed data are never loaded.
+"""
+
+import collections
+import hashlib
+import os
+import numpy as np
+
+DEFAULT_MAX_SIZE = 100000
+
+
+def dataset_fingerprint(city_list, speeds_list):
+    """
+    :param city_list: The city list (a CityTable is hashed from its arrays, which is much faster).
+    :param speeds_list: The speed of each mode of transport, or the ModeRegistry (hashed with its formulas).
+    :return: A hex digest that changes whenever the cities, the speeds or the travel time formulas change.
+    """
+    cities = city_list.digest() if hasattr(city_list, 'digest') else city_list
+    modes = speeds_list.spec() if hasattr(speeds_list, 'spec') else list(speeds_list)
+    return hashlib.sha256(repr((cities, modes)).encode('utf-8')).hexdigest()
+
+
+class RouteCache:
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, fingerprint=""):
+        """
+        Creates an empty cache.
+        :param max_size: The largest number of routes kept. The least recently used route is evicted first.
+        :param fingerprint: The dataset fingerprint (see dataset_fingerprint) stored with saved caches.
+        """
+        self.max_size = max_size
+        self.fingerprint = fingerprint
+        self.entries = collections.OrderedDict()  # (row, row) -> (distance, (minutes per mode)). Oldest first.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(origin_row, dest_row):
+        """
+        :return: The cache key of a route. Both directions of a route have the same key.
+        """
+        return (origin_row, dest_row) if origin_row <= dest_row else (dest_row, origin_row)
+
+    def get(self, origin_row, dest_row):
+        """
+        Looks up a route and marks it as recently used.
+        :param origin_row: The city list row of the origin city.
+        :param dest_row: The city list row of the destination city.
+        :return: (distance, (minutes per mode)), or None if the route is not cached.
+        """
+        key = self.key(origin_row, dest_row)
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, origin_row, dest_row, distance, minutes):
+        """
+        Stores a route, evicting the least recently used route if the cache is full.
+        :param origin_row: The city list row of the origin city.
+        :param dest_row: The city list row of the destination city.
+        :param distance: The distance in kilometres.
+        :param minutes: The whole minutes of every mode of transport.
+        """
+        key = self.key(origin_row, dest_row)
+        self.entries[key] = (distance, tuple(minutes))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard_rows(self, rows):
+        """
+        Removes every cached route that starts or ends at one of the given rows.
+        :param rows: Iterable of city list rows.
+        :return: The number of routes removed.
+        """
+        rows = set(rows)
+        stale = [key for key in self.entries if key[0] in rows or key[1] in rows]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def stats(self):
+        """
+        :return: Dictionary of the cache counters: size, max_size, hits, misses, evictions and hit_rate.
+        """
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def save(self, path):
+        """
+        Writes the cached routes (in least to most recently used order) to a .npz file.
+        :param path: The file to write.
+        """
+        keys = np.array(list(self.entries.keys()), dtype=np.int64).reshape(-1, 2)
+        values = list(self.entries.values())
+        distances = np.array([value[0] for value in values], dtype=np.float64)
+        width = len(values[0][1]) if values else 0
+        minutes = np.array([value[1] for value in values], dtype=np.int64).reshape(len(values), width)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, fingerprint=np.array(self.fingerprint), keys=keys, distances=distances, minutes=minutes)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        Adds the routes saved in a .npz file, if the file exists and was saved with the same dataset fingerprint.
+        :param path: The file to read.
+        :return: The number of routes loaded.
+        """
+        if not os.path.exists(path):
+            return 0
+        with np.load(path, allow_pickle=False) as saved:
+            if str(saved['fingerprint']) != self.fingerprint:
+                return 0
+            keys, distances, minutes = saved['keys'].tolist(), saved['distances'].tolist(), saved['minutes'].tolist()
+        for (origin_row, dest_row), distance, route_minutes in zip(keys[-self.max_size:], distances[-self.max_size:],
+                                                                   minutes[-self.max_size:]):
+            self.put(origin_row, dest_row, distance, route_minutes)
+        return len(keys[-self.max_size:])
@@ -0,0 +1,115 @@
+"""
+Vectorised distance and travel time calculations for many routes at once.
+Routes are given as arrays of origin and destination row indices into the city list. The formulas are the same as
+Program.latlng_to_dist and Program.travel_time, evaluated with NumPy over whole arrays (no printing and no per-route
+Python objects), so the results match the scalar path exactly. The travel time formulas come from the ModeRegistry
+(transport_modes).
+"""
+
+import numpy as np
+
+from city_table import CityTable, city_columns
+from transport_modes import ModeRegistry
+
+RADIUS_OF_EARTH = 6371  # Kilometres.
+
+
+def haversine(origin_lat, origin_lng, dest_lat, dest_lng):
+    """
+    Calculates the great-circle distance between arrays of latitude and longitude points using the Haversine formula.
+    :param origin_lat: Origin latitudes in degrees.
+    :param origin_lng: Origin longitudes in degrees.
+    :param dest_lat: Destination latitudes in degrees.
+    :param dest_lng: Destination longitudes in degrees.
+    :return: Array of distances in kilometres (not rounded).
+    """
+    int_lat1 = np.radians(origin_lat)
+    int_lat2 = np.radians(dest_lat)
+    lat_diff = int_lat1 - int_lat2
+    lng_diff = np.radians(np.subtract(origin_lng, dest_lng))
+    a = np.sin(lat_diff / 2.0) ** 2 + np.cos(int_lat1) * np.cos(int_lat2) * np.sin(lng_diff / 2.0) ** 2
+    return 2 * RADIUS_OF_EARTH * np.arcsin(np.sqrt(a))
+
+
+def round_2dp(values):
+    """
+    Rounds an array to 2 decimal places exactly like Python's round(value, 2).
+    np.round scales by 100 first, which can land on the other side of .5 for a handful of values. Those values are
+    found and rounded again with Python's round().
+    :param values: Array of floats.
+    :return: Array of rounded floats.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for idx in near_half.tolist():
+        rounded.flat[idx] = round(float(values.flat[idx]), 2)
+    return rounded
+
+
+def mode_minutes(distance, speeds, domestic):
+    """
+    Calculates the travel time (in fractional minutes) for every mode of transport with the compiled ModeRegistry
+    kernels.
+    :param distance: Array of distances in kilometres.
+    :param speeds: The ModeRegistry, or the speed of each mode of transport in km/h (speed sheet order) for the
+                   default formulas of Program.travel_time.
+    :param domestic: Boolean array, True where the origin and destination are in the same country.
+    :return: Array of shape (routes, modes) of travel times in minutes (not truncated).
+    """
+    return ModeRegistry.coerce(speeds).minutes(distance, domestic)
+
+
+class BatchRouter:
+    def __init__(self, city_list, speeds_list):
+        """
+        Stores the city coordinates and countries as arrays for vectorised calculations.
+        :param city_list: CityTable or list of rows from the geo_city sheet. Format: Country, City, Latitude, ...
+        :param speeds_list: The ModeRegistry (the transport list from load_table), or the speed of each mode of
+                            transport in km/h (speed sheet order) for the default formulas.
+        """
+        # Countries are stored as integer codes so domestic flights can be found with one comparison. A CityTable
+        # already has them, so its columns are used as they are (memory maps in batch_writer.py workers).
+        if isinstance(city_list, CityTable):
+            self.lats, self.lngs = city_list.lats, city_list.lngs
+            self.countries, self.country_codes = city_list.countries, city_list.country_codes
+        else:
+            countries, _, self.lats, self.lngs, _ = city_columns(city_list)
+            self.countries, self.country_codes = np.unique(countries, return_inverse=True)
+        self.modes = ModeRegistry.coerce(speeds_list)
+        self.speeds = self.modes.speeds
+
+    def distances(self, origin_idx, dest_idx):
+        """
+        Calculates the distance for every route, rounded to 2 decimal places like Program.latlng_to_dist.
+        :param origin_idx: Array of origin row indices.
+        :param dest_idx: Array of destination row indices.
+        :return: Array of distances in kilometres.
+        """
+        return round_2dp(haversine(self.lats[origin_idx], self.lngs[origin_idx],
+                                   self.lats[dest_idx], self.lngs[dest_idx]))
+
+    def travel_times(self, origin_idx, dest_idx):
+        """
+        Calculates the distance and the travel time of every mode of transport for every route.
+        :param origin_idx: Array of origin row indices.
+        :param dest_idx: Array of destination row indices.
+        :return: The distances (km) and an int64 array of shape (routes, modes) with whole minutes per mode.
+                 Whole minutes are truncated the same way as Program.travel_time (hours * 60 + minutes).
+        """
+        origin_idx = np.asarray(origin_idx)
+        dest_idx = np.asarray(dest_idx)
+        distance = self.distances(origin_idx, dest_idx)
+        domestic = self.country_codes[origin_idx] == self.country_codes[dest_idx]
+        minutes = np.trunc(self.modes.minutes(distance, domestic)).astype(np.int64)
+        return distance, minutes
+
+    def fastest_modes(self, minutes):
+        """
+        Finds the recommended (fastest) mode of transport for every route. Ties go to the first mode, like
+        travel_times.index(min(travel_times)) in Program.write_to_file.
+        :param minutes: Array of shape (routes, modes) from travel_times().
+        :return: Array of mode indices.
+        """
+        return np.argmin(minutes, axis=1)
@@ -0,0 +1,363 @@
+"""
+Long-running local HTTP/JSON routing service. The city table and its indices are loaded once (from the compiled
+dataset cache) and kept in memory, so other programs can query travel times without the interactive menu.
+
+Endpoints (all responses are JSON):
+- GET /route?origin=Sydney&destination=Melbourne
+      Distance, travel time per mode and the recommended mode. Names are "City" or "City, Country".
+      Unknown names get a 404 with the closest city names.
+- POST /matrix  {"origins": [...], "destinations": [...]}
+      Every origin to every destination (at most MAX_MATRIX_ROUTES routes), calculated in tiles by TravelMatrix.
+- GET /isochrone?origin=Sydney&hours=3&mode=Rail
+      Every city reachable from the origin within the time limit by one mode, quickest first.
+- GET /search?q=Sydnei&k=5
+      The closest city names (Levenshtein distance).
+- GET /complete?q=Melb&k=5
+      The most populous cities whose names start with q ("City, Country" also filters on the country).
+- GET /health, GET /stats
+
+Single routes from concurrent requests are not calculated one at a time: RouteBatcher queues them and calculates
+every route queued during one pass of the event loop with one BatchRouter call. Matrices are calculated on a thread
+of the default executor, so a large matrix does not hold up the other requests. An unexpected error in an endpoint is
+reported to the client as a 500 response.
+HTTP/1.1 keep-alive is supported. The server only implements what these endpoints need (no chunked bodies, TLS, ...).
+
+Usage: python service.py [--host 127.0.0.1] [--port 8080]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+
+from city_index import CityIndex
+from fuzzy_match import FuzzyMatcher
+from autocomplete import PrefixIndex
+from city_table import city_columns
+from route_calc import BatchRouter
+from travel_matrix import TravelMatrix
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+MAX_MATRIX_ROUTES = 250000  # Largest origins x destinations matrix per request.
+MAX_ISOCHRONE_HOURS = 48  # Longest time limit of an isochrone (every city is reachable well before this).
+MAX_BODY_SIZE = 1 << 20
+MAX_SUGGESTIONS = 50
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """
+    An error reported to the client as a JSON response with the given status code.
+    """
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.body = dict(error=message, **details)
+
+
+class RouteBatcher:
+    def __init__(self, router):
+        """
+        Collects single route calculations into vectorised batches.
+        :param router: The BatchRouter used for the calculations.
+        """
+        self.router = router
+        self.queue = []  # (origin row, destination row, future) waiting for the next flush.
+        self.batches = 0
+        self.routes = 0
+
+    def travel_times(self, origin_row, dest_row):
+        """
+        Queues a route. Every route queued before the event loop gets back to its callbacks is calculated together.
+        :param origin_row: The city list row of the origin city.
+        :param dest_row: The city list row of the destination city.
+        :return: A future of (distance, [whole minutes per mode]).
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self.queue:
+            loop.call_soon(self.flush)
+        self.queue.append((origin_row, dest_row, future))
+        return future
+
+    def flush(self):
+        """
+        Calculates every queued route with one BatchRouter call and sets the results of their futures. If the
+        calculation fails, every future gets the exception, so no request waits forever.
+        """
+        queue, self.queue = self.queue, []
+        try:
+            origin_idx = np.array([item[0] for item in queue], dtype=np.int64)
+            dest_idx = np.array([item[1] for item in queue], dtype=np.int64)
+            distance, minutes = self.router.travel_times(origin_idx, dest_idx)
+        except Exception as error:
+            for item in queue:
+                if not item[2].cancelled():
+                    item[2].set_exception(error)
+            return
+        for item, dist, times in zip(queue, distance.tolist(), minutes.tolist()):
+            if not item[2].cancelled():
+                item[2].set_result((dist, times))
+        self.batches += 1
+        self.routes += len(queue)
+
+
+class RoutingService:
+    def __init__(self, city_list, modes_list, speeds_list):
+        """
+        Builds the in-memory lookup structures.
+        :param city_list: CityTable or list of rows from the geo_city sheet. Format: Country, City, Latitude, ...
+        :param modes_list: The names of the modes of transport.
+        :param speeds_list: The ModeRegistry (the transport list from load_table), or the speed of each mode of
+                            transport in km/h for the default formulas.
+        """
+        self.city_list = city_list
+        self.modes_list = list(modes_list)
+        self.city_index = CityIndex(city_list)
+        self.fuzzy_matcher = FuzzyMatcher(city_columns(city_list)[1])
+        self.prefix_index = PrefixIndex(city_list)
+        self.router = BatchRouter(city_list, speeds_list)
+        self.batcher = RouteBatcher(self.router)
+        self.travel_matrix = TravelMatrix(self.router)
+        self.requests = 0
+
+    def city_json(self, row_idx):
+        """
+        :param row_idx: A city list row.
+        :return: Dictionary describing the city.
+        """
+        city = self.city_list[row_idx]
+        return {'city': city[1], 'country': city[0], 'lat': city[2], 'lng': city[3], 'row': row_idx}
+
+    def resolve(self, name, field):
+        """
+        Finds the row index of a city name.
+        :param name: The city name ("City" or "City, Country").
+        :param field: The name of the request field (used in the error message).
+        :return: The row index.
+        :raises RequestError: 404 with the closest city names if there is no exact match.
+        """
+        if not name or not name.strip():
+            raise RequestError(400, "Missing " + field + ".")
+        row_idx = self.city_index.lookup(name)
+        if row_idx is None:
+            suggestions = [suggestion[0] for suggestion in self.fuzzy_matcher.suggest(name.strip(), 3)]
+            raise RequestError(404, "No entry for " + name.strip() + " in database.", field=field,
+                               suggestions=suggestions)
+        return row_idx
+
+    def times_json(self, minutes):
+        """
+        :param minutes: Whole minutes per mode.
+        :return: Dictionary of mode -> minutes and the recommended (fastest) mode.
+        """
+        return dict(zip(self.modes_list, minutes)), self.modes_list[minutes.index(min(minutes))]
+
+    async def route(self, query, body):
+        """
+        GET /route: one route, calculated in a batch with the other routes requested at the same time.
+        """
+        origin = self.resolve(query.get('origin', [''])[0], 'origin')
+        dest = self.resolve(query.get('destination', [''])[0], 'destination')
+        distance, minutes = await self.batcher.travel_times(origin, dest)
+        times, recommended = self.times_json(minutes)
+        return {'origin': self.city_json(origin), 'destination': self.city_json(dest), 'distance_km': distance,
+                'recommended': recommended, 'minutes': times}
+
+    async def matrix(self, query, body):
+        """
+        POST /matrix: every origin to every destination. Rows of the result follow the origins.
+        """
+        try:
+            request = json.loads(body or b'{}')
+            origin_names, dest_names = request['origins'], request['destinations']
+        except (ValueError, KeyError, TypeError):
+            raise RequestError(400, "Expected a JSON object with \"origins\" and \"destinations\" lists.")
+        if not isinstance(origin_names, list) or not isinstance(dest_names, list):
+            raise RequestError(400, "\"origins\" and \"destinations\" must be lists.")
+        if len(origin_names) * len(dest_names) > MAX_MATRIX_ROUTES:
+            raise RequestError(413, "A matrix can have at most {} routes.".format(MAX_MATRIX_ROUTES))
+        origins = np.array([self.resolve(str(name), 'origins') for name in origin_names], dtype=np.int64)
+        dests = np.array([self.resolve(str(name), 'destinations') for name in dest_names], dtype=np.int64)
+        # The calculation runs on an executor thread, so the event loop keeps serving other requests meanwhile.
+        return await asyncio.get_running_loop().run_in_executor(None, self.matrix_json, origins, dests)
+
+    def matrix_json(self, origins, dests):
+        """
+        Calculates a matrix and converts it to the /matrix response (runs on an executor thread).
+        :param origins: Array of origin rows.
+        :param dests: Array of destination rows.
+        :return: The response dictionary.
+        """
+        distance, minutes = self.travel_matrix.matrix(origins, dests)
+        fastest = np.argmin(minutes, axis=0)  # Ties go to the first mode, like BatchRouter.fastest_modes.
+        return {'origins': [self.city_json(row) for row in origins.tolist()],
+                'destinations': [self.city_json(row) for row in dests.tolist()],
+                'modes': self.modes_list,
+                'distance_km': distance.tolist(),
+                'minutes': np.moveaxis(minutes, 0, -1).tolist(),
+                'recommended': np.array(self.modes_list)[fastest].tolist()}
+
+    async def isochrone(self, query, body):
+        """
+        GET /isochrone: every city reachable from the origin within a number of hours by one mode.
+        """
+        origin = self.resolve(query.get('origin', [''])[0], 'origin')
+        try:
+            hours = float(query.get('hours', [''])[0])
+        except ValueError:
+            raise RequestError(400, "hours must be a number.")
+        if not 0 <= hours <= MAX_ISOCHRONE_HOURS:
+            raise RequestError(400, "hours must be between 0 and {}.".format(MAX_ISOCHRONE_HOURS))
+        modes = [mode.lower() for mode in self.modes_list]
+        mode = query.get('mode', [self.modes_list[0]])[0].strip().lower()
+        if mode not in modes:
+            raise RequestError(400, "Unknown mode.", modes=self.modes_list)
+        rows, distance, minutes = self.travel_matrix.isochrone(origin, hours, modes.index(mode))
+        return {'origin': self.city_json(origin), 'hours': hours, 'mode': self.modes_list[modes.index(mode)],
+                'results': [dict(self.city_json(row), distance_km=dist, minutes=mins) for row, dist, mins in
+                            zip(rows.tolist(), distance.tolist(), minutes.tolist())]}
+
+    async def search(self, query, body):
+        """
+        GET /search: the closest city names to a (possibly misspelt) name.
+        """
+        text = query.get('q', [''])[0].strip()
+        if not text:
+            raise RequestError(400, "Missing q.")
+        try:
+            k = min(max(int(query.get('k', ['5'])[0]), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            raise RequestError(400, "k must be an integer.")
+        return {'query': text, 'results': [dict(self.city_json(row), distance=dist) for _, dist, row in
+                                           self.fuzzy_matcher.suggest(text, k)]}
+
+    async def complete(self, query, body):
+        """
+        GET /complete: prefix completions of a partly typed name, most populous first.
+        """
+        text = query.get('q', [''])[0]
+        try:
+            k = min(max(int(query.get('k', ['5'])[0]), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            raise RequestError(400, "k must be an integer.")
+        return {'query': text, 'results': [self.city_json(row) for row in self.prefix_index.complete(text, k)]}
+
+    async def health(self, query, body):
+        """
+        GET /health: liveness check.
+        """
+        return {'status': 'ok', 'cities': len(self.city_list)}
+
+    async def stats(self, query, body):
+        """
+        GET /stats: request and batching counters.
+        """
+        batcher = self.batcher
+        return {'requests': self.requests, 'route_batches': batcher.batches, 'batched_routes': batcher.routes,
+                'mean_batch_size': batcher.routes / batcher.batches if batcher.batches else 0.0}
+
+    async def dispatch(self, method, target, body):
+        """
+        Runs the endpoint for a request.
+        :param method: The HTTP method.
+        :param target: The request target (path and query string).
+        :param body: The request body bytes.
+        :return: The status code and the JSON-serialisable response.
+        """
+        self.requests += 1
+        url = urlsplit(target)
+        routes = {'/route': ('GET', self.route), '/matrix': ('POST', self.matrix),
+                  '/isochrone': ('GET', self.isochrone), '/search': ('GET', self.search),
+                  '/complete': ('GET', self.complete), '/health': ('GET', self.health), '/stats': ('GET', self.stats)}
+        if url.path not in routes:
+            return 404, {'error': "Unknown endpoint " + url.path + "."}
+        allowed, handler = routes[url.path]
+        if method != allowed:
+            return 405, {'error': url.path + " only accepts " + allowed + "."}
+        try:
+            return 200, await handler(parse_qs(url.query), body)
+        except RequestError as error:
+            return error.status, error.body
+        except Exception as error:  # The client gets an error response instead of a dropped connection.
+            return 500, {'error': "Internal server error: {}".format(error)}
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the HTTP requests of one connection until the client closes it.
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                parts = lines[0].split(' ')
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    length = int(headers.get('content-length', '0') or 0)
+                except ValueError:
+                    length = -1
+                if len(parts) != 3:
+                    status, response, keep_alive = 400, {'error': "Malformed request line."}, False
+                elif length < 0:  # The end of the body is unknown, so the connection is closed after the response.
+                    status, response, keep_alive = 400, {'error': "Invalid Content-Length."}, False
+                elif length > MAX_BODY_SIZE:
+                    status, response, keep_alive = 413, {'error': "Request body is too large."}, False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    status, response = await self.dispatch(parts[0], parts[1], body)
+                data = json.dumps(response).encode('utf-8')
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status, REASONS[status], len(data),
+                                                             'keep-alive' if keep_alive else 'close').encode('latin-1')
+                             + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Runs the HTTP server until it is cancelled.
+    :param service: The RoutingService.
+    :param host: The interface to listen on.
+    :param port: The port to listen on.
+    """
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print("Serving on http://{}:{}".format(host, server.sockets[0].getsockname()[1]), flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """
+    Command line entry point: loads the dataset once and serves requests until interrupted.
+    """
+    from dataset_cache import load_table
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON travel time service.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="Interface to listen on.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    args = parser.parse_args()
+    city_list, transport_list = load_table(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx'))
+    try:
+        asyncio.run(serve(RoutingService(city_list, transport_list.names, transport_list), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Spatial index for finding cities by coordinates (nearest cities and cities within a radius).
+Every city is converted to a 3D point on the unit sphere and put in a grid of cubes with edge CELL_SIZE (a chord
+length, ~64 km on the earth's surface). The grid is stored as one array of city rows sorted by cell, with the start
+and end of every occupied cell, so whole batches of queries are answered with NumPy operations:
+- nearest: the cities in the block of cells around each query point are compared. The result is certain if the k-th
+  nearest city is closer than the edge of the block. Queries that aren't certain are tried again with larger blocks
+  (NEAREST_REACHES), and the few left over (e.g. in the middle of an ocean) are answered by comparing every city.
+- within: the block of cells covering the radius is compared; very large radii compare every city.
+Distances use the same Haversine formula as Program.latlng_to_dist (and are rounded to 2 decimal places the same
+way), so results agree with it exactly. Ties are broken by the lower city list row.
+"""
+
+import itertools
+import numpy as np
+
+from route_calc import RADIUS_OF_EARTH, haversine, round_2dp
+
+CELL_SIZE = 0.01  # Edge of a grid cube on the unit sphere (chord length, ~64 km).
+NEAREST_REACHES = (1, 2, 4, 8)  # Blocks searched in turn by nearest() for the queries that are not certain yet.
+MAX_BLOCK_CELLS = 4913  # Largest block of cells (17 x 17 x 17) searched by within() before comparing every city.
+BRUTE_FORCE_TILE = 256  # Number of queries compared with every city at once.
+
+
+def unit_vectors(lats, lngs):
+    """
+    Converts latitudes and longitudes to points on the unit sphere.
+    :param lats: Latitudes in degrees.
+    :param lngs: Longitudes in degrees.
+    :return: Array of shape (points, 3).
+    """
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    """
+    :param chord: Straight line distance between two points on the unit sphere.
+    :return: The great-circle distance in kilometres.
+    """
+    return 2 * RADIUS_OF_EARTH * np.arcsin(np.minimum(chord / 2, 1.0))
+
+
+def km_to_chord(km):
+    """
+    :param km: Great-circle distance in kilometres.
+    :return: The straight line distance between the two points on the unit sphere.
+    """
+    return 2 * np.sin(np.minimum(km / RADIUS_OF_EARTH, np.pi) / 2)
+
+
+class SpatialIndex:
+    def __init__(self, lats, lngs, cell_size=CELL_SIZE):
+        """
+        Builds the grid from the city coordinates.
+        :param lats: Latitude of every city in the city list.
+        :param lngs: Longitude of every city in the city list.
+        :param cell_size: Edge of a grid cube on the unit sphere.
+        """
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_size = cell_size
+        self.grid_width = int(np.ceil(2 / cell_size)) + 1
+        self.points = unit_vectors(self.lats, self.lngs)
+        keys = self.cell_keys(self.cell_coords(self.points))
+        self.sorted_rows = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.sorted_rows]  # Cell key of every entry of sorted_rows.
+        self.set_cells()
+        # The cities compared by the brute force searches (every row, until cities are removed by update()).
+        self.live_rows = np.arange(len(self.lats))
+        self.live_points = self.points
+
+    def set_cells(self):
+        """
+        Finds the start and end of every occupied cell in sorted_rows.
+        """
+        self.keys, self.cell_starts, counts = np.unique(self.sorted_keys, return_index=True, return_counts=True)
+        self.cell_ends = self.cell_starts + counts
+
+    def update(self, rows, lats, lngs, removed_rows=()):
+        """
+        Adds, moves and removes cities in place of a rebuild (see city_delta.py). The entries of the changed cities
+        are deleted from the sorted grid and inserted again at their new cells with binary searches.
+        :param rows: The rows of the new cities (rows past the end are added) and of the moved cities.
+        :param lats: Their latitudes.
+        :param lngs: Their longitudes.
+        :param removed_rows: The rows of the removed cities.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        removed_rows = np.asarray(removed_rows, dtype=np.int64)
+        num_rows = max(len(self.lats), int(rows.max(initial=-1)) + 1)
+        if num_rows > len(self.lats):
+            grow = num_rows - len(self.lats)
+            self.lats = np.concatenate([self.lats, np.zeros(grow)])
+            self.lngs = np.concatenate([self.lngs, np.zeros(grow)])
+            self.points = np.concatenate([self.points, np.zeros((grow, 3))])
+        else:
+            self.lats, self.lngs, self.points = self.lats.copy(), self.lngs.copy(), self.points.copy()
+        self.lats[rows], self.lngs[rows] = lats, lngs
+        self.points[rows] = unit_vectors(self.lats[rows], self.lngs[rows])
+
+        keep = ~np.isin(self.sorted_rows, np.concatenate([rows, removed_rows]))
+        sorted_rows, sorted_keys = self.sorted_rows[keep], self.sorted_keys[keep]
+        rows = rows[~np.isin(rows, removed_rows)]
+        keys = self.cell_keys(self.cell_coords(self.points[rows]))
+        order = np.lexsort((rows, keys))
+        positions = np.searchsorted(sorted_keys, keys[order], side='right')
+        self.sorted_rows = np.insert(sorted_rows, positions, rows[order])
+        self.sorted_keys = np.insert(sorted_keys, positions, keys[order])
+        self.set_cells()
+        self.live_rows = np.sort(self.sorted_rows)
+        self.live_points = self.points[self.live_rows]
+
+    def cell_coords(self, points):
+        """
+        :param points: Array of unit sphere points.
+        :return: Integer grid coordinates of the cell holding each point.
+        """
+        return np.floor((points + 1) / self.cell_size).astype(np.int64)
+
+    def cell_keys(self, coords):
+        """
+        :param coords: Integer grid coordinates (last axis x, y, z).
+        :return: One integer key per cell.
+        """
+        return (coords[..., 0] * self.grid_width + coords[..., 1]) * self.grid_width + coords[..., 2]
+
+    def block_candidates(self, query_points, reach):
+        """
+        Lists every city in the block of cells within reach cells of each query point's cell.
+        :param query_points: Array of unit sphere query points.
+        :param reach: The number of cells to search in every direction.
+        :return: Arrays of query numbers and city rows (one entry per candidate pair).
+        """
+        steps = range(-reach, reach + 1)
+        offsets = np.array(list(itertools.product(steps, steps, steps)), dtype=np.int64)
+        cells = self.cell_coords(query_points)[:, None, :] + offsets[None, :, :]
+        keys = self.cell_keys(cells).ravel()
+        in_grid = ((cells >= 0) & (cells < self.grid_width)).all(axis=2).ravel()  # Outside cells would alias keys.
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        hit = (self.keys[pos] == keys) & in_grid
+        starts = np.where(hit, self.cell_starts[pos], 0)
+        counts = np.where(hit, self.cell_ends[pos] - self.cell_starts[pos], 0)
+        total = int(counts.sum())
+        # Expands every (start, count) segment into the positions start, start + 1, ..., start + count - 1.
+        segment_offsets = np.cumsum(counts) - counts
+        positions = np.repeat(starts - segment_offsets, counts) + np.arange(total)
+        query_ids = np.repeat(np.arange(len(query_points)), counts.reshape(len(query_points), -1).sum(axis=1))
+        return query_ids, self.sorted_rows[positions]
+
+    def nearest_brute_force(self, lats, lngs, k):
+        """
+        Finds the k nearest cities by comparing every city, BRUTE_FORCE_TILE queries at a time.
+        The angle to every city comes from one matrix product of the unit vectors. Only the cities within a small
+        margin of the k-th smallest angle get the exact Haversine distance, which decides the order.
+        :param lats: Query latitudes.
+        :param lngs: Query longitudes.
+        :param k: The number of cities per query.
+        :return: Arrays of shape (queries, k) of city rows and distances (km, rounded to 2 decimal places).
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        rows = np.empty((len(lats), k), dtype=np.int64)
+        dists = np.empty((len(lats), k))
+        margin = 0.02 / RADIUS_OF_EARTH  # Radians. Covers the rounding to 2 decimal places and floating point error.
+        for tile in range(0, len(lats), BRUTE_FORCE_TILE):
+            tile_lats = lats[tile:tile + BRUTE_FORCE_TILE]
+            tile_lngs = lngs[tile:tile + BRUTE_FORCE_TILE]
+            cosines = unit_vectors(tile_lats, tile_lngs) @ self.live_points.T
+            for offset, query_cosines in enumerate(cosines):
+                kth_cosine = np.partition(query_cosines, len(query_cosines) - k)[len(query_cosines) - k]
+                min_cosine = np.cos(min(np.arccos(np.clip(kth_cosine, -1, 1)) + margin, np.pi))
+                close = self.live_rows[query_cosines >= min_cosine]
+                dist = round_2dp(haversine(tile_lats[offset], tile_lngs[offset], self.lats[close], self.lngs[close]))
+                order = np.lexsort((close, dist))[:k]
+                rows[tile + offset] = close[order]
+                dists[tile + offset] = dist[order]
+        return rows, dists
+
+    def nearest(self, lats, lngs, k=1):
+        """
+        Finds the k nearest cities to each query point.
+        :param lats: Query latitudes (a single value or an array).
+        :param lngs: Query longitudes (a single value or an array).
+        :param k: The number of cities per query.
+        :return: Arrays of shape (queries, k) of city rows and distances (km, rounded to 2 decimal places),
+                 nearest first.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype=np.float64))
+        k = min(k, len(self.live_rows))
+        result_rows = np.full((len(lats), k), -1, dtype=np.int64)
+        result_dists = np.full((len(lats), k), np.inf)
+        uncertain = np.arange(len(lats))
+        for reach in NEAREST_REACHES:
+            if not len(uncertain):
+                break
+            rows, dists, kth_exact = self.nearest_in_block(lats[uncertain], lngs[uncertain], k, reach)
+            # Cities outside the block are further than reach cells away. The margin covers the rounding to 2 d.p.
+            certain = kth_exact < float(chord_to_km(reach * self.cell_size)) - 0.01
+            result_rows[uncertain[certain]] = rows[certain]
+            result_dists[uncertain[certain]] = dists[certain]
+            uncertain = uncertain[~certain]
+        if len(uncertain):
+            result_rows[uncertain], result_dists[uncertain] = self.nearest_brute_force(lats[uncertain],
+                                                                                       lngs[uncertain], k)
+        return result_rows, result_dists
+
+    def nearest_in_block(self, lats, lngs, k, reach):
+        """
+        Finds the k nearest cities to each query point among the cities in the block of cells around it.
+        :param lats: Query latitudes.
+        :param lngs: Query longitudes.
+        :param k: The number of cities per query.
+        :param reach: The number of cells to search in every direction.
+        :return: Arrays of shape (queries, k) of city rows and distances (rounded), and the unrounded distance of
+                 the k-th city of every query (inf if the block holds fewer than k cities).
+        """
+        query_ids, rows = self.block_candidates(unit_vectors(lats, lngs), reach)
+        exact = haversine(lats[query_ids], lngs[query_ids], self.lats[rows], self.lngs[rows])
+        dist = round_2dp(exact)
+
+        # Sorts the candidates by query, then distance, then row, and keeps the first k of every query.
+        order = np.lexsort((rows, dist, query_ids))
+        query_ids, rows, dist, exact = query_ids[order], rows[order], dist[order], exact[order]
+        group_starts = np.searchsorted(query_ids, np.arange(len(lats)))
+        rank = np.arange(len(query_ids)) - group_starts[query_ids]
+        keep = rank < k
+        result_rows = np.full((len(lats), k), -1, dtype=np.int64)
+        result_dists = np.full((len(lats), k), np.inf)
+        kth_exact = np.full(len(lats), np.inf)
+        result_rows[query_ids[keep], rank[keep]] = rows[keep]
+        result_dists[query_ids[keep], rank[keep]] = dist[keep]
+        last = keep & (rank == k - 1)
+        kth_exact[query_ids[last]] = exact[last]
+        return result_rows, result_dists, kth_exact
+
+    def within(self, lats, lngs, radius_km):
+        """
+        Finds every city within a radius of each query point.
+        :param lats: Query latitudes (a single value or an array).
+        :param lngs: Query longitudes (a single value or an array).
+        :param radius_km: The radius in kilometres. Distances are rounded to 2 decimal places first, like
+                          Program.latlng_to_dist.
+        :return: List with one (city rows, distances) pair of arrays per query, nearest first.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype=np.float64))
+        # Grid cells are compared by chord length; the small margin covers floating point error and rounding.
+        reach = int(np.ceil(km_to_chord(radius_km + 0.01) / self.cell_size + 1e-9))
+        if (2 * reach + 1) ** 3 <= MAX_BLOCK_CELLS:
+            query_ids, rows = self.block_candidates(unit_vectors(lats, lngs), reach)
+        else:
+            query_ids = np.repeat(np.arange(len(lats)), len(self.live_rows))
+            rows = np.tile(self.live_rows, len(lats))
+        dist = round_2dp(haversine(lats[query_ids], lngs[query_ids], self.lats[rows], self.lngs[rows]))
+        inside = dist <= radius_km
+        query_ids, rows, dist = query_ids[inside], rows[inside], dist[inside]
+        order = np.lexsort((rows, dist, query_ids))
+        query_ids, rows, dist = query_ids[order], rows[order], dist[order]
+        bounds = np.searchsorted(query_ids, np.arange(len(lats) + 1))
+        return [(rows[bounds[i]:bounds[i + 1]], dist[bounds[i]:bounds[i + 1]]) for i in range(len(lats))]
+
+
+def parse_coordinates(text):
+    """
+    Reads a "latitude, longitude" pair typed instead of a city name.
+    :param text: The input string.
+    :return: (latitude, longitude) in degrees, or None if the input is not a valid coordinate pair.
+    """
+    parts = text.replace(";", ",").split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lng = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+    return None
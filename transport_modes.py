@@ -0,0 +1,169 @@
+"""
+Registry of the modes of transport and their travel time formulas.
+Each mode in the speed sheet of REA.xlsx declares its speed and a formula type with up to MAX_PARAMS parameters,
+applied to the plain travel time t = distance / speed (in minutes):
+- hyperbolic (a, b, c, d): t * (a * (1 / (b * t - c)) + d), the wait and acceleration correction reverse-engineered
+  from hyperloop-one.com,
+- padded (domestic, international): t + domestic minutes, or t + international minutes between two countries,
+- linear (factor): t * factor.
+The formula columns (Formula, A, B, C, D after Mode and Speed) are optional. Without them every mode gets the formula
+of its row in the original program (DEFAULT_FORMULAS: hyperloop, airplane, high speed rail, rail, car), so the
+spreadsheet as shipped gives exactly the results it always has.
+
+The registry compiles the formulas into kernels: every mode that shares a formula type is evaluated in one NumPy
+expression over a whole array of routes (with the mode parameters broadcast across the columns), and into plain
+Python functions for the single routes of the interactive menu. Both evaluate the same operations in the same order,
+so they give identical results.
+"""
+
+import collections
+import numpy as np
+
+HYPERBOLIC, PADDED, LINEAR = 'hyperbolic', 'padded', 'linear'  # Formula types.
+FORMULA_PARAMS = {HYPERBOLIC: 4, PADDED: 2, LINEAR: 1}  # Number of parameters of each formula type.
+MAX_PARAMS = 4
+# Formula of each speed sheet row when the sheet has no formula columns. Rows past the end use the last one.
+DEFAULT_FORMULAS = ((HYPERBOLIC, (5.84, 1.26, 1.02, 1.2017)),  # Hyperloop.
+                    (PADDED, (120, 180)),  # Airplane: 2 hours for domestic flights, 3 hours for international.
+                    (HYPERBOLIC, (30, 0.9888, 1.402, 1.2987)),  # High speed rail.
+                    (HYPERBOLIC, (30, 0.9888, 1.402, 1.2987)),  # Rail.
+                    (LINEAR, (1.35,)))  # Car.
+DEFAULT_NAMES = ('Hyperloop', 'Airplane', 'High Speed Rail', 'Rail', 'Car')  # Mode names of the speed sheet as shipped.
+
+Kernel = collections.namedtuple('Kernel', 'formula modes minute_speeds params')
+
+
+def scalar_kernel(formula, params):
+    """
+    Compiles one mode's formula into a Python function for a single route.
+    :param formula: The formula type.
+    :param params: The formula parameters.
+    :return: Function of (plain travel time, domestic) -> travel time in minutes.
+    """
+    if formula == HYPERBOLIC:
+        a, b, c, d = params
+        return lambda time_min, domestic: time_min * ((a * (1 / (b * time_min - c))) + d)
+    if formula == PADDED:
+        domestic_pad, international_pad = params
+        return lambda time_min, domestic: time_min + (domestic_pad if domestic else international_pad)
+    factor, = params
+    return lambda time_min, domestic: time_min * factor
+
+
+class ModeRegistry:
+    # Default registries for plain speed lists (see coerce), by speeds.
+    default_registries = {}
+
+    def __init__(self, names, speeds, formulas=None, params=None):
+        """
+        Validates the formula of every mode and compiles the kernels.
+        Rows index like the rows of the speed sheet: registry[row] is [Mode, Speed].
+        :param names: The names of the modes of transport.
+        :param speeds: The speed of each mode in km/h.
+        :param formulas: The formula type of each mode ('' or None for the default of its row).
+        :param params: The parameters of each mode, one sequence per mode (NaN or missing values are unused).
+        :raises ValueError: If a formula type is unknown or a parameter is missing.
+        """
+        self.names = [str(name) for name in names]
+        self.speed_values = list(speeds)
+        self.speeds = np.array(self.speed_values, dtype=np.float64)
+        self.formulas, self.params = [], []
+        for row in range(len(self.names)):
+            formula = formulas[row] if formulas is not None else None
+            if formula is None or str(formula).strip() == '':
+                formula, mode_params = DEFAULT_FORMULAS[min(row, len(DEFAULT_FORMULAS) - 1)]
+            else:
+                formula = str(formula).strip().lower()
+                if formula not in FORMULA_PARAMS:
+                    raise ValueError("Unknown formula " + formula + " for " + self.names[row] + ". Choose from: " +
+                                     ", ".join(FORMULA_PARAMS) + ".")
+                mode_params = [value for value in (params[row] if params is not None else ())
+                               if value is not None and not np.isnan(value)]
+                if len(mode_params) < FORMULA_PARAMS[formula]:
+                    raise ValueError("The " + formula + " formula of " + self.names[row] + " needs " +
+                                     str(FORMULA_PARAMS[formula]) + " parameters.")
+            self.formulas.append(formula)
+            self.params.append(tuple(float(value) for value in mode_params[:FORMULA_PARAMS[formula]]))
+
+        # One vectorised kernel per formula type. The speeds (in km per minute) and parameters of its modes are column
+        # vectors, so one expression calculates a (modes, routes) block with every mode's routes contiguous.
+        self.kernels = []
+        minute_speeds = self.speeds / 60
+        for formula in FORMULA_PARAMS:
+            modes = np.array([row for row in range(len(self.names)) if self.formulas[row] == formula], dtype=np.int64)
+            if len(modes):
+                params = [np.array(values)[:, None] for values in zip(*[self.params[row] for row in modes])]
+                self.kernels.append(Kernel(formula, modes, minute_speeds[modes, None], params))
+        self.scalar_kernels = list(zip([scalar_kernel(formula, params) for formula, params in
+                                        zip(self.formulas, self.params)], minute_speeds.tolist()))
+
+    @classmethod
+    def coerce(cls, modes):
+        """
+        :param modes: A ModeRegistry, or a list of speeds (speed sheet order) for the default formulas and names.
+        :return: The ModeRegistry.
+        """
+        if isinstance(modes, cls):
+            return modes
+        key = tuple(float(speed) for speed in modes)
+        if key not in cls.default_registries:
+            names = [DEFAULT_NAMES[row] if row < len(DEFAULT_NAMES) else '' for row in range(len(key))]
+            cls.default_registries[key] = cls(names, key)
+        return cls.default_registries[key]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, row):
+        return [self.names[row], self.speed_values[row]]
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def spec(self):
+        """
+        :return: List of (name, speed, formula, parameters) per mode, e.g. for fingerprinting cached results.
+        """
+        return [(name, speed, formula, params) for name, speed, formula, params in
+                zip(self.names, self.speed_values, self.formulas, self.params)]
+
+    def minutes(self, distance, domestic, mode=None):
+        """
+        Calculates the travel time of every mode (or one mode) for an array of routes.
+        :param distance: Array of distances in kilometres.
+        :param domestic: Boolean array, True where the origin and destination are in the same country.
+        :param mode: Optional mode (row). Only that mode is calculated.
+        :return: Array of shape (routes, modes) of travel times in minutes (not truncated; a transposed view of a
+                 (modes, routes) array), or of shape (routes,) if mode is given.
+        """
+        distance = np.asarray(distance, dtype=np.float64)
+        times = np.empty((len(self.names) if mode is None else 1, distance.shape[0]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for kernel in self.kernels:
+                rows, speeds, params = kernel.modes, kernel.minute_speeds, kernel.params
+                if mode is not None:
+                    keep = rows == mode
+                    if not keep.any():
+                        continue
+                    rows, speeds, params = 0, speeds[keep], [values[keep] for values in params]
+                time_min = distance / speeds
+                if kernel.formula == HYPERBOLIC:
+                    a, b, c, d = params
+                    time_min = time_min * ((a * (1 / (b * time_min - c))) + d)
+                elif kernel.formula == PADDED:
+                    domestic_pad, international_pad = params
+                    time_min = time_min + np.where(domestic, domestic_pad, international_pad)
+                else:
+                    time_min = time_min * params[0]
+                times[rows] = time_min
+        return times.T if mode is None else times[0]
+
+    def route_minutes(self, distance, domestic):
+        """
+        Calculates the travel time of every mode for a single route (without NumPy).
+        :param distance: The distance in kilometres.
+        :param domestic: True if the origin and destination are in the same country.
+        :return: List of travel times in minutes (not truncated).
+        """
+        distance = float(distance)
+        return [kernel(distance / speed, domestic) for kernel, speed in self.scalar_kernels]
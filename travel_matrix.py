@@ -0,0 +1,280 @@
+"""
+Many-to-many travel time matrices and isochrone queries.
+- matrix: the distance from every origin to every destination and one whole-minute time matrix per mode. The routes
+  are calculated with NumPy broadcasting one tile of at most TILE_ROUTES routes at a time and written straight into
+  the result arrays, so the temporaries stay small whatever the size of the matrix. Large results (5,000 x 15,000
+  cities = 75M routes, 1.8 GB) can be written to .npy files opened as memory maps instead of RAM.
+- isochrone: every city reachable from a city within a time limit by one mode. The travel time of every mode only grows
+  with distance beyond a few tens of km, so the time limit is turned into a distance limit (found once per mode and
+  limit by bisection). A registered formula whose time does not keep growing (checked up to MAX_DISTANCE) gets no
+  distance limit: every city is checked with the exact calculation. The cities are sorted by latitude once; a city
+  within the distance limit is within the same number of degrees of latitude, so only one contiguous slice of the sorted
+  cities (found with searchsorted) is checked instead of every city.
+The formulas are those of BatchRouter (route_calc), so every value matches Program.latlng_to_dist and
+Program.travel_time exactly.
+
+Usage: python travel_matrix.py matrix origins.txt destinations.txt [--out REA_matrix]
+       python travel_matrix.py isochrone Sydney 3 [--mode Rail]
+City files have one name ("City" or "City, Country") per line.
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+
+from route_calc import RADIUS_OF_EARTH, haversine, round_2dp
+from transport_modes import HYPERBOLIC
+
+TILE_ROUTES = 1 << 20  # Routes calculated at once by matrix(); about 130 MB of temporaries.
+MAX_DISTANCE = np.pi * RADIUS_OF_EARTH  # Longest possible distance (half the circumference), in km.
+TURN_STEP = 0.01  # Spacing in km of the distances searched for the point where each mode's time starts to grow.
+MIN_TURN_KM = 500  # The search covers at least this distance, and twice the furthest pole or minimum of a formula.
+GROWTH_CHECKS = 100000  # Distances up to MAX_DISTANCE where the time of a mode must grow past its turning point.
+REACH_ITERATIONS = 60  # Bisection steps of reach_km (far below 0.01 km).
+
+
+def matrix_paths(path):
+    """
+    :param path: Path prefix of the matrix files.
+    :return: Paths of the distance and minutes .npy files.
+    """
+    return path + '_distance.npy', path + '_minutes.npy'
+
+
+def turn_search_km(modes):
+    """
+    Finds how far the search for the turning points of the travel times must go. The hyperbolic correction
+    t * (a / (b * t - c) + d) has its pole at t = c / b and its minimum at t = (c + sqrt(a * c / d)) / b; the padded
+    and linear formulas grow from 0 km.
+    :param modes: The ModeRegistry.
+    :return: The distance in km.
+    """
+    furthest = 0.0
+    for formula, params, speed in zip(modes.formulas, modes.params, modes.speed_values):
+        if formula == HYPERBOLIC and params[1]:
+            a, b, c, d = params
+            times = [c / b]
+            if d and a * c / d > 0:
+                times.append((c + np.sqrt(a * c / d)) / b)
+            furthest = max(furthest, max(times) * speed / 60)
+    return min(MAX_DISTANCE, max(MIN_TURN_KM, 2 * furthest))
+
+
+class TravelMatrix:
+    def __init__(self, router):
+        """
+        Prepares the matrix and isochrone queries.
+        :param router: The BatchRouter holding the city coordinates, countries and speeds.
+        """
+        self.router = router
+        # The cities sorted by latitude (ties by row) for the isochrone queries.
+        self.lat_order = np.argsort(router.lats, kind='stable')
+        self.sorted_lats = router.lats[self.lat_order]
+        self.sorted_lngs = router.lngs[self.lat_order]
+        self.sorted_codes = router.country_codes[self.lat_order]
+        self.num_modes = len(router.speeds)
+        # The hyperloop and rail corrections have a pole and a minimum within a few tens of km. Beyond the last
+        # distance where the time does not grow, the time of each mode only grows with distance. NaN marks a mode
+        # whose time stops growing again further away, so its isochrones have no distance limit (see reach_km).
+        grid = np.arange(0, turn_search_km(router.modes), TURN_STEP)
+        times = router.modes.minutes(grid, np.ones(len(grid), dtype=bool))
+        self.turn_km = np.zeros(self.num_modes)
+        for mode in range(self.num_modes):
+            not_growing = np.flatnonzero(~(np.diff(times[:, mode]) > 0))
+            if len(not_growing):
+                self.turn_km[mode] = grid[not_growing[-1] + 1]
+        checks = np.linspace(0, MAX_DISTANCE, GROWTH_CHECKS)
+        times = router.modes.minutes(checks, np.ones(len(checks), dtype=bool))
+        for mode in range(self.num_modes):
+            beyond = checks > self.turn_km[mode]
+            if not (np.diff(times[beyond, mode]) > 0).all():
+                self.turn_km[mode] = np.nan
+        self.reach_cache = {}  # (mode, whole minutes) -> search radius in km.
+
+    def tiles(self, num_origins, num_dests, tile_routes=TILE_ROUTES):
+        """
+        Splits a matrix into tiles of at most tile_routes routes (whole rows of destinations where they fit).
+        :param num_origins: The number of origins (matrix rows).
+        :param num_dests: The number of destinations (matrix columns).
+        :param tile_routes: The largest number of routes in a tile.
+        :return: Generator of (origin slice, destination slice) pairs.
+        """
+        cols = max(1, min(num_dests, tile_routes))
+        rows = max(1, tile_routes // cols)
+        for row in range(0, num_origins, rows):
+            for col in range(0, num_dests, cols):
+                yield slice(row, row + rows), slice(col, col + cols)
+
+    def tile(self, origin_idx, dest_idx):
+        """
+        Calculates every origin to every destination with broadcasting.
+        :param origin_idx: Array of origin row indices.
+        :param dest_idx: Array of destination row indices.
+        :return: The distances (km) of shape (origins, destinations) and the whole minutes of shape
+                 (modes, origins, destinations).
+        """
+        router = self.router
+        origin_idx, dest_idx = origin_idx[:, None], dest_idx[None, :]
+        distance = round_2dp(haversine(router.lats[origin_idx], router.lngs[origin_idx], router.lats[dest_idx],
+                                       router.lngs[dest_idx]))
+        domestic = router.country_codes[origin_idx] == router.country_codes[dest_idx]
+        minutes = np.trunc(router.modes.minutes(distance.ravel(), domestic.ravel()))
+        return distance, minutes.T.reshape((self.num_modes,) + distance.shape)
+
+    def matrix(self, origin_idx, dest_idx, path=None, tile_routes=TILE_ROUTES):
+        """
+        Calculates the distance and the travel time of every mode from every origin to every destination.
+        :param origin_idx: Array of origin row indices.
+        :param dest_idx: Array of destination row indices.
+        :param path: Optional path prefix. The results are written to <path>_distance.npy and <path>_minutes.npy and
+                     returned as memory maps instead of being kept in RAM.
+        :param tile_routes: The largest number of routes calculated at once.
+        :return: A float64 array of distances (km) of shape (origins, destinations) and an int32 array of whole
+                 minutes of shape (modes, origins, destinations), truncated like Program.travel_time.
+        """
+        origin_idx = np.asarray(origin_idx, dtype=np.int64)
+        dest_idx = np.asarray(dest_idx, dtype=np.int64)
+        shape = (len(origin_idx), len(dest_idx))
+        if path is None:
+            distance = np.empty(shape)
+            minutes = np.empty((self.num_modes,) + shape, dtype=np.int32)
+        else:
+            distance_path, minutes_path = matrix_paths(path)
+            distance = np.lib.format.open_memmap(distance_path, mode='w+', dtype=np.float64, shape=shape)
+            minutes = np.lib.format.open_memmap(minutes_path, mode='w+', dtype=np.int32,
+                                                shape=(self.num_modes,) + shape)
+        for rows, cols in self.tiles(shape[0], shape[1], tile_routes):
+            distance[rows, cols], minutes[:, rows, cols] = self.tile(origin_idx[rows], dest_idx[cols])
+        if path is not None:
+            distance.flush()
+            minutes.flush()
+        return distance, minutes
+
+    def reach_km(self, mode, limit):
+        """
+        Finds the search radius of an isochrone: no city further away can be reached within the limit.
+        :param mode: The mode of transport (speed sheet order).
+        :param limit: The time limit in whole minutes.
+        :return: The radius in km (inf when every city has to be checked).
+        """
+        key = (mode, limit)
+        if key not in self.reach_cache:
+            # Domestic flights are the quickest, so the radius covers international flights too.
+            def too_slow(distance):
+                return self.router.modes.minutes([distance], [True], mode)[0] >= limit + 1
+            low, high = float(self.turn_km[mode]), MAX_DISTANCE
+            if np.isnan(low) or not too_slow(high):
+                high = np.inf
+            elif too_slow(low):
+                high = low
+            else:
+                for _ in range(REACH_ITERATIONS):
+                    middle = (low + high) / 2
+                    if too_slow(middle):
+                        high = middle
+                    else:
+                        low = middle
+            self.reach_cache[key] = high
+        return self.reach_cache[key]
+
+    def isochrone(self, origin_row, hours, mode):
+        """
+        Finds every city reachable from a city within a time limit by one mode of transport.
+        :param origin_row: The city list row of the origin.
+        :param hours: The time limit in hours (whole minutes count, like Program.travel_time).
+        :param mode: The mode of transport (speed sheet order).
+        :return: Arrays of the city rows, distances (km) and whole minutes, quickest first (ties by row). The origin
+                 itself is left out.
+        """
+        router = self.router
+        limit = int(round(hours * 60, 6))
+        radius = self.reach_km(mode, limit)
+        lat, lng = router.lats[origin_row], router.lngs[origin_row]
+        # Distances are at least RADIUS_OF_EARTH * the difference in latitude (in radians), before rounding.
+        band = np.degrees((radius + 0.01) / RADIUS_OF_EARTH)
+        start = int(np.searchsorted(self.sorted_lats, lat - band, side='left'))
+        end = int(np.searchsorted(self.sorted_lats, lat + band, side='right'))
+        distance = round_2dp(haversine(lat, lng, self.sorted_lats[start:end], self.sorted_lngs[start:end]))
+        near = np.flatnonzero(distance <= radius)
+        rows, distance = self.lat_order[start:end][near], distance[near]
+        keep = rows != origin_row
+        rows, distance = rows[keep], distance[keep]
+        domestic = self.sorted_codes[start:end][near][keep] == router.country_codes[origin_row]
+        minutes = np.trunc(router.modes.minutes(distance, domestic, mode)).astype(np.int64)
+        inside = minutes <= limit
+        rows, distance, minutes = rows[inside], distance[inside], minutes[inside]
+        order = np.lexsort((rows, minutes))
+        return rows[order], distance[order], minutes[order]
+
+
+def read_cities(path, city_index):
+    """
+    Reads a file of city names, one per line.
+    :param path: The file path.
+    :param city_index: The CityIndex used to find the rows.
+    :return: Array of city rows.
+    :raises KeyError: If a name is not in the city list.
+    """
+    rows = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                row = city_index.lookup(line)
+                if row is None:
+                    raise KeyError("No entry for " + line.strip() + " in database.")
+                rows.append(row)
+    return np.array(rows, dtype=np.int64)
+
+
+def main():
+    """
+    Command line entry point: writes a travel time matrix or prints an isochrone.
+    """
+    from city_index import CityIndex
+    from dataset_cache import load_table
+    from route_calc import BatchRouter
+    parser = argparse.ArgumentParser(description="Many-to-many travel time matrices and isochrones.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    matrix_parser = commands.add_parser('matrix', help="Every origin to every destination.")
+    matrix_parser.add_argument('origins', help="File of origin cities, one per line.")
+    matrix_parser.add_argument('destinations', help="File of destination cities, one per line.")
+    matrix_parser.add_argument('--out', default='REA_matrix',
+                               help="Path prefix of the output files (<out>_distance.npy, <out>_minutes.npy).")
+    isochrone_parser = commands.add_parser('isochrone', help="Every city reachable within a time limit.")
+    isochrone_parser.add_argument('origin', help="Origin city (\"City\" or \"City, Country\").")
+    isochrone_parser.add_argument('hours', type=float, help="Time limit in hours.")
+    isochrone_parser.add_argument('--mode', default='Hyperloop', help="Mode of transport (speed sheet name).")
+    args = parser.parse_args()
+
+    city_list, transport_list = load_table(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'REA.xlsx'))
+    modes_list = transport_list.names
+    city_index = CityIndex(city_list)
+    travel_matrix = TravelMatrix(BatchRouter(city_list, transport_list))
+    if args.command == 'matrix':
+        try:
+            origins, dests = read_cities(args.origins, city_index), read_cities(args.destinations, city_index)
+        except KeyError as error:
+            parser.error(error.args[0])
+        start = time.perf_counter()
+        travel_matrix.matrix(origins, dests, args.out)
+        print("Calculated {:,} routes in {:.1f} s -> {}".format(
+            len(origins) * len(dests), time.perf_counter() - start, ", ".join(matrix_paths(args.out))))
+        return
+
+    origin = city_index.lookup(args.origin)
+    if origin is None:
+        parser.error("No entry for " + args.origin + " in database.")
+    modes = [str(mode).lower() for mode in modes_list]
+    if args.mode.lower() not in modes:
+        parser.error("Unknown mode " + args.mode + ". Choose from: " + ", ".join(modes_list) + ".")
+    mode = modes.index(args.mode.lower())
+    rows, distance, minutes = travel_matrix.isochrone(origin, args.hours, mode)
+    for row, dist, mins in zip(rows.tolist(), distance.tolist(), minutes.tolist()):
+        print("{:<30} {:<24} {:>10.2f} km {:>4}h.{}m.".format(city_list[row][1], city_list[row][0], dist,
+                                                            mins // 60, mins % 60))
+    print("{:,} cities within {} hours by {}.".format(len(rows), args.hours, modes_list[mode]))
+
+
+if __name__ == '__main__':
+    main()
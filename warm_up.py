@@ -0,0 +1,115 @@
+"""
+Background warm-up of the program's data structures, so the menu appears while they are still being built.
+The dataset load and the lookup structures are steps of a pipeline run in order on one background thread. An object
+declares the attributes each step sets with WarmAttribute descriptors. Reading such an attribute before its step has
+finished waits for that step only (not the whole pipeline); an error raised by a step is raised again in the thread
+that reads one of its attributes. With background=False the steps run straight away in the calling thread (the
+blocking start-up of earlier versions).
+
+Usage:
+    class Program:
+        city_index = WarmAttribute('indices')
+        def __init__(self):
+            self.warm_up = WarmUp([('indices', self.build_index)])
+            self.warm_up.start()
+"""
+
+import threading
+import time
+
+
+class WarmAttribute:
+    """
+    Descriptor of an attribute set by a warm-up step. The owner must have a warm_up attribute (the WarmUp).
+    It only defines __get__, so once the step has set the attribute on the instance, reads find it in the instance
+    dictionary and no longer go through the descriptor.
+    """
+    def __init__(self, step):
+        """
+        :param step: The name of the step that sets the attribute.
+        """
+        self.step = step
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        instance.warm_up.wait(self.step)
+        if self.name not in instance.__dict__:
+            raise AttributeError("The " + self.step + " step did not set " + self.name + ".")
+        return instance.__dict__[self.name]
+
+
+class WarmUp:
+    def __init__(self, steps, background=True):
+        """
+        Creates the pipeline. Nothing runs until start() is called.
+        :param steps: List of (step name, function) in the order they run. A function sets its attributes itself.
+        :param background: Whether the steps run on a background thread.
+        """
+        self.names = [name for name, _ in steps]
+        # Dropped as they run, so bound methods of the owner don't keep it alive (a reference cycle) once warm.
+        self.funcs = dict(steps)
+        self.background = background
+        self.ready = {name: threading.Event() for name in self.names}
+        self.errors = {}  # Step name -> the exception it raised (or the earlier one that stopped it running).
+        self.ready_times = {}  # Step name -> seconds from start() until the step finished.
+        self.start_time = None
+        self.thread = None
+
+    def start(self):
+        """
+        Runs the pipeline (returns straight away if it runs in the background).
+        """
+        self.start_time = time.perf_counter()
+        if self.background:
+            self.thread = threading.Thread(target=self.run, name='warm-up', daemon=True)
+            self.thread.start()
+        else:
+            self.run()
+
+    def run(self):
+        """
+        Runs every step in order. Once a step fails, the later steps are not run and report the same error.
+        """
+        error = None
+        for name in self.names:
+            func = self.funcs.pop(name)
+            try:
+                if error is None:
+                    func()
+            except BaseException as step_error:  # Re-raised in the thread that waits for the step.
+                error = step_error
+            finally:
+                if error is not None:
+                    self.errors[name] = error
+                self.ready_times[name] = time.perf_counter() - self.start_time
+                self.ready[name].set()
+
+    def wait(self, name):
+        """
+        Waits until a step has finished.
+        :param name: The step name.
+        :raises: The exception raised by the step (or by an earlier step), if any.
+        """
+        self.ready[name].wait()
+        if name in self.errors:
+            raise self.errors[name]
+
+    def wait_all(self):
+        """
+        Waits until every step has finished.
+        :raises: The exception raised by the first step that failed, if any.
+        """
+        for name in self.names:
+            self.wait(name)
+
+    def is_ready(self, name):
+        """
+        :param name: The step name.
+        :return: True if the step has finished.
+        """
+        return self.ready[name].is_set()